@@ -0,0 +1,226 @@
+"""
+Logging estructurado y no bloqueante.
+
+Los módulos piden un logger por componente y registran un mensaje con campos:
+
+    log = get_logger('providers')
+    log.info("PIN obtenido", provider=provider.name, option=option_value)
+    log.info("Request", path=request.path, sample_rate=REQUEST_LOG_SAMPLE_RATE)
+
+El request solo encola el registro (QueueHandler); un hilo de fondo por proceso
+(QueueListener) lo formatea como una línea JSON y lo escribe en stdout. Si la cola
+se llena los registros se descartan y se cuentan, nunca se bloquea al worker.
+Los campos y textos con secretos (contraseñas, claves, tokens) se enmascaran y
+los PIN se acortan a sus últimos caracteres. Dentro de un request cada registro
+lleva el trace_id de tracing.py.
+
+Configuración:
+    LOG_LEVEL                 DEBUG, INFO (por defecto), WARNING, ERROR
+    LOG_FORMAT                json (por defecto) o text
+    LOG_QUEUE_SIZE            registros pendientes máximos (10000)
+    LOG_REQUEST_SAMPLE_RATE   fracción de requests exitosos que se registran (0.1)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+
+from tracing import current_trace_id
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv('LOG_REQUEST_SAMPLE_RATE', '0.1'))
+
+ROOT_LOGGER_NAME = 'inefablestore'
+
+# Campos cuyo valor nunca se escribe
+SECRET_FIELDS = {'password', 'clave', 'secret', 'token', 'authorization', 'api_key', 'password_hash', 'cookie'}
+# Campos con PINes: se deja visible solo el final para poder rastrearlos
+PIN_FIELDS = {'pin', 'pin_code'}
+SECRET_PATTERN = re.compile(r'(?i)\b(password|clave|secret|token|api_key)=([^&\s]+)')
+REDACTED = '***'
+
+
+def mask_pin(value):
+    text = str(value)
+    return f"***{text[-4:]}" if len(text) > 4 else REDACTED
+
+
+def redact(fields):
+    """Copia de los campos con secretos enmascarados (recursivo en dicts)"""
+    clean = {}
+    for key, value in fields.items():
+        lower = key.lower()
+        if lower in SECRET_FIELDS:
+            clean[key] = REDACTED
+        elif lower in PIN_FIELDS and value:
+            clean[key] = mask_pin(value)
+        elif isinstance(value, dict):
+            clean[key] = redact(value)
+        elif isinstance(value, str):
+            clean[key] = SECRET_PATTERN.sub(lambda m: f"{m.group(1)}={REDACTED}", value)
+        else:
+            clean[key] = value
+    return clean
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro; corre en el hilo de fondo"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name.replace(f'{ROOT_LOGGER_NAME}.', '', 1),
+            'msg': SECRET_PATTERN.sub(lambda m: f"{m.group(1)}={REDACTED}", record.getMessage()),
+            'pid': record.process,
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(redact(fields))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(JsonFormatter):
+    """Formato legible para desarrollo local"""
+
+    def format(self, record):
+        fields = redact(getattr(record, 'fields', None) or {})
+        extra = ' '.join(f"{key}={value}" for key, value in fields.items())
+        timestamp = datetime.fromtimestamp(record.created).strftime('%H:%M:%S')
+        line = (f"{timestamp} {record.levelname:<7} [{record.name.replace(f'{ROOT_LOGGER_NAME}.', '', 1)}] "
+                f"{SECRET_PATTERN.sub(lambda m: f'{m.group(1)}={REDACTED}', record.getMessage())}")
+        if extra:
+            line = f"{line} | {extra}"
+        if record.exc_info:
+            line = f"{line}\n{self.formatException(record.exc_info)}"
+        return line
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Encola sin formatear y descarta (contando) si la cola está llena"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # El formateo se hace en el hilo de fondo, no en el request
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Pipeline:
+    """Cola + hilo escritor del proceso actual (se recrea después de un fork)"""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.handler = NonBlockingQueueHandler(self.queue)
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(TextFormatter() if LOG_FORMAT == 'text' else JsonFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, stream_handler)
+        self.listener.start()
+        self.pid = os.getpid()
+
+    def stop(self):
+        try:
+            self.listener.stop()
+        except Exception:
+            pass
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def _ensure_pipeline():
+    global _pipeline
+    if _pipeline is not None and _pipeline.pid == os.getpid():
+        return _pipeline
+
+    with _pipeline_lock:
+        if _pipeline is None or _pipeline.pid != os.getpid():
+            root = logging.getLogger(ROOT_LOGGER_NAME)
+            if _pipeline is not None:
+                # Heredado del master: su hilo escritor no existe en este proceso
+                root.removeHandler(_pipeline.handler)
+            _pipeline = _Pipeline()
+            root.addHandler(_pipeline.handler)
+            root.setLevel(LOG_LEVEL)
+            root.propagate = False
+    return _pipeline
+
+
+class StructuredLogger:
+    """Logger de un componente: mensaje + campos, con muestreo opcional"""
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(f'{ROOT_LOGGER_NAME}.{name}')
+
+    def _log(self, level, message, fields, exc_info=False):
+        sample_rate = fields.pop('sample_rate', None)
+        if sample_rate is not None and random.random() >= sample_rate:
+            return
+        if not self._logger.isEnabledFor(level):
+            return
+        _ensure_pipeline()
+        if sample_rate is not None:
+            fields['sampled'] = sample_rate
+        trace_id = current_trace_id()
+        if trace_id is not None:
+            fields.setdefault('trace_id', trace_id)
+        self._logger.log(level, message, exc_info=exc_info, extra={'fields': fields})
+
+    def debug(self, message, **fields):
+        self._log(logging.DEBUG, message, fields)
+
+    def info(self, message, **fields):
+        self._log(logging.INFO, message, fields)
+
+    def warning(self, message, **fields):
+        self._log(logging.WARNING, message, fields)
+
+    def error(self, message, **fields):
+        self._log(logging.ERROR, message, fields)
+
+    def exception(self, message, **fields):
+        self._log(logging.ERROR, message, fields, exc_info=True)
+
+
+_loggers = {}
+
+
+def get_logger(name):
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers.setdefault(name, StructuredLogger(name))
+    return logger
+
+
+def dropped_records():
+    """Registros descartados por cola llena en este proceso"""
+    return _pipeline.handler.dropped if _pipeline is not None and _pipeline.pid == os.getpid() else 0
+
+
+def shutdown():
+    """Vaciar la cola y detener el hilo escritor (al salir del proceso o del worker)"""
+    if _pipeline is not None and _pipeline.pid == os.getpid():
+        _pipeline.stop()
+
+
+atexit.register(shutdown)
@@ -0,0 +1,113 @@
+"""
+Benchmark del middleware de compresión: bytes ahorrados y costo de CPU por tamaño de respuesta.
+
+Usa respuestas representativas (JSON de /admin/users con N usuarios y el HTML
+de admin.html renderizado con esos usuarios) y las pasa por CompressionMiddleware
+con gzip y, si está instalado, brotli. Reporta tamaño original, tamaño comprimido,
+ahorro y microsegundos de CPU por respuesta.
+
+    python benchmarks/bench_compression.py [--iterations 200]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark')
+os.environ.setdefault('SHARED_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'bench_compression_cache.sqlite3'))
+
+import compression  # noqa: E402
+from compression import CompressionMiddleware  # noqa: E402
+
+
+def sample_users(count):
+    return [{
+        'user_id': f'USR{i:05d}',
+        'nombre': f'Nombre{i}',
+        'apellido': f'Apellido{i}',
+        'telefono': f'7{i:07d}',
+        'email': f'usuario{i}@example.com',
+        'balance': f'{(i * 7) % 500}.50',
+        'created_at': datetime(2025, 1, 1),
+        'is_active': i % 10 != 0,
+    } for i in range(count)]
+
+
+def render_admin(users):
+    import main
+    from flask import render_template, session
+    from catalog import current_catalog
+
+    with main.app.test_request_context('/'):
+        session['user_id'] = 'ADMIN001'
+        html = render_template('admin.html', users=users, pins_stats=[],
+                               catalog=current_catalog(), balance=Decimal('0'))
+    return html.encode('utf-8')
+
+
+def payloads():
+    cases = []
+    for count in (1, 10, 100, 1000):
+        users = sample_users(count)
+        body = json.dumps({'success': True, 'users': users}, ensure_ascii=False, default=str).encode('utf-8')
+        cases.append((f'json {count} usuarios', 'application/json', body))
+    for count in (10, 100):
+        cases.append((f'admin.html {count} usuarios', 'text/html; charset=utf-8', render_admin(sample_users(count))))
+    return cases
+
+
+def run_once(middleware, encoding):
+    headers = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        headers.update(response_headers)
+
+    body = b''.join(middleware({'HTTP_ACCEPT_ENCODING': encoding, 'REQUEST_METHOD': 'GET'}, start_response))
+    return body, headers.get('Content-Encoding')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de compresión de respuestas')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    encodings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+    if compression.brotli is None:
+        print("⚠️  Paquete brotli no instalado: solo se mide gzip\n")
+
+    print(f"{'respuesta':<24} {'cod.':<5} {'original':>9} {'enviado':>9} {'ahorro':>7} {'CPU µs':>9}")
+    for label, content_type, body in payloads():
+        def app(environ, start_response, body=body, content_type=content_type):
+            start_response('200 OK', [('Content-Type', content_type), ('Content-Length', str(len(body)))])
+            return [body]
+
+        middleware = CompressionMiddleware(app)
+        baseline = min(_timed(lambda: run_once(middleware, 'identity'), args.iterations))
+        for encoding in encodings:
+            sent, applied = run_once(middleware, encoding)
+            elapsed = min(_timed(lambda: run_once(middleware, encoding), args.iterations))
+            saved = (1 - len(sent) / len(body)) * 100
+            print(f"{label:<24} {applied or '-':<5} {len(body):>9,} {len(sent):>9,} {saved:>6.1f}% "
+                  f"{max(0.0, elapsed - baseline) * 1e6:>9.1f}")
+
+
+def _timed(fn, iterations, repeat=5):
+    """Tiempo medio por llamada en cada una de las repeticiones"""
+    results = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        results.append((time.perf_counter() - started) / iterations)
+    return results
+
+
+if __name__ == '__main__':
+    main()
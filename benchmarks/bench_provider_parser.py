@@ -0,0 +1,105 @@
+"""
+Benchmark del parser de respuestas de proveedores sobre el corpus de fixtures.
+
+Verifica primero que cada fixture produzca el resultado esperado
+(fixtures/provider_responses/expected.json) y luego mide el tiempo por
+respuesta del parser actual frente al procesamiento anterior
+(json.loads completo, find('{') + segundo json.loads y regex sin compilar).
+
+    python benchmarks/bench_provider_parser.py [--iterations 20000]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from provider_parser import parse_provider_response, PinResult  # noqa: E402
+
+FIXTURES_DIR = os.path.join(ROOT, 'fixtures', 'provider_responses')
+
+
+def load_corpus():
+    with open(os.path.join(FIXTURES_DIR, 'expected.json'), 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+
+    corpus = {}
+    for name in sorted(expected):
+        with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+            corpus[name] = f.read()
+    return corpus, expected
+
+
+def check_corpus(corpus, expected):
+    failures = []
+    for name, text in corpus.items():
+        parsed = parse_provider_response(text)
+        want = expected[name]
+        if 'pin_code' in want:
+            ok = isinstance(parsed, PinResult) and parsed.pin_code == want['pin_code']
+        else:
+            ok = not isinstance(parsed, PinResult) and parsed.kind == want['error']
+        if not ok:
+            failures.append(f"{name}: esperado {want}, obtenido {parsed}")
+    return failures
+
+
+def legacy_parse(text):
+    """Réplica del procesamiento anterior (sin los print) como referencia"""
+    text = text.strip()
+    if not text:
+        return None
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        json_start = text.find('{')
+        if json_start != -1:
+            try:
+                data = json.loads(text[json_start:])
+            except json.JSONDecodeError:
+                return None
+        else:
+            match = re.search(r'<b>Pin:<\/b>\s*([A-Z0-9]+)', text, re.IGNORECASE)
+            return match.group(1).strip().upper() if match else None
+
+    pin_code = data.get('PIN') or data.get('pin')
+    if not pin_code and 'mensaje' in data:
+        match = re.search(r'<b>Pin:<\/b>\s*([A-Z0-9]+)', data['mensaje'])
+        if match:
+            pin_code = match.group(1).strip()
+    return pin_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del parser de respuestas de proveedores')
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    corpus, expected = load_corpus()
+    failures = check_corpus(corpus, expected)
+    if failures:
+        print("❌ El corpus no coincide con lo esperado:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print(f"✅ {len(corpus)} fixtures interpretados correctamente\n")
+
+    print(f"{'fixture':<26} {'bytes':>6} {'actual µs':>10} {'anterior µs':>12}")
+    total_new = total_old = 0.0
+    for name, text in corpus.items():
+        new = timeit.timeit(lambda: parse_provider_response(text), number=args.iterations)
+        old = timeit.timeit(lambda: legacy_parse(text), number=args.iterations)
+        total_new += new
+        total_old += old
+        print(f"{name:<26} {len(text):>6} {new / args.iterations * 1e6:>10.2f} {old / args.iterations * 1e6:>12.2f}")
+
+    runs = args.iterations * len(corpus)
+    print(f"\n{'promedio':<26} {'':>6} {total_new / runs * 1e6:>10.2f} {total_old / runs * 1e6:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark de arranque: tiempo hasta la primera respuesta de cada worker.
+
+Simula el modelo de gunicorn con preload_app: un proceso "master" importa la
+aplicación y hace fork de N workers; cada worker mide cuánto tarda en
+renderizar por primera vez cada plantilla (la parte de la primera respuesta que
+depende de compilar Jinja). Se comparan tres escenarios:
+
+  sin_cache   sin precompilar y sin caché de bytecode (compilación perezosa por worker)
+  bytecode    sin precompilar, con la caché de bytecode en disco ya poblada
+  precompilado  plantillas compiladas en el master antes del fork (lo que hace main.py)
+
+    python benchmarks/bench_startup.py [--workers 4]
+
+No necesita base de datos: las plantillas se renderizan con un contexto de ejemplo.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'sin_cache': {'PRECOMPILE_TEMPLATES': 'false', 'TEMPLATE_CACHE_DIR': ''},
+    'bytecode': {'PRECOMPILE_TEMPLATES': 'false'},
+    'precompilado': {'PRECOMPILE_TEMPLATES': 'true'},
+}
+
+
+def sample_context():
+    from catalog import current_catalog
+    return {
+        'user_id': 'USR001',
+        'balance': '100.00',
+        'is_active': True,
+        'transactions': [],
+        'users': [],
+        'pins_stats': {},
+        'banner_message': 'Banner de ejemplo',
+        'catalog': current_catalog(),
+    }
+
+
+def first_render_times(app, names):
+    """Tiempo (ms) de la primera renderización de cada plantilla en este proceso"""
+    from flask import render_template
+    context = sample_context()
+    times = {}
+    with app.test_request_context('/'):
+        for name in names:
+            started = time.perf_counter()
+            render_template(name, **context)
+            times[name] = (time.perf_counter() - started) * 1000
+    return times
+
+
+def run_master(workers):
+    """Proceso master: importa la app (con o sin precompilar) y hace fork de los workers"""
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    import main
+    import_ms = (time.perf_counter() - started) * 1000
+    names = main.app.jinja_env.list_templates(extensions=['html'])
+
+    results = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            times = first_render_times(main.app, names)
+            os.write(write_fd, json.dumps(times).encode('utf-8'))
+            os.close(write_fd)
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd, 'rb') as f:
+            results.append(json.loads(f.read()))
+        os.waitpid(pid, 0)
+
+    print(json.dumps({'import_ms': import_ms, 'workers': results}))
+
+
+def run_scenario(name, overrides, workers, cache_dir):
+    env = dict(os.environ)
+    env.setdefault('FLASK_SECRET_KEY', 'benchmark')
+    env['SHARED_CACHE_PATH'] = os.path.join(cache_dir, 'shared_cache.sqlite3')
+    env['TEMPLATE_CACHE_DIR'] = os.path.join(cache_dir, 'jinja')
+    env.update(overrides)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--master', '--workers', str(workers)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de arranque de workers')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--master', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.master:
+        run_master(args.workers)
+        return
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Poblar la caché de bytecode en disco como lo haría un arranque anterior
+        run_scenario('preparar', SCENARIOS['precompilado'], 0, cache_dir)
+
+        print(f"{'escenario':<14} {'import ms':>10} {'1ª resp. worker ms (prom)':>26} {'máx':>8}")
+        for name, overrides in SCENARIOS.items():
+            result = run_scenario(name, overrides, args.workers, cache_dir)
+            per_worker = [sum(times.values()) for times in result['workers']]
+            print(f"{name:<14} {result['import_ms']:>10.1f} "
+                  f"{sum(per_worker) / len(per_worker):>26.1f} {max(per_worker):>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark de renderizado por plantilla, con y sin caché de fragmentos.
+
+Renderiza cada plantilla con un contexto de ejemplo (usuario con 10
+transacciones, catálogo por defecto y banner) y reporta el tiempo medio por
+render con la caché de fragmentos ({% cache %}) activa y desactivada.
+
+    python benchmarks/bench_templates.py [--iterations 500]
+
+No necesita base de datos.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark')
+os.environ.setdefault('SHARED_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'bench_templates_cache.sqlite3'))
+
+from flask import render_template, session  # noqa: E402
+
+import main  # noqa: E402
+from catalog import current_catalog  # noqa: E402
+from page_context import split_transactions  # noqa: E402
+
+
+def sample_transactions(count=10):
+    now = datetime.now()
+    transactions = []
+    for i in range(count):
+        credit = i % 4 == 0
+        transactions.append({
+            'id': i,
+            'user_id': 'USR001',
+            'pin': 'ADMIN' if credit else f'PIN{i:05d}',
+            'transaction_id': f'CR{i:06d}' if credit else f'FF{i:06d}',
+            'amount': Decimal('5.00') if credit else Decimal('-0.66'),
+            'game_type': 'freefire_latam',
+            'option_value': 1,
+            'player_id': None,
+            'status': 'completado',
+            'created_at': now - timedelta(hours=i),
+        })
+    return transactions
+
+
+def sample_context():
+    transactions = sample_transactions()
+    credit_transactions, history_transactions = split_transactions(transactions)
+    return {
+        'user_id': 'USR001',
+        'balance': Decimal('100.00'),
+        'is_active': True,
+        'transactions': transactions,
+        'credit_transactions': credit_transactions,
+        'history_transactions': history_transactions,
+        'users': [],
+        'pins_stats': [],
+        'banner_message': main.DEFAULT_BANNER_MESSAGE,
+        'catalog': current_catalog(),
+    }
+
+
+def time_template(name, context, iterations):
+    return timeit.timeit(lambda: render_template(name, **context), number=iterations) / iterations
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description='Benchmark de renderizado de plantillas')
+    parser.add_argument('--iterations', type=int, default=500)
+    args = parser.parse_args()
+
+    app = main.app
+    fragment_cache = app.jinja_env.fragment_cache
+    names = app.jinja_env.list_templates(extensions=['html'])
+    context = sample_context()
+
+    print(f"{'plantilla':<22} {'sin caché µs':>13} {'con caché µs':>13} {'ahorro':>8}")
+    with app.test_request_context('/'):
+        session.update({'user_id': 'USR001', 'nombre': 'Juan', 'apellido': 'Pérez'})
+        for name in names:
+            max_entries = fragment_cache.max_entries
+            fragment_cache.max_entries = 0
+            uncached = time_template(name, context, args.iterations)
+            fragment_cache.max_entries = max_entries
+
+            render_template(name, **context)  # poblar la caché de fragmentos
+            cached = time_template(name, context, args.iterations)
+            print(f"{name:<22} {uncached * 1e6:>13.1f} {cached * 1e6:>13.1f} "
+                  f"{(1 - cached / uncached) * 100:>7.1f}%")
+
+    print(f"\nFragmentos: {fragment_cache.stats()}")
+
+
+if __name__ == '__main__':
+    main_bench()
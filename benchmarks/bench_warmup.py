@@ -0,0 +1,100 @@
+"""
+Benchmark de arranque en frío: import de la app + precalentamiento del worker.
+
+Cada corrida es un proceso nuevo (como un worker recién creado). Se mide:
+
+  import        importar main (plantillas precompiladas, router, caché)
+  warmup        cada paso de main.warm_worker() por separado
+  1er request   latencia del primer request autenticado a PATH, sin y con precalentamiento
+
+    python benchmarks/bench_warmup.py [--runs 5] [--path /freefirelatam]
+
+Usa la base de datos configurada (DATABASE_URL o DB_*) y PROVIDERS_CONFIG si
+está definido (p. ej. apuntando a fake_provider.py). Sin base de datos los
+pasos correspondientes aparecen como fallidos con el tiempo que tardó el error.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_worker(path, warm, output):
+    """Proceso hijo: importa, opcionalmente precalienta y hace el primer request"""
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    import main
+    result = {'import_ms': (time.perf_counter() - started) * 1000}
+
+    if warm:
+        state = main.warm_worker()
+        result['steps'] = {name: step.get('ms', 0.0) for name, step in state.steps.items()}
+        result['failed'] = [name for name, step in state.steps.items() if not step.get('ok')]
+
+    client = main.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'ADMIN001'
+        session['nombre'] = 'Benchmark'
+    started = time.perf_counter()
+    response = client.get(path)
+    result['first_request_ms'] = (time.perf_counter() - started) * 1000
+    result['status'] = response.status_code
+    # Los logs van a stdout: el resultado se entrega por archivo
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def spawn(path, warm, cache_dir):
+    env = dict(os.environ)
+    env.setdefault('FLASK_SECRET_KEY', 'benchmark')
+    env.setdefault('LOG_LEVEL', 'ERROR')
+    env['SHARED_CACHE_PATH'] = os.path.join(cache_dir, f'shared_cache_{time.monotonic_ns()}.sqlite3')
+    output = os.path.join(cache_dir, 'resultado.json')
+    args = [sys.executable, os.path.abspath(__file__), '--child', '--path', path, '--output', output]
+    if warm:
+        args.append('--warm')
+    subprocess.run(args, env=env, capture_output=True, check=True)
+    with open(output, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de import + precalentamiento')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/freefirelatam')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--warm', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_worker(args.path, args.warm, args.output)
+        return
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cold = [spawn(args.path, False, cache_dir) for _ in range(args.runs)]
+        warm = [spawn(args.path, True, cache_dir) for _ in range(args.runs)]
+
+    median = statistics.median
+    print(f"import (mediana de {args.runs}): {median(r['import_ms'] for r in cold + warm):.1f} ms\n")
+    print(f"{'paso de warmup':<16} {'mediana ms':>10}")
+    for name in warm[0]['steps']:
+        print(f"{name:<16} {median(r['steps'][name] for r in warm):>10.1f}")
+    failed = sorted({name for r in warm for name in r['failed']})
+    if failed:
+        print(f"⚠️  pasos fallidos: {', '.join(failed)}")
+
+    print(f"\n{'1er request ' + args.path:<32} {'mediana ms':>10} {'máx':>8}")
+    for label, runs in (('sin precalentar', cold), ('precalentado', warm)):
+        times = [r['first_request_ms'] for r in runs]
+        print(f"{label:<32} {median(times):>10.1f} {max(times):>8.1f}  (status {runs[0]['status']})")
+
+
+if __name__ == '__main__':
+    main()
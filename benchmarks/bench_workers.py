@@ -0,0 +1,156 @@
+"""
+Benchmark de carga por worker de gunicorn: sync frente a gthread.
+
+Levanta el proveedor falso (fake_provider.py) con la latencia indicada y un
+gunicorn de UN worker que atiende compras por el camino real del router de
+proveedores (providers.ProviderRouter + provider_parser). Con varios clientes
+concurrentes mide solicitudes por segundo y latencias para cada modo de worker.
+
+    python benchmarks/bench_workers.py [--provider-latency 0.3] [--clients 16]
+                                       [--duration 10] [--threads 4 8]
+
+--db-latency agrega una espera por solicitud que representa las consultas a
+Postgres de una compra (sin base de datos real).
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Espera por solicitud que simula las consultas a la base de datos (segundos)
+DB_LATENCY = float(os.getenv('BENCH_DB_LATENCY', '0.01'))
+
+
+def app(environ, start_response):
+    """App WSGI de la prueba: una compra de Free Fire Latam por solicitud"""
+    from database import Database
+    from providers import get_router, ProviderBusyError
+
+    time.sleep(DB_LATENCY)
+    try:
+        result = get_router().purchase('freefire_latam', 1, Database(pooled=False)._parse_freefire_latam_response)
+        status = '200 OK' if result else '502 Bad Gateway'
+    except ProviderBusyError:
+        status = '503 Service Unavailable'
+    body = json.dumps({'success': status.startswith('200')}).encode('utf-8')
+    start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', int(url.rsplit(':', 1)[1].split('/')[0])), timeout=0.2):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def drive_load(url, clients, duration):
+    """Clientes concurrentes en bucle durante duration segundos; devuelve latencias, errores y tiempo real"""
+    started_at = time.monotonic()
+    deadline = started_at + duration
+
+    def client_loop():
+        latencies, errors = [], 0
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+                latencies.append(time.monotonic() - started)
+            except Exception:
+                errors += 1
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(lambda _: client_loop(), range(clients)))
+
+    latencies = sorted(l for client_latencies, _ in results for l in client_latencies)
+    errors = sum(e for _, e in results)
+    return latencies, errors, time.monotonic() - started_at
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_mode(worker_class, threads, env, args):
+    port = free_port()
+    url = f'http://127.0.0.1:{port}/'
+    command = [
+        sys.executable, '-m', 'gunicorn', '-w', '1', '-k', worker_class, '--threads', str(threads),
+        '-b', f'127.0.0.1:{port}', 'benchmarks.bench_workers:app'
+    ]
+    # Se ejecuta fuera de ROOT para que gunicorn no cargue el gunicorn.conf.py de producción
+    server = subprocess.Popen(command, env=env, cwd=tempfile.gettempdir(),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_until_up(url):
+            raise RuntimeError(f"gunicorn ({worker_class}) no arrancó")
+        latencies, errors, elapsed = drive_load(url, args.clients, args.duration)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    label = worker_class if worker_class == 'sync' else f'{worker_class} x{threads}'
+    print(f"{label:<14} {len(latencies) / elapsed:>8.1f} {percentile(latencies, 50) * 1000:>9.0f} "
+          f"{percentile(latencies, 95) * 1000:>9.0f} {percentile(latencies, 99) * 1000:>9.0f} {errors:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de throughput por worker (sync vs gthread)')
+    parser.add_argument('--provider-latency', type=float, default=0.3)
+    parser.add_argument('--db-latency', type=float, default=DB_LATENCY)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--threads', type=int, nargs='+', default=[4, 8])
+    args = parser.parse_args()
+
+    from fake_provider import start_fake_provider
+    provider = start_fake_provider(latency=args.provider_latency, jitter=args.provider_latency / 5)
+
+    config = {'freefire_latam': [{
+        'name': 'falso', 'url': provider.url, 'user': 'bench', 'password': 'bench',
+        # Sin límite efectivo del bulkhead: se mide la concurrencia del worker, no la del proveedor
+        'max_concurrent': 256
+    }]}
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(config, f)
+        config_path = f.name
+
+    env = dict(os.environ, PROVIDERS_CONFIG=config_path, BENCH_DB_LATENCY=str(args.db_latency),
+               PYTHONPATH=ROOT)
+    print(f"Proveedor: {args.provider_latency * 1000:.0f} ms, BD: {args.db_latency * 1000:.0f} ms, "
+          f"{args.clients} clientes, {args.duration:.0f} s por modo, 1 worker\n")
+    print(f"{'worker':<14} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errores':>8}")
+    try:
+        run_mode('sync', 1, env, args)
+        for threads in args.threads:
+            run_mode('gthread', threads, env, args)
+    finally:
+        provider.shutdown()
+        os.unlink(config_path)
+
+
+if __name__ == '__main__':
+    main()
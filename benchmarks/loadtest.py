@@ -0,0 +1,453 @@
+"""
+Prueba de carga del flujo completo de compra contra la app real.
+
+Levanta el proveedor falso (fake_provider.py) y gunicorn con gunicorn.conf.py
+sobre un Postgres local (o usa --url de un servidor ya levantado), prepara
+usuarios con saldo y PINes locales, y corre usuarios virtuales concurrentes que
+eligen un escenario por vez según la mezcla (--mix):
+
+  navegar   dashboard, página de un juego y precios
+  latam     compra de Free Fire Latam (PIN local o del proveedor)
+  global    compra de Free Fire Global (PINes locales cargados por el admin)
+  block     compra de Block Striker
+  registro  registro y login de un usuario nuevo
+  admin     panel, lista de usuarios, crédito a un usuario y carga de un PIN
+
+Reporta throughput total y, por ruta, requests, req/s, p50/p95/p99 y errores.
+Compara contra la línea base (benchmarks/baselines/loadtest.json por defecto) y
+--save-baseline la reemplaza con esta corrida: versionada en git, cada cambio
+deja a la vista si empeoró la capacidad. La línea base guarda en meta.environment
+dónde se midió (CPUs, Python, Postgres); los números solo son comparables en una
+máquina equivalente. Al cambiar de máquina, o cuando un cambio mejora la
+capacidad a propósito, se vuelve a medir con los parámetros por defecto y
+--save-baseline, y el JSON nuevo va en el mismo commit.
+
+    DATABASE_URL=postgresql://localhost/inefable_loadtest python benchmarks/loadtest.py \\
+        [--users 20] [--duration 60] [--ramp-up 10] [--think 0.5] \\
+        [--mix navegar=50,latam=20,global=10,block=10,registro=5,admin=5] \\
+        [--provider-latency 0.3] [--provider-failure-rate 0.05] [--workers 2] \\
+        [--save-baseline] [--output resultado.json]
+
+Usa una base de datos de prueba: crea usuarios y PINes reales. Con --url la app
+ya está corriendo; las credenciales del admin salen de ADMIN_USER / ADMIN_PASSWORD
+y la latencia del proveedor es la de su PROVIDERS_CONFIG. Sale con código 1 si
+alguna ruta empeoró más que --tolerance respecto de la línea base.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baselines', 'loadtest.json')
+DEFAULT_MIX = 'navegar=50,latam=20,global=10,block=10,registro=5,admin=5'
+GAME_PAGES = ('/freefirelatam', '/freefire', '/blockstriker')
+PASSWORD = 'loadtest123'
+# Con menos requests que esto en una ruta, sus percentiles son ruido y no se comparan
+MIN_SAMPLES = 30
+
+
+class Stats:
+    """Latencias y estados por ruta, compartidas por todos los usuarios virtuales"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, route, seconds, status):
+        with self.lock:
+            entry = self.routes.setdefault(route, {'latencies': [], 'errors': 0, 'statuses': {}})
+            entry['latencies'].append(seconds)
+            key = str(status)
+            entry['statuses'][key] = entry['statuses'].get(key, 0) + 1
+            if not isinstance(status, int) or status >= 400:
+                entry['errors'] += 1
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Client:
+    """Sesión de un usuario virtual; cada request queda medido bajo el nombre de su ruta"""
+
+    def __init__(self, base_url, stats):
+        self.base_url = base_url
+        self.stats = stats
+        self.session = requests.Session()
+
+    def request(self, method, path, route=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=60,
+                                            allow_redirects=False, **kwargs)
+            status = response.status_code
+        except requests.RequestException as e:
+            response, status = None, type(e).__name__
+        self.stats.record(route or f"{method} {path}", time.perf_counter() - started, status)
+        return response
+
+    def login(self, email, password):
+        response = self.request('POST', '/login', json={'email': email, 'password': password})
+        return response is not None and response.status_code == 200
+
+
+class LoadTest:
+    def __init__(self, args, base_url, admin_email, admin_password):
+        self.args = args
+        self.base_url = base_url
+        self.admin_email = admin_email
+        self.admin_password = admin_password
+        self.stats = Stats()
+        # La preparación no cuenta en los resultados
+        self.admin = Client(base_url, Stats())
+        self.run_id = secrets.token_hex(3)
+        self.users = []
+        self.prices = {}
+        self.sequence = 0
+        self.sequence_lock = threading.Lock()
+
+    def next_id(self):
+        with self.sequence_lock:
+            self.sequence += 1
+            return f"{self.run_id}{self.sequence}"
+
+    def register(self, client):
+        suffix = self.next_id()
+        email = f"loadtest-{suffix}@example.com"
+        response = client.request('POST', '/register', json={
+            'nombre': 'Carga', 'apellido': 'Prueba', 'telefono': '04141234567',
+            'email': email, 'password': PASSWORD
+        })
+        return email if response is not None and response.status_code == 200 else None
+
+    def add_local_pin(self, client, game_type, route=None):
+        # transactions.pin es VARCHAR(10)
+        pin_code = f"LT{secrets.token_hex(4).upper()}"
+        return client.request('POST', '/admin/add-single-pin', route=route,
+                              json={'pin_code': pin_code, 'value': 1, 'game_type': game_type})
+
+    def setup(self):
+        """Usuarios con saldo, PINes locales de Free Fire Global y precios vigentes"""
+        if not self.admin.login(self.admin_email, self.admin_password):
+            raise RuntimeError("No se pudo iniciar sesión como admin (ADMIN_USER / ADMIN_PASSWORD)")
+
+        emails = [self.register(self.admin) for _ in range(self.args.users)]
+        if not all(emails):
+            raise RuntimeError("No se pudieron registrar los usuarios de prueba")
+        by_email = {user['email']: user['user_id'] for user in self.admin.request('GET', '/admin/users').json()['users']}
+        for email in emails:
+            self.admin.request('POST', f"/admin/user/{by_email[email]}/add-credit", json={'amount': self.args.credit})
+            self.users.append((email, by_email[email]))
+
+        for _ in range(self.args.global_pins):
+            self.add_local_pin(self.admin, 'freefire_global')
+
+        self.prices = self.admin.request('GET', '/admin/get-game-prices').json()['prices']
+
+    def purchase(self, client, game_type, path, option, extra=None):
+        payload = {'option_value': option, 'real_price': self.prices[game_type][str(option)]}
+        payload.update(extra or {})
+        client.request('POST', path, json=payload)
+
+    def run_scenario(self, name, client, user_id):
+        if name == 'navegar':
+            client.request('GET', '/dashboard')
+            client.request('GET', random.choice(GAME_PAGES), route='GET /<juego>')
+            client.request('GET', '/admin/get-game-prices')
+        elif name == 'latam':
+            self.purchase(client, 'freefire_latam', '/freefire-latam/validate-recharge', 1)
+        elif name == 'global':
+            self.purchase(client, 'freefire_global', '/freefire-global/validate-recharge', 1)
+        elif name == 'block':
+            option = random.choice(sorted(self.prices['block_striker'], key=int))
+            self.purchase(client, 'block_striker', '/block-striker/validate-recharge', int(option),
+                          {'player_id': f"P{user_id}"})
+        elif name == 'registro':
+            new_user = Client(self.base_url, self.stats)
+            email = self.register(new_user)
+            if email:
+                new_user.login(email, PASSWORD)
+        elif name == 'admin':
+            admin = Client(self.base_url, self.stats)
+            admin.session.cookies = self.admin.session.cookies
+            admin.request('GET', '/admin')
+            admin.request('GET', '/admin/users')
+            _, target = random.choice(self.users)
+            admin.request('POST', f"/admin/user/{target}/add-credit", route='POST /admin/user/<id>/add-credit',
+                          json={'amount': 1})
+            self.add_local_pin(admin, 'freefire_global')
+
+    def virtual_user(self, index, mix, deadline):
+        time.sleep(self.args.ramp_up * index / max(1, self.args.users))
+        email, user_id = self.users[index % len(self.users)]
+        client = Client(self.base_url, self.stats)
+        if not client.login(email, PASSWORD):
+            return
+        names, weights = zip(*mix.items())
+        while time.monotonic() < deadline:
+            self.run_scenario(random.choices(names, weights)[0], client, user_id)
+            if self.args.think:
+                time.sleep(random.uniform(0.5, 1.5) * self.args.think)
+
+    def run(self, mix):
+        started = time.monotonic()
+        deadline = started + self.args.ramp_up + self.args.duration
+        threads = [threading.Thread(target=self.virtual_user, args=(i, mix, deadline), daemon=True)
+                   for i in range(self.args.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - started
+
+
+def summarize(stats, elapsed):
+    routes = {}
+    for route, entry in sorted(stats.routes.items()):
+        latencies = sorted(entry['latencies'])
+        routes[route] = {
+            'requests': len(latencies),
+            'rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+            'error_rate': round(entry['errors'] / len(latencies), 4),
+            'statuses': entry['statuses'],
+        }
+    total = sum(r['requests'] for r in routes.values())
+    errors = sum(r['error_rate'] * r['requests'] for r in routes.values())
+    return {
+        'elapsed_s': round(elapsed, 1),
+        'requests': total,
+        'rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'routes': routes,
+    }
+
+
+def print_report(summary):
+    print(f"\n{'ruta':<44} {'req':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errores':>8}")
+    for route, r in summary['routes'].items():
+        print(f"{route:<44} {r['requests']:>6} {r['rps']:>7.1f} {r['p50_ms']:>8.0f} {r['p95_ms']:>8.0f} "
+              f"{r['p99_ms']:>8.0f} {r['error_rate']:>8.1%}")
+        failed = {status: count for status, count in r['statuses'].items()
+                  if not status.isdigit() or int(status) >= 400}
+        if failed:
+            print(f"{'':<44} {json.dumps(failed)}")
+    print(f"\nTotal: {summary['requests']} requests en {summary['elapsed_s']} s = {summary['rps']:.1f} req/s, "
+          f"errores {summary['error_rate']:.1%}")
+
+
+def compare(summary, baseline, tolerance):
+    """Comparar contra la línea base; devuelve la lista de regresiones"""
+    regressions = []
+    print(f"\nContra la línea base ({baseline['meta'].get('version') or 'sin versión'}, "
+          f"{baseline['meta'].get('date', '?')}):")
+    if baseline['meta'].get('params') != summary['meta']['params']:
+        print("⚠️  Los parámetros de la corrida difieren de los de la línea base; la comparación es orientativa")
+    before_env, now_env = baseline['meta'].get('environment') or {}, summary['meta'].get('environment') or {}
+    if (before_env.get('cpus'), before_env.get('postgres')) != (now_env.get('cpus'), now_env.get('postgres')):
+        print(f"⚠️  La línea base se midió en otra máquina ({before_env}); la comparación es orientativa")
+
+    print(f"{'ruta':<44} {'p95 antes':>10} {'p95 ahora':>10} {'req/s antes':>12} {'req/s ahora':>12}")
+    for route, before in baseline['routes'].items():
+        now = summary['routes'].get(route)
+        if now is None:
+            continue
+        problems = []
+        if min(before['requests'], now['requests']) < MIN_SAMPLES:
+            print(f"{route:<44} {'(pocas muestras, no se compara)':>46}")
+            continue
+        if before['p95_ms'] and now['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            problems.append('p95')
+        if now['rps'] < before['rps'] * (1 - tolerance):
+            problems.append('req/s')
+        if now['error_rate'] > before['error_rate'] + 0.01:
+            problems.append('errores')
+        mark = f"  ⚠️  {', '.join(problems)}" if problems else ''
+        print(f"{route:<44} {before['p95_ms']:>10.0f} {now['p95_ms']:>10.0f} {before['rps']:>12.1f} "
+              f"{now['rps']:>12.1f}{mark}")
+        regressions.extend(f"{route}: {problem}" for problem in problems)
+    return regressions
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ('navegar', 'latam', 'global', 'block', 'registro', 'admin'):
+            raise argparse.ArgumentTypeError(f"escenario desconocido: {name}")
+        mix[name] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Dónde se midió; una línea base de otra máquina no es comparable"""
+    from database import Database
+
+    env = {'cpus': os.cpu_count(), 'python': platform.python_version(), 'platform': platform.platform()}
+    db = Database(pooled=False)
+    if db.connect():
+        try:
+            rows = db.execute_query("SHOW server_version")
+            env['postgres'] = rows[0]['server_version'] if rows else None
+        finally:
+            db.disconnect()
+    return env
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url + '/health/ready', timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def start_server(args, workdir, admin_email, admin_password):
+    """Proveedor falso + gunicorn con la configuración de producción; devuelve (url, cerrar)"""
+    from fake_provider import start_fake_provider
+    from server_sizing import graceful_timeout
+    provider = start_fake_provider(latency=args.provider_latency, jitter=args.provider_latency / 5,
+                                   failure_rate=args.provider_failure_rate)
+    config_path = os.path.join(workdir, 'providers.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'freefire_latam': [{'name': 'falso', 'url': provider.url, 'user': 'carga',
+                                       'password': 'carga'}]}, f)
+
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), PROVIDERS_CONFIG=config_path,
+               ADMIN_USER=admin_email, ADMIN_PASSWORD=admin_password,
+               FLASK_SECRET_KEY=os.getenv('FLASK_SECRET_KEY', 'loadtest'),
+               SHARED_CACHE_PATH=os.path.join(workdir, 'shared_cache.sqlite3'))
+    if args.workers:
+        env['GUNICORN_WORKERS'] = str(args.workers)
+    if args.threads:
+        env['GUNICORN_THREADS'] = str(args.threads)
+
+    log_path = os.path.join(workdir, 'gunicorn.log')
+    log_file = open(log_path, 'w', encoding='utf-8')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'main:app'],
+                              cwd=ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+    def stop():
+        server.terminate()
+        # Los workers drenan hasta graceful_timeout antes de salir
+        server.wait(timeout=graceful_timeout() + 10)
+        log_file.close()
+        provider.shutdown()
+
+    url = f"http://127.0.0.1:{port}"
+    if not wait_until_ready(url):
+        stop()
+        with open(log_path, 'r', encoding='utf-8') as f:
+            print(f.read()[-3000:])
+        raise RuntimeError("gunicorn no quedó listo (ver el log de arriba; ¿DATABASE_URL apunta a un Postgres local?)")
+    return url, stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga del flujo de compra')
+    parser.add_argument('--url', help='Servidor ya levantado (no se inician gunicorn ni el proveedor falso)')
+    parser.add_argument('--users', type=int, default=20, help='Usuarios virtuales concurrentes')
+    parser.add_argument('--duration', type=float, default=60, help='Segundos de carga después del ramp-up')
+    parser.add_argument('--ramp-up', type=float, default=10, help='Segundos para arrancar a todos los usuarios')
+    parser.add_argument('--think', type=float, default=0.5, help='Pausa media entre escenarios (segundos)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f'Pesos ({DEFAULT_MIX})')
+    parser.add_argument('--provider-latency', type=float, default=0.3)
+    parser.add_argument('--provider-failure-rate', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, help='GUNICORN_WORKERS (por defecto, según server_sizing)')
+    parser.add_argument('--threads', type=int, help='GUNICORN_THREADS (por defecto, según server_sizing)')
+    parser.add_argument('--credit', type=float, default=1000, help='Saldo inicial de cada usuario')
+    parser.add_argument('--global-pins', type=int, default=200, help='PINes locales de Free Fire Global a cargar')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Reemplazar la línea base con esta corrida')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Empeoramiento tolerado (0.2 = 20%%)')
+    parser.add_argument('--output', help='Guardar también el resultado en este archivo JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.url:
+            url, stop = args.url.rstrip('/'), None
+            admin_email, admin_password = os.getenv('ADMIN_USER'), os.getenv('ADMIN_PASSWORD')
+        else:
+            admin_email, admin_password = 'admin-carga@example.com', secrets.token_hex(8)
+            url, stop = start_server(args, workdir, admin_email, admin_password)
+
+        try:
+            test = LoadTest(args, url, admin_email, admin_password)
+            print(f"Preparando {args.users} usuarios y {args.global_pins} PINes locales en {url}...")
+            test.setup()
+            print(f"Carga: {args.users} usuarios, {args.ramp_up:.0f} s de ramp-up + {args.duration:.0f} s, "
+                  f"mezcla {json.dumps(args.mix)}, proveedor {args.provider_latency * 1000:.0f} ms")
+            elapsed = test.run(args.mix)
+        finally:
+            if stop:
+                stop()
+
+    summary = summarize(test.stats, elapsed)
+    summary['meta'] = {
+        'version': git_version(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'params': {
+            'users': args.users, 'duration': args.duration, 'ramp_up': args.ramp_up, 'think': args.think,
+            'mix': args.mix, 'provider_latency': args.provider_latency,
+            'provider_failure_rate': args.provider_failure_rate, 'workers': args.workers, 'threads': args.threads,
+        },
+    }
+    print_report(summary)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(summary, json.load(f), args.tolerance)
+
+    for path in filter(None, (args.output, args.baseline if args.save_baseline else None)):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"Resultado guardado en {path}")
+
+    if regressions:
+        print(f"\n❌ Regresiones: {'; '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Build de archivos estáticos: minifica, agrega hash de contenido y precomprime.
+
+Procesa los CSS y JS de static/ y deja en static/dist/:
+
+    styles.3f2a1b9c04.css       versión minificada con hash en el nombre
+    styles.3f2a1b9c04.css.gz    precomprimida con gzip
+    styles.3f2a1b9c04.css.br    precomprimida con brotli (si el paquete brotli está instalado)
+    assets-manifest.json        {"styles.css": "styles.3f2a1b9c04.css", ...}
+
+Las plantillas usan static_url('styles.css'), que resuelve el nombre con hash
+desde el manifiesto (ver static_assets.py). Se ejecuta en el build de Render:
+
+    python build_static.py
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'assets-manifest.json'
+
+# El service worker debe mantener una URL fija para que el navegador lo actualice
+EXCLUDED_FILES = {'service-worker.js'}
+# Debajo de este tamaño comprimir no compensa (cabeceras y CPU del cliente)
+MIN_COMPRESS_BYTES = 256
+
+
+def minify_css(source):
+    """Quitar comentarios y espacios innecesarios de una hoja de estilos"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    source = source.replace(';}', '}')
+    return source.strip()
+
+
+def minify_js(source):
+    """Minificación conservadora: sangría, líneas vacías y comentarios de línea completa.
+
+    Las líneas dentro de template literals (`...`) multilínea se dejan intactas.
+    """
+    lines = []
+    in_template = False
+    for line in source.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                lines.append(stripped)
+        if len(re.findall(r'(?<!\\)`', line)) % 2 == 1:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def write_compressed(path, data):
+    """Guardar las variantes .gz y .br junto al archivo; devuelve los tamaños escritos"""
+    sizes = {}
+    if len(data) < MIN_COMPRESS_BYTES:
+        return sizes
+
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    with open(path + '.gz', 'wb') as f:
+        f.write(gz)
+    sizes['gzip'] = len(gz)
+
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        with open(path + '.br', 'wb') as f:
+            f.write(br)
+        sizes['br'] = len(br)
+    return sizes
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Generar static/dist y su manifiesto; devuelve el manifiesto"""
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+
+    if brotli is None:
+        print("⚠️  Paquete brotli no instalado: solo se generan variantes gzip")
+
+    manifest = {}
+    for name in sorted(os.listdir(static_dir)):
+        source_path = os.path.join(static_dir, name)
+        root, ext = os.path.splitext(name)
+        if not os.path.isfile(source_path) or name in EXCLUDED_FILES or ext not in MINIFIERS:
+            continue
+
+        with open(source_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        data = MINIFIERS[ext](source).encode('utf-8')
+
+        hashed_name = f"{root}.{content_hash(data)}{ext}"
+        hashed_path = os.path.join(dist_dir, hashed_name)
+        with open(hashed_path, 'wb') as f:
+            f.write(data)
+        sizes = write_compressed(hashed_path, data)
+        manifest[name] = hashed_name
+
+        compressed = ', '.join(f"{encoding} {size:,} B" for encoding, size in sizes.items())
+        print(f"📦 {name}: {len(source.encode('utf-8')):,} B → {len(data):,} B"
+              f"{f' ({compressed})' if compressed else ''} → dist/{hashed_name}")
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"✅ {len(manifest)} archivos estáticos generados en {os.path.relpath(dist_dir, BASE_DIR)}/")
+    return manifest
+
+
+if __name__ == '__main__':
+    build()
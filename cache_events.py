@@ -0,0 +1,123 @@
+"""
+Invalidación de caché por eventos de Postgres (LISTEN/NOTIFY).
+
+Las escrituras de precios y banner emiten un NOTIFY en el canal
+cache_invalidation. Un solo hilo por nodo escucha ese canal con una conexión
+dedicada e invalida las entradas de la caché compartida apenas llega el aviso,
+así todos los workers e instancias dejan de servir valores viejos sin esperar
+el TTL.
+
+Todos los workers arrancan el hilo, pero solo escucha el que toma el flock de
+lock_path (junto al archivo de la caché compartida); los demás esperan en
+reserva y uno toma el relevo si el líder muere (el kernel libera el lock). Al
+tomar el relevo se invalida todo: los avisos del intervalo sin líder se perdieron.
+"""
+import fcntl
+import os
+import select
+import threading
+import time
+
+from app_logging import get_logger
+from database import Database
+
+log = get_logger('cache')
+
+CHANNEL = 'cache_invalidation'
+
+# Segundos entre reintentos de conexión del listener si la base de datos no responde
+RECONNECT_DELAY = 5
+# Segundos entre intentos de un worker en reserva de tomar el lugar del listener del nodo
+STANDBY_POLL = 5
+
+
+class CacheInvalidationListener(threading.Thread):
+    """Hilo que escucha el canal de invalidación y llama a on_change(payload)"""
+
+    def __init__(self, on_change, poll_interval=5, lock_path=None):
+        super().__init__(name='cache-invalidation-listener', daemon=True)
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.lock_path = lock_path
+        self.leader = lock_path is None
+        self._reconnecting = False
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        if self.lock_path is None:
+            self._serve()
+            return
+
+        # El archivo queda abierto mientras viva el proceso: cerrarlo liberaría el lock
+        with open(self.lock_path, 'a') as lock_file:
+            while not self._stop_event.is_set():
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    self._stop_event.wait(STANDBY_POLL)
+            else:
+                return
+
+            self.leader = True
+            # Lo que cambió mientras nadie escuchaba (relevo de un líder muerto) ya no es confiable
+            self._reconnecting = True
+            log.info("Listener de invalidación del nodo", pid=os.getpid())
+            self._serve()
+
+    def _serve(self):
+        while not self._stop_event.is_set():
+            db = Database(pooled=False)
+            if not db.connect():
+                self._reconnecting = True
+                self._stop_event.wait(RECONNECT_DELAY)
+                continue
+
+            try:
+                db.connection.autocommit = True
+                db.cursor.execute(f"LISTEN {CHANNEL}")
+                log.info("Escuchando invalidaciones", channel=CHANNEL)
+                if self._reconnecting:
+                    # Lo que cambió mientras no escuchábamos ya no es confiable
+                    self.on_change(None)
+                self._reconnecting = True
+                self._listen(db.connection)
+            except Exception as e:
+                log.warning("Listener de invalidación desconectado", error=str(e))
+                self._stop_event.wait(RECONNECT_DELAY)
+            finally:
+                try:
+                    db.disconnect()
+                except Exception:
+                    pass
+
+    def _listen(self, connection):
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([connection], [], [], self.poll_interval)
+            if not readable:
+                continue
+            connection.poll()
+            while connection.notifies:
+                notify = connection.notifies.pop(0)
+                started = time.monotonic()
+                self.on_change(notify.payload)
+                log.debug("Invalidación aplicada", payload=notify.payload,
+                          elapsed_ms=round((time.monotonic() - started) * 1000, 1))
+
+
+_listener = None
+
+
+def start_listener(on_change, lock_path=None):
+    """Iniciar el listener del proceso actual (llamar después del fork de cada worker).
+
+    Con lock_path solo escucha un proceso por nodo a la vez; los demás quedan en reserva.
+    """
+    global _listener
+    if _listener is None or not _listener.is_alive():
+        _listener = CacheInvalidationListener(on_change, lock_path=lock_path)
+        _listener.start()
+    return _listener
@@ -0,0 +1,222 @@
+"""
+Catálogo de productos: juegos, opciones, nombres y precios.
+
+Es la única fuente de opciones y precios para validación, plantillas y
+edición del admin. Los precios vienen de la base de datos (o de los valores
+por defecto definidos aquí) y se compilan en un Catalog inmutable y
+versionado con búsquedas O(1) por (juego, opción) y precios en centavos.
+Cuando cambian los precios se construye un Catalog nuevo y se reemplaza
+de forma atómica.
+"""
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+from types import MappingProxyType
+
+from app_logging import get_logger
+
+log = get_logger('catalog')
+
+# Definición de juegos y opciones: (opción, nombre, etiqueta corta, precio por defecto)
+GAME_DEFINITIONS = {
+    'freefire_latam': {
+        'title': 'Free Fire Latam',
+        'options': (
+            (1, '110 💎 Diamantes', '110 💎', 0.66),
+            (2, '341 💎 Diamantes', '341 💎', 1.99),
+            (3, '572 💎 Diamantes', '572 💎', 3.35),
+            (4, '1.166 💎 Diamantes', '1.166 💎', 6.70),
+            (5, '2.376 💎 Diamantes', '2.376 💎', 12.70),
+            (6, '6.138 💎 Diamantes', '6.138 💎', 29.50),
+            (7, '🎫 Tarjeta Básica', 'Tarjeta básica', 0.40),
+            (8, '🎫 Tarjeta Semanal', 'Tarjeta semanal', 1.40),
+            (9, '🎫 Tarjeta Mensual', 'Tarjeta mensual', 6.50),
+        )
+    },
+    'freefire_global': {
+        'title': 'Free Fire Global',
+        'options': (
+            (1, '100+10 💎 Diamantes', '100+10 diamantes', 0.86),
+            (2, '310+31 💎 Diamantes', '310+31 diamantes', 2.90),
+            (3, '520+52 💎 Diamantes', '520+52 diamantes', 4.00),
+            (4, '1.060+106 💎 Diamantes', '1.060+106 diamantes', 7.75),
+            (5, '2.180+218 💎 Diamantes', '2.180+218 diamantes', 15.30),
+            (6, '5.600+560 💎 Diamantes', '5.600+560 diamantes', 38.00),
+        )
+    },
+    'block_striker': {
+        'title': 'Block Striker',
+        'options': (
+            (1, '100+16 🪙 Monedas', '100+16 🪙', 0.82),
+            (2, '300+52 🪙 Monedas', '300+52 🪙', 2.60),
+            (3, '500+94 🪙 Monedas', '500+94 🪙', 4.30),
+            (4, '1,000+210 🪙 Monedas', '1,000+210 🪙', 8.65),
+            (5, '2,000+486 🪙 Monedas', '2,000+486 🪙', 17.30),
+            (6, '5,000+1,380 🪙 Monedas', '5,000+1,380 🪙', 43.15),
+            (7, '🎖️ Pase Elite', 'Pase Elite 🎖️', 3.50),
+            (8, '🎖️ Pase Elite Plus', 'Pase Elite (Plus) 🎖️', 8.00),
+            (9, '🔫 Pase de Mejora', 'Pase de Mejora 🔫', 1.85),
+        )
+    }
+}
+
+# Límites de precio aceptados al editar (en centavos)
+MIN_PRICE_CENTS = 1
+MAX_PRICE_CENTS = 100000
+
+
+def to_cents(amount):
+    """Convertir un monto en USD (float, str o Decimal) a centavos enteros"""
+    return int(round(float(amount) * 100))
+
+
+def default_prices():
+    """Precios por defecto en el formato {juego: {"opción": precio}}"""
+    return {
+        game_type: {str(option): price for option, _, _, price in definition['options']}
+        for game_type, definition in GAME_DEFINITIONS.items()
+    }
+
+
+@dataclass(frozen=True)
+class CatalogOption:
+    game_type: str
+    option: int
+    name: str
+    short_name: str
+    price_cents: int
+
+    @property
+    def price(self):
+        return self.price_cents / 100
+
+    @property
+    def price_display(self):
+        return f"{self.price_cents // 100}.{self.price_cents % 100:02d}"
+
+    @property
+    def display_name(self):
+        return f"{self.short_name} / ${self.price_display}"
+
+
+@dataclass(frozen=True)
+class CatalogGame:
+    game_type: str
+    title: str
+    options: tuple
+    min_option: int
+    max_option: int
+    min_price_cents: int
+    max_price_cents: int
+
+
+class Catalog:
+    """Catálogo compilado e inmutable; version cambia solo si cambian los precios"""
+
+    def __init__(self, prices):
+        options = {}
+        games = {}
+        for game_type, definition in GAME_DEFINITIONS.items():
+            game_prices = prices.get(game_type) or {}
+            game_options = []
+            for option, name, short_name, default_price in definition['options']:
+                price = game_prices.get(str(option), default_price)
+                catalog_option = CatalogOption(game_type, option, name, short_name, to_cents(price))
+                options[(game_type, option)] = catalog_option
+                game_options.append(catalog_option)
+
+            cents = [o.price_cents for o in game_options]
+            games[game_type] = CatalogGame(
+                game_type=game_type,
+                title=definition['title'],
+                options=tuple(game_options),
+                min_option=game_options[0].option,
+                max_option=game_options[-1].option,
+                min_price_cents=min(cents),
+                max_price_cents=max(cents)
+            )
+
+        self._options = MappingProxyType(options)
+        self.games = MappingProxyType(games)
+
+        # Formato histórico {juego: {"opción": precio}} usado por la API y el frontend
+        self.prices = MappingProxyType({
+            game_type: MappingProxyType({str(o.option): o.price for o in game.options})
+            for game_type, game in games.items()
+        })
+        canonical = json.dumps(self.prices_dict(), sort_keys=True, separators=(',', ':'))
+        self.version = hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:12]
+
+    @property
+    def etag(self):
+        return self.version
+
+    @cached_property
+    def prices_json(self):
+        """Respuesta de /admin/get-game-prices serializada una sola vez por versión"""
+        payload = {"success": True, "version": self.version, "prices": self.prices_dict()}
+        return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def lookup(self, game_type, option):
+        """CatalogOption de (juego, opción) o None; opción puede venir como int o str"""
+        try:
+            return self._options.get((game_type, int(option)))
+        except (TypeError, ValueError):
+            return None
+
+    def game(self, game_type):
+        return self.games.get(game_type)
+
+    def prices_dict(self):
+        """Copia mutable de los precios en formato histórico"""
+        return {game_type: dict(prices) for game_type, prices in self.prices.items()}
+
+    def validate_price_update(self, game_type, new_prices):
+        """Validar precios editados por el admin; devuelve (precios normalizados, error)"""
+        game = self.game(game_type)
+        if game is None:
+            return None, "Tipo de juego inválido"
+
+        normalized = {}
+        for key, price in new_prices.items():
+            if self.lookup(game_type, key) is None:
+                return None, f"Opción {key} no válida para {game.title}"
+            if isinstance(price, bool) or not isinstance(price, (int, float)):
+                return None, f"Precio inválido para opción {key}"
+            cents = to_cents(price)
+            if not MIN_PRICE_CENTS <= cents <= MAX_PRICE_CENTS:
+                return None, f"Precio inválido para opción {key}"
+            normalized[str(int(key))] = cents / 100
+
+        return normalized, None
+
+
+_current = Catalog(default_prices())
+_source = None
+_swap_lock = threading.Lock()
+
+
+def current_catalog():
+    """Catálogo vigente en este proceso"""
+    return _current
+
+
+def install_prices(prices):
+    """Compilar y publicar un catálogo nuevo si los precios cambiaron; devuelve el vigente.
+
+    prices es el dict que entrega la caché: mientras sea el mismo objeto no se recompila.
+    """
+    global _current, _source
+    if prices is _source:
+        return _current
+
+    with _swap_lock:
+        if prices is not _source:
+            new_catalog = Catalog(prices)
+            if new_catalog.version != _current.version:
+                log.info("Catálogo actualizado", version=new_catalog.version)
+                _current = new_catalog
+            _source = prices
+    return _current
@@ -0,0 +1,326 @@
+"""
+Compras seguras ante reinicios: drenaje ordenado y diario reconciliable.
+
+Los pasos de una compra (descontar saldo, obtener el PIN, registrar la
+transacción) no son una sola transacción de base de datos y la llamada al
+proveedor puede tardar hasta 30 s. Para que un deploy o un reciclado de worker
+no deje saldo descontado sin PIN:
+
+- Las rutas de compra usan @guard: mientras el worker drena (gunicorn marcó
+  worker.alive = False) las compras nuevas reciben 503 con Retry-After y las que
+  están en curso terminan dentro de graceful_timeout.
+- Cada compra deja una fila en purchase_journal y la actualiza en cada paso
+  (start_purchase / requesting_pin / debit / take_local_pin / pin_secured /
+  record_transaction / failed). Un kill entre un efecto y su registro no debe
+  dejar la fila mintiendo: el saldo, el PIN local y la transacción final se
+  escriben en la misma sentencia que los anota en el diario, y la intención se
+  registra antes de pedir el PIN al proveedor (no se puede deshacer).
+- Al salir el worker marca como "interrupted" las compras que no terminaron. Un
+  hilo por worker reconcilia cada PURCHASE_RECONCILE_INTERVAL segundos las filas
+  sin cerrar de más de PURCHASE_RECONCILE_AFTER segundos (ver
+  Database.journal_reconcile): completa, devuelve el PIN al stock o reembolsa.
+  Nunca antes de RECONCILE_MIN_AGE: una fila más nueva puede seguir en curso.
+"""
+import contextvars
+import math
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify
+
+import metrics
+from app_logging import get_logger
+from database import Database
+from providers import purchase_deadline
+from server_sizing import graceful_timeout
+
+log = get_logger('checkout')
+
+# Una fila puede pasar la llamada al proveedor sin actualizarse y un worker que drena vive
+# hasta graceful_timeout: antes de esto la compra puede seguir en curso en algún worker
+RECONCILE_MIN_AGE = graceful_timeout() + math.ceil(purchase_deadline())
+PURCHASE_RECONCILE_AFTER = max(int(os.getenv('PURCHASE_RECONCILE_AFTER', '300')), RECONCILE_MIN_AGE)
+PURCHASE_RECONCILE_INTERVAL = float(os.getenv('PURCHASE_RECONCILE_INTERVAL', '60'))
+# Cada cuánto el monitor revisa si gunicorn pidió al worker terminar
+DRAIN_POLL_INTERVAL = 0.5
+
+PURCHASES_IN_FLIGHT = metrics.registry.gauge('purchases_in_flight', 'Compras en curso en el worker')
+PURCHASES_REJECTED_DRAINING = metrics.registry.counter(
+    'purchases_rejected_draining_total', 'Compras rechazadas porque el worker se está apagando', ('game',))
+PURCHASES_INTERRUPTED = metrics.registry.counter(
+    'purchases_interrupted_total', 'Compras sin terminar al apagarse un worker', ('game',))
+PURCHASES_RECONCILED = metrics.registry.counter(
+    'purchases_reconciled_total', 'Compras interrumpidas reconciliadas por resolución', ('resolution',))
+
+
+class PurchaseRecord:
+    """Fila del diario de una compra; cada método registra un paso"""
+
+    def __init__(self, db, user_id, game_type, option_value, price):
+        self.db = db
+        self.user_id = user_id
+        self.game_type = game_type
+        self.debited_amount = None
+        self.pin_code = None
+        self.pin_source = None
+        self.resolved = False
+        self.id = db.journal_start(user_id, game_type, option_value, price)
+        if self.id is None:
+            log.warning("Compra sin diario (no se pudo registrar)", game_type=game_type, user=user_id)
+
+    def _update(self, **fields):
+        if self.id is not None:
+            self.db.journal_update(self.id, **fields)
+
+    def debited(self, amount):
+        """Registrar un descuento que no tocó el saldo (admin)"""
+        self.debited_amount = amount
+        self._update(debited_amount=amount)
+
+    def debit(self, new_balance, amount):
+        """Descontar el saldo y anotarlo en el diario en la misma sentencia; None si no se pudo"""
+        result = self.db.update_user_balance(self.user_id, new_balance, journal_id=self.id,
+                                             current_balance=new_balance + amount)
+        if result is not None:
+            self.debited_amount = amount
+        return result
+
+    def refund(self, balance):
+        """Devolver el saldo descontado (el diario queda en 0 en la misma sentencia)"""
+        current_balance = balance - self.debited_amount if self.debited_amount is not None else None
+        result = self.db.update_user_balance(self.user_id, balance, journal_id=self.id,
+                                             current_balance=current_balance)
+        if result is not None:
+            self.debited_amount = 0
+        return result
+
+    def take_local_pin(self, pin):
+        """Sacar el PIN del stock y anotarlo en el diario en la misma sentencia"""
+        used = self.db.use_pin(pin['id'], self.user_id, journal_id=self.id)
+        if used:
+            self.pin_code = pin['pin_code']
+            self.pin_source = 'local'
+        return used
+
+    def requesting_pin(self):
+        """Antes de pedir el PIN al proveedor: si el worker muere esperando, el PIN pudo emitirse"""
+        self.pin_source = 'api_request'
+        self._update(pin_source='api_request')
+
+    def pin_secured(self, pin_code, source):
+        self.pin_code = pin_code
+        self.pin_source = source
+        self._update(pin_code=pin_code, pin_source=source)
+
+    def record_transaction(self, transaction_id, pin, amount):
+        """Insertar la transacción y cerrar el diario como completed en la misma sentencia"""
+        return self._completed(self.db.insert_transaction(
+            self.user_id, pin, transaction_id, amount, journal_id=self.id))
+
+    def record_block_striker_transaction(self, transaction_id, player_id, amount, option_value):
+        return self._completed(self.db.insert_block_striker_transaction(
+            self.user_id, player_id, None, transaction_id, amount, option_value, journal_id=self.id))
+
+    def _completed(self, result):
+        # Si la sentencia falló la fila sigue abierta y la reconciliación registra la transacción
+        if result:
+            self.resolved = True
+        return result
+
+    def failed(self, reason):
+        """La ruta deshizo lo hecho (reembolso incluido) y la compra no se concretó"""
+        if self.pin_source == 'api':
+            # El PIN comprado al proveedor no se entregó: queda para que la reconciliación lo devuelva al stock
+            log.warning("Compra fallida con PIN del proveedor sin entregar", journal_id=self.id, reason=reason)
+            self._update(resolution=reason)
+            return
+        self.resolved = True
+        self._update(status='failed', resolution=reason)
+
+    def provider_unknown(self, provider, reason):
+        """El proveedor pudo haber emitido el PIN sin entregarlo: queda para revisión manual, no se reconcilia sola"""
+        self.resolved = True
+        self._update(status='needs_review', resolution=f"{provider}: {reason}"[:50])
+
+    @property
+    def needs_reconciliation(self):
+        return self.debited_amount is not None or self.pin_code is not None or self.pin_source is not None
+
+
+class _InFlight:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.draining = False
+        self.requests = 0
+        self.records = set()
+        self.lock = threading.Lock()
+
+
+_state = _InFlight()
+_request_records = contextvars.ContextVar('purchase_records', default=None)
+
+
+def _current():
+    global _state
+    if _state.pid != os.getpid():
+        _state = _InFlight()
+    return _state
+
+
+def is_draining():
+    return _current().draining
+
+
+def start_purchase(db, user_id, game_type, option_value, price):
+    """Abrir la fila del diario de la compra del request actual (dentro de @guard)"""
+    record = PurchaseRecord(db, user_id, game_type, option_value, price)
+    records = _request_records.get()
+    if records is not None:
+        records.append(record)
+    if record.id is not None:
+        state = _current()
+        with state.lock:
+            state.records.add(record)
+    return record
+
+
+def _finish_records(records):
+    """Cerrar lo que la ruta dejó abierto: sin pasos hechos es un fallo, si no queda para reconciliar"""
+    state = _current()
+    pending = [r for r in records if r.id is not None and not r.resolved]
+    with state.lock:
+        for record in records:
+            state.records.discard(record)
+    if not pending:
+        return
+
+    # La conexión de la ruta ya volvió al pool
+    db = Database()
+    if not db.connect():
+        return
+    try:
+        for record in pending:
+            if record.needs_reconciliation:
+                PURCHASES_INTERRUPTED.inc(game=record.game_type)
+                log.warning("Compra sin terminar, queda para reconciliar", journal_id=record.id,
+                            game_type=record.game_type)
+                db.journal_mark_interrupted([record.id])
+            else:
+                db.journal_update(record.id, status='failed', resolution='sin_cambios')
+    finally:
+        db.disconnect()
+
+
+def guard(game_type):
+    """Decorador de rutas de compra: 503 si el worker drena; sigue las compras en curso"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            state = _current()
+            with state.lock:
+                if state.draining:
+                    PURCHASES_REJECTED_DRAINING.inc(game=game_type)
+                    return jsonify({
+                        "error": "El servidor se está reiniciando. Intenta nuevamente en unos segundos.",
+                        "retry": True
+                    }), 503, {'Retry-After': '5'}
+                state.requests += 1
+
+            token = _request_records.set([])
+            try:
+                return f(*args, **kwargs)
+            finally:
+                records = _request_records.get()
+                _request_records.reset(token)
+                try:
+                    _finish_records(records)
+                finally:
+                    with state.lock:
+                        state.requests -= 1
+        return decorated_function
+    return decorator
+
+
+def begin_drain():
+    state = _current()
+    with state.lock:
+        if state.draining:
+            return
+        state.draining = True
+    log.info("Worker drenando: no acepta compras nuevas", in_flight=state.requests)
+
+
+def interrupt_in_flight():
+    """Al salir el worker: marcar como interrumpidas las compras con pasos hechos y sin cerrar.
+
+    Si el hilo de una de ellas termina después, su completed() todavía gana
+    (journal_update acepta filas en estado interrupted).
+    """
+    state = _current()
+    with state.lock:
+        pending = [r for r in state.records if not r.resolved and r.needs_reconciliation]
+    if not pending:
+        return 0
+
+    db = Database(pooled=False)
+    if not db.connect():
+        log.error("No se pudieron marcar compras interrumpidas", count=len(pending))
+        return len(pending)
+    try:
+        db.journal_mark_interrupted([r.id for r in pending])
+    finally:
+        db.disconnect()
+    for record in pending:
+        PURCHASES_INTERRUPTED.inc(game=record.game_type)
+    log.warning("Compras interrumpidas al apagar el worker", journal_ids=[r.id for r in pending])
+    return len(pending)
+
+
+def reconcile(older_than=PURCHASE_RECONCILE_AFTER, limit=20):
+    """Reconciliar compras sin cerrar hace más de older_than (al menos RECONCILE_MIN_AGE); {resolución: cantidad}"""
+    older_than = max(older_than, RECONCILE_MIN_AGE)
+    db = Database()
+    if not db.connect():
+        return None
+    summary = {}
+    try:
+        for entry in db.journal_claim_stale(older_than, limit):
+            resolution = db.journal_reconcile(entry)
+            if resolution is None:
+                continue
+            summary[resolution] = summary.get(resolution, 0) + 1
+            PURCHASES_RECONCILED.inc(resolution=resolution)
+            log.warning("Compra interrumpida reconciliada", journal_id=entry['id'], resolution=resolution,
+                        user=entry['user_id'], game_type=entry['game_type'])
+    finally:
+        db.disconnect()
+    return summary
+
+
+def _update_gauges():
+    state = _current()
+    PURCHASES_IN_FLIGHT.set(state.requests)
+
+
+metrics.registry.register_gauge_callback(_update_gauges)
+
+
+def start_monitor(worker):
+    """Hilo del worker: empieza a drenar cuando gunicorn lo marca para terminar y reconcilia"""
+    def run():
+        next_reconcile = time.monotonic()
+        while worker.alive:
+            if time.monotonic() >= next_reconcile:
+                try:
+                    reconcile()
+                except Exception as e:
+                    log.warning("Error reconciliando compras", error=str(e))
+                next_reconcile = time.monotonic() + PURCHASE_RECONCILE_INTERVAL
+            time.sleep(DRAIN_POLL_INTERVAL)
+        begin_drain()
+
+    thread = threading.Thread(target=run, name='checkout-monitor', daemon=True)
+    thread.start()
+    return thread
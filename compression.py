@@ -0,0 +1,233 @@
+"""
+Compresión de respuestas dinámicas (HTML y JSON) como middleware WSGI.
+
+Negocia br o gzip según Accept-Encoding, solo comprime tipos de texto por encima
+de un tamaño mínimo, respeta respuestas ya comprimidas (p. ej. los estáticos
+precomprimidos de /assets) y Cache-Control: no-transform, y comprime en streaming:
+cada bloque que entrega la app sale comprimido sin esperar al cuerpo completo.
+
+Las apps que escriben el cuerpo con el write() de start_response (WSGI antiguo)
+pasan sin comprimir; si la app no llegó a llamar a start_response la respuesta
+se deja pasar tal cual.
+"""
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Respuestas más chicas no se comprimen (el ahorro no compensa cabeceras y CPU)
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '500'))
+# Niveles pensados para contenido dinámico: buena relación sin mucho costo de CPU
+GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+
+
+def parse_accept_encoding(header):
+    """{codificación: calidad} a partir de Accept-Encoding"""
+    accepted = {}
+    for part in (header or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    """'br', 'gzip' o None según lo que acepte el cliente (br tiene prioridad a igual calidad)"""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    candidates = []
+    if brotli is not None:
+        candidates.append(('br', accepted.get('br', wildcard)))
+    candidates.append(('gzip', accepted.get('gzip', wildcard)))
+    encoding, quality = max(candidates, key=lambda c: c[1])
+    return encoding if quality > 0 else None
+
+
+class _GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def make_compressor(encoding, gzip_level=GZIP_LEVEL, brotli_quality=BROTLI_QUALITY):
+    if encoding == 'br':
+        return _BrotliStream(brotli_quality)
+    return _GzipStream(gzip_level)
+
+
+class CompressionMiddleware:
+    """Envuelve una app WSGI y comprime sus respuestas de texto cuando conviene"""
+
+    def __init__(self, app, min_size=COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    def __call__(self, environ, start_response):
+        encoding = choose_encoding(environ.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        captured = {'written': []}
+
+        def write(data):
+            # Antes de decidir se guarda en orden; después va directo al servidor
+            if 'write' in captured:
+                captured['write'](data)
+            else:
+                captured['written'].append(data)
+
+        def capture_start_response(status, headers, exc_info=None):
+            if captured.get('passthrough'):
+                return start_response(status, headers, exc_info)
+            captured['status'] = status
+            captured['headers'] = headers
+            captured['exc_info'] = exc_info
+            return write
+
+        app_iter = self.app(environ, capture_start_response)
+        return self._respond(app_iter, captured, encoding, start_response)
+
+    def _should_compress(self, status, headers):
+        if not status.startswith('200'):
+            return False
+        header_map = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in header_map:
+            return False
+        if 'no-transform' in header_map.get('cache-control', '').lower():
+            return False
+        content_type = header_map.get('content-type', '').lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        content_length = header_map.get('content-length')
+        if content_length is not None and content_length.isdigit() and int(content_length) < self.min_size:
+            return False
+        return True
+
+    def _respond(self, app_iter, captured, encoding, start_response):
+        try:
+            iterator = iter(app_iter)
+            buffered = []
+            size = 0
+            if 'status' not in captured:
+                # Apps generadoras llaman a start_response al producir el primer bloque
+                for chunk in iterator:
+                    buffered.append(chunk)
+                    size += len(chunk)
+                    break
+
+            if 'status' not in captured:
+                # Sin start_response todavía: la respuesta pasa sin tocar
+                captured['passthrough'] = True
+                yield from buffered
+                yield from iterator
+                return
+
+            status, headers = captured['status'], captured['headers']
+            if captured['written'] or not self._should_compress(status, headers):
+                captured['write'] = start_response(status, headers, captured['exc_info'])
+                yield from captured['written']
+                yield from buffered
+                yield from iterator
+                return
+
+            # Acumular hasta min_size para decidir; un cuerpo chico sale sin comprimir.
+            # Lo escrito con write() mientras se iteraba va antes del bloque que siguió
+            if size < self.min_size:
+                for chunk in iterator:
+                    chunk = self._take_written(captured) + chunk
+                    buffered.append(chunk)
+                    size += len(chunk)
+                    if size >= self.min_size:
+                        break
+            if size < self.min_size:
+                captured['write'] = start_response(status, headers, captured['exc_info'])
+                yield from buffered
+                tail = self._take_written(captured)
+                if tail:
+                    yield tail
+                return
+
+            start_response(status, self._compressed_headers(headers, encoding), captured['exc_info'])
+            compressor = make_compressor(encoding)
+            first = compressor.compress(b''.join(buffered))
+            if first:
+                yield first
+            for chunk in iterator:
+                # Lo escrito con write() mientras se iteraba va comprimido en su lugar
+                chunk = self._take_written(captured) + chunk
+                if chunk:
+                    data = compressor.compress(chunk)
+                    if data:
+                        yield data
+            tail = self._take_written(captured)
+            if tail:
+                yield compressor.compress(tail)
+            yield compressor.finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    @staticmethod
+    def _take_written(captured):
+        data = b''.join(captured['written'])
+        captured['written'].clear()
+        return data
+
+    @staticmethod
+    def _compressed_headers(headers, encoding):
+        new_headers = []
+        vary = []
+        for name, value in headers:
+            lower = name.lower()
+            if lower == 'content-length':
+                continue
+            if lower == 'vary':
+                vary.extend(v.strip() for v in value.split(',') if v.strip())
+                continue
+            if lower == 'etag' and not value.startswith('W/'):
+                # El cuerpo comprimido ya no es byte a byte igual: el ETag pasa a ser débil
+                value = f'W/{value}'
+            new_headers.append((name, value))
+
+        if 'accept-encoding' not in (v.lower() for v in vary):
+            vary.append('Accept-Encoding')
+        new_headers.append(('Vary', ', '.join(vary)))
+        new_headers.append(('Content-Encoding', encoding))
+        return new_headers
@@ -1,91 +1,322 @@
 import os
+import threading
+import time
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 import urllib.parse
 
+import metrics
+import query_budget
+from app_logging import get_logger
+from tracing import span
+
 load_dotenv()
 
+log = get_logger('db')
+
+# Pool de conexiones por worker (compartido por sus hilos con worker_class gthread)
+DB_POOL_MIN_CONNECTIONS = int(os.getenv('DB_POOL_MIN_CONNECTIONS', '1'))
+DB_POOL_MAX_CONNECTIONS = int(os.getenv('DB_POOL_MAX_CONNECTIONS', '5'))
+# Segundos que un hilo espera por una conexión libre antes de fallar
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+# Segundos máximos para abrir una conexión nueva (el precalentamiento no se cuelga si Postgres no responde)
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '10'))
+
+# Tablas que se crean bajo demanda; su DDL se ejecuta una sola vez por proceso
+TABLE_DDL = {
+    'system_config': """
+    CREATE TABLE IF NOT EXISTS system_config (
+        id SERIAL PRIMARY KEY,
+        config_key VARCHAR(100) UNIQUE NOT NULL,
+        config_value TEXT NOT NULL,
+        description TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    'game_prices': """
+    CREATE TABLE IF NOT EXISTS game_prices (
+        id SERIAL PRIMARY KEY,
+        game_type VARCHAR(50) NOT NULL,
+        option_key VARCHAR(10) NOT NULL,
+        price DECIMAL(10,2) NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(game_type, option_key)
+    )
+    """,
+    # La columna game_type se agrega a bases creadas antes de que existiera
+    'pins': """
+    CREATE TABLE IF NOT EXISTS pins (
+        id SERIAL PRIMARY KEY,
+        pin_code VARCHAR(20) NOT NULL UNIQUE,
+        value INTEGER NOT NULL,
+        is_used BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        game_type VARCHAR(50) DEFAULT 'freefire_latam'
+    );
+    ALTER TABLE pins ADD COLUMN IF NOT EXISTS game_type VARCHAR(50) DEFAULT 'freefire_latam'
+    """,
+    # Una fila por compra: qué pasos se completaron, para reconciliar las interrumpidas
+    'purchase_journal': """
+    CREATE TABLE IF NOT EXISTS purchase_journal (
+        id SERIAL PRIMARY KEY,
+        user_id VARCHAR(50) NOT NULL,
+        game_type VARCHAR(50) NOT NULL,
+        option_value INTEGER,
+        price DECIMAL(10,2) NOT NULL,
+        debited_amount DECIMAL(10,2),
+        pin_code VARCHAR(100),
+        pin_source VARCHAR(50),
+        transaction_id VARCHAR(100),
+        status VARCHAR(20) NOT NULL DEFAULT 'in_progress',
+        resolution VARCHAR(50),
+        worker_pid INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS purchase_journal_pending
+        ON purchase_journal (updated_at) WHERE status IN ('in_progress', 'interrupted', 'reconciling')
+    """
+}
+
+# Columnas del diario que las rutas de compra pueden actualizar
+# Transacciones que se conservan por usuario (las más antiguas se borran al insertar)
+MAX_TRANSACTIONS_PER_USER = 20
+
+JOURNAL_FIELDS = {'debited_amount', 'pin_code', 'pin_source', 'transaction_id', 'status', 'resolution'}
+
+_ensured_tables = set()
+
+def connection_params():
+    """Parámetros de conexión: DATABASE_URL (Render) o variables DB_* (desarrollo local)"""
+    database_url = os.getenv('DATABASE_URL')
+    if database_url:
+        # Parsear la URL de la base de datos
+        url = urllib.parse.urlparse(database_url)
+        return {
+            'host': url.hostname,
+            'database': url.path[1:],  # Remover el '/' inicial
+            'user': url.username,
+            'password': url.password,
+            'port': url.port,
+            'connect_timeout': DB_CONNECT_TIMEOUT,
+            'cursor_factory': RealDictCursor
+        }
+
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'database': os.getenv('DB_NAME', 'flask_app'),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'port': os.getenv('DB_PORT', '5432'),
+        'connect_timeout': DB_CONNECT_TIMEOUT,
+        'cursor_factory': RealDictCursor
+    }
+
+
+class ConnectionPool:
+    """ThreadedConnectionPool con espera acotada cuando todas las conexiones están en uso"""
+
+    def __init__(self, minconn=DB_POOL_MIN_CONNECTIONS, maxconn=DB_POOL_MAX_CONNECTIONS, timeout=DB_POOL_TIMEOUT):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.in_use = 0
+        self._in_use_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._pool = ThreadedConnectionPool(minconn, maxconn, **connection_params())
+
+    def getconn(self):
+        started = time.perf_counter()
+        with span('db.pool.acquire'):
+            acquired = self._slots.acquire(timeout=self.timeout)
+        if not acquired:
+            metrics.DB_POOL_WAIT.observe(time.perf_counter() - started, outcome='timeout')
+            raise psycopg2.pool.PoolError(f"Sin conexiones libres tras {self.timeout}s ({self.maxconn} en uso)")
+        metrics.DB_POOL_WAIT.observe(time.perf_counter() - started, outcome='ok')
+        self._count(1)
+        try:
+            connection = self._pool.getconn()
+            if connection.closed:
+                # El servidor cerró la conexión mientras estaba en el pool
+                self._pool.putconn(connection, close=True)
+                connection = self._pool.getconn()
+            return connection
+        except Exception:
+            self._count(-1)
+            self._slots.release()
+            raise
+
+    def putconn(self, connection):
+        try:
+            if connection.closed:
+                self._pool.putconn(connection, close=True)
+            else:
+                if connection.status != psycopg2.extensions.STATUS_READY:
+                    connection.rollback()
+                self._pool.putconn(connection)
+        except Exception:
+            self._pool.putconn(connection, close=True)
+        finally:
+            self._count(-1)
+            self._slots.release()
+
+    def _count(self, delta):
+        # Lo modifican los hilos de todos los requests del worker (gthread)
+        with self._in_use_lock:
+            self.in_use += delta
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Pool del proceso actual; tras un fork se crea uno nuevo (los sockets del padre no se reutilizan)"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ConnectionPool()
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def _update_pool_gauges():
+    """Ocupación del pool de este proceso para /metrics (sin crearlo si aún no existe)"""
+    if _pool is not None and _pool_pid == os.getpid():
+        metrics.DB_POOL_IN_USE.set(_pool.in_use)
+        metrics.DB_POOL_MAX.set(_pool.maxconn)
+
+
+metrics.registry.register_gauge_callback(_update_pool_gauges)
+
+
 class Database:
-    def __init__(self):
+    def __init__(self, pooled=True):
         self.connection = None
         self.cursor = None
+        # pooled=False abre una conexión dedicada (p. ej. para LISTEN, que no debe volver al pool)
+        self.pooled = pooled
 
     def connect(self):
-        """Establecer conexión con la base de datos"""
+        """Obtener una conexión del pool (o una dedicada) y su cursor"""
         try:
-            # Primero intentar usar DATABASE_URL (para Render)
-            database_url = os.getenv('DATABASE_URL')
-
-            if database_url:
-                # Parsear la URL de la base de datos
-                url = urllib.parse.urlparse(database_url)
-                self.connection = psycopg2.connect(
-                    host=url.hostname,
-                    database=url.path[1:],  # Remover el '/' inicial
-                    user=url.username,
-                    password=url.password,
-                    port=url.port,
-                    cursor_factory=RealDictCursor
-                )
-                self.cursor = self.connection.cursor()
+            if self.pooled:
+                self.connection = get_pool().getconn()
             else:
-                # Usar credenciales individuales (para desarrollo local)
-                host = os.getenv('DB_HOST', 'localhost')
-                database = os.getenv('DB_NAME', 'flask_app')
-                user = os.getenv('DB_USER', 'postgres')
-                password = os.getenv('DB_PASSWORD', '')
-                port = os.getenv('DB_PORT', '5432')
-
-                self.connection = psycopg2.connect(
-                    host=host,
-                    database=database,
-                    user=user,
-                    password=password,
-                    port=port,
-                    cursor_factory=RealDictCursor
-                )
-                self.cursor = self.connection.cursor()
+                self.connection = psycopg2.connect(**connection_params())
+            self.cursor = self.connection.cursor()
             return True
         except Exception as e:
-            print(f"Error conectando a la base de datos: {e}")
+            log.error("Error conectando a la base de datos", error=str(e))
+            if self.connection is not None and self.pooled:
+                get_pool().putconn(self.connection)
+            self.connection = None
             return False
 
     def disconnect(self):
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.connection:
-            self.connection.close()
+            if self.pooled:
+                get_pool().putconn(self.connection)
+            else:
+                self.connection.close()
+            self.connection = None
 
     def execute_query(self, query, params=None):
+        started = time.perf_counter()
         try:
-            self.cursor.execute(query, params)
-            self.connection.commit()
-
-            # Solo hacer fetchall() si hay resultados para obtener
-            if self.cursor.description is not None:
-                return self.cursor.fetchall()
-            else:
-                # Para queries como UPDATE, INSERT, DELETE sin RETURNING
-                return []
+            # Solo el inicio de la sentencia normalizada (sin parámetros) identifica el span
+            with span('db.query', statement=' '.join(query.split())[:80]) as current:
+                query_budget.observe_statement()
+                self.cursor.execute(query, params)
+                self.connection.commit()
+                query_budget.observe_commit()
+
+                # Solo hacer fetchall() si hay resultados para obtener
+                if self.cursor.description is not None:
+                    result = self.cursor.fetchall()
+                else:
+                    # Para queries como UPDATE, INSERT, DELETE sin RETURNING
+                    result = []
+                if current is not None:
+                    current['rows'] = len(result)
+            metrics.observe_statement(time.perf_counter() - started)
+            return result
         except Exception as e:
             self.connection.rollback()
-            print(f"Error ejecutando query: {e}")
+            metrics.observe_statement(time.perf_counter() - started, ok=False)
+            log.error("Error ejecutando query", error=str(e))
             return None
 
-    def insert_transaction(self, user_id, pin, transaction_id, amount=None):
-        query = """
-        INSERT INTO transactions (user_id, pin, transaction_id, amount, created_at)
-        VALUES (%s, %s, %s, %s, NOW())
-        RETURNING *
-        """
-        result = self.execute_query(query, (user_id, pin, transaction_id, amount))
+    def ensure_table(self, table_name):
+        """Crear la tabla si no existe (solo la primera vez en este proceso)"""
+        if table_name in _ensured_tables:
+            return True
+        with query_budget.exempt():
+            result = self.execute_query(TABLE_DDL[table_name])
+        if result is not None:
+            _ensured_tables.add(table_name)
+        return result is not None
 
-        # Limpiar transacciones antiguas después de insertar una nueva
-        if result:
-            self.cleanup_old_transactions(user_id)
+    def notify_cache_change(self, cache_type):
+        """Avisar a todos los workers e instancias que una entrada de caché cambió (LISTEN/NOTIFY)"""
+        from cache_events import CHANNEL
+        result = self.execute_query("SELECT pg_notify(%s, %s)", (CHANNEL, cache_type))
+        return result is not None
 
-        return result
+    def insert_transaction(self, user_id, pin, transaction_id, amount=None, journal_id=None):
+        return self._record_transaction({
+            'user_id': user_id, 'pin': pin, 'transaction_id': transaction_id, 'amount': amount
+        }, journal_id)
+
+    def _record_transaction(self, row, journal_id=None):
+        """Insertar una transacción y borrar las más antiguas del usuario en una sola sentencia.
+
+        Solo se conservan las últimas MAX_TRANSACTIONS_PER_USER. Con journal_id (una
+        compra) la misma sentencia cierra la fila del diario como completed: la
+        transacción nunca queda registrada con la compra todavía en curso.
+        """
+        columns = list(row)
+        journal = ""
+        if journal_id is not None:
+            journal = """
+            j AS (
+                UPDATE purchase_journal
+                SET transaction_id = %(transaction_id)s, status = 'completed', updated_at = NOW()
+                WHERE id = %(journal_id)s AND status IN ('in_progress', 'interrupted')
+                RETURNING id
+            ),"""
+        # El DELETE no ve la fila nueva (misma instantánea): de las anteriores quedan MAX - 1
+        query = f"""
+        WITH {journal} ins AS (
+            INSERT INTO transactions ({', '.join(columns)}, created_at)
+            VALUES ({', '.join(f'%({name})s' for name in columns)}, NOW())
+            RETURNING *
+        ), trimmed AS (
+            DELETE FROM transactions
+            WHERE id IN (
+                SELECT id FROM transactions
+                WHERE user_id = %(user_id)s
+                ORDER BY created_at DESC, id DESC
+                OFFSET %(keep)s
+            )
+            RETURNING id
+        )
+        SELECT ins.*, (SELECT COUNT(*) FROM trimmed) AS ctx_trimmed FROM ins
+        """
+        result = self.execute_query(query, {**row, 'journal_id': journal_id, 'keep': MAX_TRANSACTIONS_PER_USER - 1})
+        if not result:
+            return result
+
+        trimmed = result[0].get('ctx_trimmed')
+        if trimmed:
+            log.info("Transacciones antiguas eliminadas", user=row['user_id'], deleted=trimmed)
+        return [{key: value for key, value in r.items() if key != 'ctx_trimmed'} for r in result]
 
     def get_user_transactions(self, user_id, limit=10, offset=0):
         # Si es admin, obtener todas las transacciones de todos los usuarios
@@ -117,12 +348,90 @@ class Database:
         result = self.execute_query(query, (user_id,))
         return result[0]['balance'] if result and len(result) > 0 else "0.00"
 
-    def update_user_balance(self, user_id, new_balance):
+    def get_page_context(self, user_id, transactions_limit=0):
+        """Saldo, estado y últimas transacciones del usuario en una sola consulta.
+
+        Devuelve {"balance", "is_active", "transactions"} o None si la consulta falla.
+        Las transacciones mantienen el mismo orden y columnas que get_user_transactions.
+        """
+        order = "CASE WHEN {t}.status = 'procesando' THEN 0 ELSE 1 END, {t}.created_at DESC"
+        if user_id == 'ADMIN001':
+            latest = f"""
+            SELECT t.*, tu.nombre, tu.apellido
+            FROM transactions t
+            LEFT JOIN users tu ON t.user_id = tu.user_id
+            ORDER BY {order.format(t='t')}
+            LIMIT %(limit)s
+            """
+        else:
+            latest = f"""
+            SELECT t.*
+            FROM transactions t
+            WHERE t.user_id = %(user_id)s
+            ORDER BY {order.format(t='t')}
+            LIMIT %(limit)s
+            """
+
+        # La posición se numera sobre las filas ya limitadas: el LIMIT puede cortar el orden
+        # temprano (top-N o índice) en lugar de numerar todas las transacciones
+        query = f"""
+        WITH u AS (
+            SELECT balance, COALESCE(is_active, true) AS is_active
+            FROM users WHERE user_id = %(user_id)s
+        ), tx AS (
+            SELECT latest.*, ROW_NUMBER() OVER (ORDER BY {order.format(t='latest')}) AS ctx_rank
+            FROM ({latest}) AS latest
+        )
+        SELECT u.balance AS ctx_balance, u.is_active AS ctx_is_active, tx.*
+        FROM (SELECT 1) AS one
+        LEFT JOIN u ON true
+        LEFT JOIN tx ON true
+        ORDER BY tx.ctx_rank
+        """
+        result = self.execute_query(query, {"user_id": user_id, "limit": transactions_limit})
+        if result is None or not result:
+            return None
+
+        first = result[0]
+        transactions = [
+            {key: value for key, value in row.items() if not key.startswith('ctx_')}
+            for row in result if row['ctx_rank'] is not None
+        ]
+        return {
+            "balance": first['ctx_balance'] if first['ctx_balance'] is not None else "0.00",
+            "is_active": first['ctx_is_active'] if first['ctx_is_active'] is not None else True,
+            "transactions": transactions
+        }
+
+    def update_user_balance(self, user_id, new_balance, journal_id=None, current_balance=None):
+        """Fijar el saldo y registrar el movimiento (current_balance evita releerlo si ya se conoce).
+
+        Con journal_id (una compra) la misma sentencia acumula la diferencia en
+        debited_amount del diario: un kill nunca deja el saldo cambiado sin anotar. Si la
+        fila ya no está en curso (la tomó la reconciliación) no se toca el saldo y devuelve None.
+        """
         # Obtener el saldo actual antes de actualizar
-        current_balance = self.get_user_balance(user_id)
+        if current_balance is None:
+            current_balance = self.get_user_balance(user_id)
 
-        query = "UPDATE users SET balance = %s WHERE user_id = %s"
-        result = self.execute_query(query, (new_balance, user_id))
+        if journal_id is None:
+            query = "UPDATE users SET balance = %s WHERE user_id = %s"
+            result = self.execute_query(query, (new_balance, user_id))
+        else:
+            query = """
+            WITH j AS (
+                UPDATE purchase_journal
+                SET debited_amount = COALESCE(debited_amount, 0) + %(debited)s, updated_at = NOW()
+                WHERE id = %(journal_id)s AND status IN ('in_progress', 'interrupted')
+                RETURNING id
+            )
+            UPDATE users SET balance = %(balance)s FROM j WHERE users.user_id = %(user_id)s
+            RETURNING users.user_id
+            """
+            result = self.execute_query(query, {
+                'debited': float(current_balance) - float(new_balance), 'journal_id': journal_id,
+                'balance': new_balance, 'user_id': user_id
+            }) or None
 
         # Registrar la transacción de cambio de saldo
         if result is not None:
@@ -203,6 +512,7 @@ class Database:
         return result is not None
 
     def add_credit_to_user(self, user_id, amount):
+        """Sumar crédito y registrar el movimiento; devuelve el saldo nuevo o None"""
         query = """
         UPDATE users 
         SET balance = balance + %s 
@@ -221,29 +531,13 @@ class Database:
             )
             # La limpieza automática ya se ejecuta en insert_transaction
 
-        return result is not None and len(result) > 0
+        return result[0]['balance'] if result else None
 
     def create_pin(self, pin_code, value, game_type='freefire_latam'):
         """Crear un nuevo PIN con tipo de juego específico"""
-        # Crear tabla con columna game_type si no existe
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS pins (
-            id SERIAL PRIMARY KEY,
-            pin_code VARCHAR(20) NOT NULL UNIQUE,
-            value INTEGER NOT NULL,
-            is_used BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            game_type VARCHAR(50) DEFAULT 'freefire_latam'
-        )
-        """
-        self.execute_query(create_table_query)
-
-        # Agregar columna game_type si no existe (para compatibilidad)
-        add_column_query = """
-        ALTER TABLE pins 
-        ADD COLUMN IF NOT EXISTS game_type VARCHAR(50) DEFAULT 'freefire_latam'
-        """
-        self.execute_query(add_column_query)
+        # Crear tabla con columna game_type si no existe (una vez por proceso)
+        if not self.ensure_table('pins'):
+            return None
 
         query = """
         INSERT INTO pins (pin_code, value, game_type, created_at)
@@ -263,14 +557,31 @@ class Database:
         result = self.execute_query(query, (value, game_type))
         return result[0] if result else None
 
-    def use_pin(self, pin_id, user_id):
-        """Marcar un PIN como usado"""
-        query = """
-        DELETE FROM pins 
-        WHERE id = %s AND is_used = false
-        RETURNING *
-        """
-        result = self.execute_query(query, (pin_id,))
+    def use_pin(self, pin_id, user_id, journal_id=None):
+        """Marcar un PIN como usado; con journal_id se anota en el diario en la misma sentencia"""
+        if journal_id is None:
+            query = """
+            DELETE FROM pins 
+            WHERE id = %s AND is_used = false
+            RETURNING *
+            """
+            result = self.execute_query(query, (pin_id,))
+        else:
+            query = """
+            WITH p AS (
+                DELETE FROM pins
+                WHERE id = %(pin_id)s AND is_used = false
+                  AND EXISTS (SELECT 1 FROM purchase_journal
+                              WHERE id = %(journal_id)s AND status IN ('in_progress', 'interrupted'))
+                RETURNING *
+            ), j AS (
+                UPDATE purchase_journal SET pin_code = p.pin_code, pin_source = 'local', updated_at = NOW()
+                FROM p WHERE purchase_journal.id = %(journal_id)s
+                RETURNING purchase_journal.id
+            )
+            SELECT p.* FROM p
+            """
+            result = self.execute_query(query, {'pin_id': pin_id, 'journal_id': journal_id})
         if result:
           self.insert_transaction(
                 user_id=user_id,
@@ -316,209 +627,57 @@ class Database:
 
     def get_freefire_latam_pin(self, amount_value):
         """FUNCIÓN EXCLUSIVA para Free Fire Latam - NO reutilizar para otros juegos"""
-        import requests
-        import os
-
-        # Credenciales específicas para Free Fire Latam
-        provider_user = os.getenv('FREEFIRE_LATAM_USER')
-        provider_password = os.getenv('FREEFIRE_LATAM_PASSWORD')
-        api_url = "https://inefableshop.net/conexion_api/api.php"
-
-        print(f"[FREEFIRE LATAM] Verificando credenciales...")
-        print(f"[FREEFIRE LATAM] Usuario configurado: {'Sí' if provider_user else 'NO'}")
-        print(f"[FREEFIRE LATAM] Contraseña configurada: {'Sí' if provider_password else 'NO'}")
-
-        if not provider_user or not provider_password:
-            print("[FREEFIRE LATAM] ❌ Error: Credenciales no configuradas en variables de entorno")
-            print("[FREEFIRE LATAM] Verifica FREEFIRE_LATAM_USER y FREEFIRE_LATAM_PASSWORD")
-            return None
+        from providers import get_router
 
         # Validar valores específicos de Free Fire Latam (1-9)
         if amount_value < 1 or amount_value > 9:
-            print(f"[FREEFIRE LATAM] ❌ Valor {amount_value} inválido. Debe estar entre 1-9")
+            log.warning("Free Fire Latam: opción inválida, debe estar entre 1-9", option=amount_value)
             return None
 
-        # Parámetros específicos para Free Fire Latam
-        params = {
-            'action': 'recarga',
-            'usuario': provider_user,
-            'clave': provider_password,
-            'tipo': 'recargaPinFreefirebs',  # Tipo específico para Free Fire Latam
-            'monto': str(amount_value),
-            'numero': '0'
-        }
-
-        # Headers estándar que funcionan en todos los entornos
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (compatible; InefableStore/1.0)',
-            'Accept': '*/*',
-            'Cache-Control': 'no-cache'
-        }
-
-        # Implementación unificada - siempre usar GET (más compatible)
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                print(f"[FREEFIRE LATAM] 🚀 Intento {attempt + 1}/{max_retries} - Consultando API")
-                print(f"[FREEFIRE LATAM] 🌐 URL: {api_url}")
-                print(f"[FREEFIRE LATAM] 📊 Parámetros: {params}")
-                
-                # Usar GET siempre - más confiable en todos los entornos
-                response = requests.get(
-                    api_url, 
-                    params=params, 
-                    headers=headers, 
-                    timeout=30,
-                    allow_redirects=True,
-                    verify=True
-                )
-                print(f"[FREEFIRE LATAM] 📡 Respuesta HTTP: {response.status_code}")
-                
-                # Si obtenemos una respuesta exitosa, salir del loop
-                if response.status_code == 200:
-                    print(f"[FREEFIRE LATAM] ✅ Respuesta exitosa en intento {attempt + 1}")
-                    break
-                elif attempt < max_retries - 1:
-                    print(f"[FREEFIRE LATAM] 🔄 Reintentando en 2 segundos...")
-                    import time
-                    time.sleep(2)
-                    continue
-                
-                response.raise_for_status()
-                break
-                
-            except requests.exceptions.RequestException as e:
-                print(f"[FREEFIRE LATAM] ❌ Error en intento {attempt + 1}: {e}")
-                if attempt == max_retries - 1:
-                    print(f"[FREEFIRE LATAM] ❌ Todos los intentos fallaron.")
-                    return None
-                else:
-                    print(f"[FREEFIRE LATAM] 🔄 Reintentando en 2 segundos...")
-                    import time
-                    time.sleep(2)
-        
-        # Procesar respuesta después del loop de retry exitoso
-        response_data = response.text.strip()
-        print(f"[FREEFIRE LATAM] 📄 Respuesta completa: {response_data}")
-
-        if not response_data:
-            print("[FREEFIRE LATAM] ❌ Respuesta vacía de la API")
-            return None
+        # El router elige el mejor proveedor y hace failover sin esperas
+        return get_router().purchase('freefire_latam', amount_value, self._parse_freefire_latam_response)
 
-        # Procesamiento específico para Free Fire Latam
-        try:
-            import json
-            json_response = json.loads(response_data)
-            print(f"[FREEFIRE LATAM] 📋 JSON parseado exitosamente: {json_response}")
-            return self._process_freefire_latam_response(json_response, amount_value)
-        except json.JSONDecodeError as json_error:
-            print(f"[FREEFIRE LATAM] ⚠️  Error JSON, intentando procesar con warnings: {json_error}")
-            return self._process_freefire_latam_warnings_response(response_data, amount_value)
-
-        except requests.exceptions.Timeout:
-            print("[FREEFIRE LATAM] ❌ Timeout: La API tardó más de 30 segundos en responder")
-            return None
-        except requests.exceptions.ConnectionError:
-            print("[FREEFIRE LATAM] ❌ Error de conexión: No se puede conectar con la API")
-            return None
-        except requests.exceptions.HTTPError as http_error:
-            print(f"[FREEFIRE LATAM] ❌ Error HTTP: {http_error}")
-            return None
-        except Exception as e:
-            print(f"[FREEFIRE LATAM] ❌ Error inesperado: {type(e).__name__}: {e}")
-            return None
+    def _parse_freefire_latam_response(self, response_data, amount_value):
+        """Interpretar el texto devuelto por un proveedor de Free Fire Latam.
 
-    def _process_freefire_latam_response(self, json_response, amount_value):
-        """Procesar respuesta JSON específica de Free Fire Latam"""
-        alert_status = json_response.get('ALERTA') or json_response.get('alerta', '').upper()
-        pin_code = json_response.get('PIN') or json_response.get('pin')
-
-        # Extraer PIN del mensaje si es necesario
-        if not pin_code and 'mensaje' in json_response:
-            import re
-            pin_match = re.search(r'<b>Pin:<\/b>\s*([A-Z0-9]+)', json_response['mensaje'])
-            if pin_match:
-                pin_code = pin_match.group(1).strip()
-
-        if (alert_status == 'VERDE' or alert_status == 'GREEN') and pin_code:
-            pin_code = pin_code.upper().strip()
-            if 4 <= len(pin_code) <= 20:
-                return {
-                    'pin_code': pin_code,
-                    'value': amount_value,
-                    'source': 'freefire_latam_api'
-                }
-
-        error_msg = json_response.get('MENSAJE', 'Error desconocido')
-        print(f"[FREEFIRE LATAM] Error de API: {error_msg}")
-        return None
+        None si el proveedor rechazó la compra; AmbiguousResponse si no se sabe si emitió el PIN.
+        """
+        from provider_parser import parse_provider_response, PinResult
+        from providers import AmbiguousResponse
 
-    def _process_freefire_latam_warnings_response(self, response_data, amount_value):
-        """Procesar respuesta con warnings PHP específica de Free Fire Latam"""
-        try:
-            import json
-            import re
-            
-            # Buscar el JSON después de los warnings PHP
-            json_start = response_data.find('{')
-            if json_start != -1:
-                json_part = response_data[json_start:]
-                print(f"[FREEFIRE LATAM] 📋 JSON extraído después de warnings: {json_part}")
-                json_response = json.loads(json_part)
-                print(f"[FREEFIRE LATAM] 📋 JSON parseado correctamente: {json_response}")
-                
-                # Procesar usando el método normal
-                return self._process_freefire_latam_response(json_response, amount_value)
-            
-            # Si no hay JSON válido, intentar extraer PIN del HTML/mensaje
-            pin_match = re.search(r'<b>Pin:<\/b>\s*([A-Z0-9]+)', response_data, re.IGNORECASE)
-            if pin_match:
-                pin_code = pin_match.group(1).strip().upper()
-                print(f"[FREEFIRE LATAM] 📋 PIN extraído del mensaje HTML: {pin_code}")
-                
-                if 4 <= len(pin_code) <= 20:
-                    return {
-                        'pin_code': pin_code,
-                        'value': amount_value,
-                        'source': 'freefire_latam_api'
-                    }
-                    
-        except json.JSONDecodeError as e:
-            print(f"[FREEFIRE LATAM] ❌ Error parseando JSON: {e}")
-        except Exception as e:
-            print(f"[FREEFIRE LATAM] ❌ Error procesando respuesta con warnings: {e}")
+        parsed = parse_provider_response(response_data)
+        if isinstance(parsed, PinResult):
+            return {
+                'pin_code': parsed.pin_code,
+                'value': amount_value,
+                'source': 'freefire_latam_api'
+            }
 
-        print(f"[FREEFIRE LATAM] No se pudo procesar respuesta: {response_data}")
+        log.warning("Free Fire Latam: error de API", kind=parsed.kind, detail=parsed.message)
+        if parsed.kind != 'rejected':
+            raise AmbiguousResponse(parsed.kind)
         return None
 
-
-
     def get_freefire_global_pin(self, amount_value):
         """FUNCIÓN EXCLUSIVA para Free Fire Global - Completamente independiente"""
         # TODO: Implementar cuando se configure Free Fire Global
-        print(f"[FREEFIRE GLOBAL] Función no implementada aún")
+        log.warning("Free Fire Global: compra por API no implementada aún")
         return None
 
     def get_block_striker_pin(self, amount_value):
         """FUNCIÓN EXCLUSIVA para Block Striker - Completamente independiente"""
         # TODO: Implementar cuando se configure Block Striker
-        print(f"[BLOCK STRIKER] Función no implementada aún")
+        log.warning("Block Striker: compra por API no implementada aún")
         return None
 
-    def insert_block_striker_transaction(self, user_id, player_id, code, transaction_id, amount, option_value):
+    def insert_block_striker_transaction(self, user_id, player_id, code, transaction_id, amount, option_value,
+                                         journal_id=None):
         """Insertar transacción específica de Block Striker con player_id y status procesando"""
-        query = """
-        INSERT INTO transactions (user_id, pin, transaction_id, amount, created_at, player_id, game_type, option_value, status)
-        VALUES (%s, %s, %s, %s, NOW(), %s, %s, %s, %s)
-        RETURNING *
-        """
-        result = self.execute_query(query, (user_id, code, transaction_id, amount, player_id, 'Block Striker', option_value, 'procesando'))
-
-        # Limpiar transacciones antiguas después de insertar una nueva
-        if result:
-            self.cleanup_old_transactions(user_id)
-
-        return result
+        return self._record_transaction({
+            'user_id': user_id, 'pin': code, 'transaction_id': transaction_id, 'amount': amount,
+            'player_id': player_id, 'game_type': 'Block Striker', 'option_value': option_value,
+            'status': 'procesando'
+        }, journal_id)
 
     def update_block_striker_transaction_status(self, transaction_id, new_status):
         """Actualizar el status de una transacción de Block Striker"""
@@ -550,7 +709,7 @@ class Database:
             balance_result = self.execute_query(update_balance_query, (refund_amount, user_id))
 
             if balance_result is None:
-                print(f"Error devolviendo dinero al usuario {user_id}")
+                log.error("Error devolviendo dinero al usuario", user=user_id)
                 return None
 
         # Actualizar el status de la transacción
@@ -564,59 +723,10 @@ class Database:
 
         return result
 
-    def cleanup_old_transactions(self, user_id, max_transactions=20):
-        """Eliminar transacciones antiguas manteniendo solo las últimas 20 por usuario"""
-        try:
-            # Contar transacciones del usuario
-            count_query = "SELECT COUNT(*) FROM transactions WHERE user_id = %s"
-            count_result = self.execute_query(count_query, (user_id,))
-
-            if count_result and count_result[0]['count'] > max_transactions:
-                transactions_to_delete = count_result[0]['count'] - max_transactions
-
-                # Eliminar las transacciones más antiguas que excedan el límite
-                delete_query = """
-                DELETE FROM transactions 
-                WHERE user_id = %s 
-                AND id IN (
-                    SELECT id FROM (
-                        SELECT id FROM transactions 
-                        WHERE user_id = %s 
-                        ORDER BY created_at ASC 
-                        LIMIT %s
-                    ) AS old_transactions
-                )
-                """
-                result = self.execute_query(delete_query, (user_id, user_id, transactions_to_delete))
-
-                if result is not None:
-                    print(f"[CLEANUP] Eliminadas {transactions_to_delete} transacciones antiguas del usuario {user_id}")
-                    return True
-                else:
-                    print(f"[CLEANUP] Error eliminando transacciones del usuario {user_id}")
-                    return False
-
-            return True
-
-        except Exception as e:
-            print(f"[CLEANUP] Error en cleanup_old_transactions: {e}")
-            return False
-
     def save_game_prices(self, game_type, prices):
         """Guardar precios de un juego en la base de datos"""
         try:
-            # Crear tabla si no existe
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS game_prices (
-                id SERIAL PRIMARY KEY,
-                game_type VARCHAR(50) NOT NULL,
-                option_key VARCHAR(10) NOT NULL,
-                price DECIMAL(10,2) NOT NULL,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(game_type, option_key)
-            )
-            """
-            self.execute_query(create_table_query)
+            self.ensure_table('game_prices')
 
             # Eliminar precios existentes del juego
             delete_query = "DELETE FROM game_prices WHERE game_type = %s"
@@ -630,32 +740,25 @@ class Database:
                 """
                 self.execute_query(insert_query, (game_type, str(option_key), float(price)))
 
-            print(f"✅ Precios de {game_type} guardados en base de datos")
+            log.info("Precios guardados en base de datos", game_type=game_type)
+            self.notify_cache_change('prices')
             return True
 
         except Exception as e:
-            print(f"❌ Error guardando precios en base de datos: {e}")
+            log.exception("Error guardando precios en base de datos")
             return False
 
     def load_game_prices(self):
-        """Cargar precios de juegos desde la base de datos"""
+        """Cargar precios de juegos desde la base de datos (None si la consulta falla)"""
         try:
-            # Crear tabla si no existe
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS game_prices (
-                id SERIAL PRIMARY KEY,
-                game_type VARCHAR(50) NOT NULL,
-                option_key VARCHAR(10) NOT NULL,
-                price DECIMAL(10,2) NOT NULL,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(game_type, option_key)
-            )
-            """
-            self.execute_query(create_table_query)
+            self.ensure_table('game_prices')
 
             # Cargar precios desde la base de datos
             query = "SELECT game_type, option_key, price FROM game_prices ORDER BY game_type, option_key"
             result = self.execute_query(query)
+            if result is None:
+                # La consulta falló: no sembrar valores por defecto sobre los precios reales
+                return None
 
             prices = {
                 "freefire_latam": {},
@@ -684,68 +787,28 @@ class Database:
 
             # Si faltan precios de algún juego, agregar valores por defecto
             if not result or not any(prices.values()) or missing_games:
-                print(f"📄 Faltan precios para: {missing_games if missing_games else 'todos los juegos'}, creando valores por defecto")
-                default_prices = {
-                    "freefire_latam": {
-                        "1": 0.66, "2": 1.99, "3": 3.35, "4": 6.70, "5": 12.70,
-                        "6": 29.50, "7": 0.40, "8": 1.40, "9": 6.50
-                    },
-                    "freefire_global": {
-                        "1": 0.86, "2": 2.90, "3": 4.00, "4": 7.75, "5": 15.30, "6": 38.00
-                    },
-                    "block_striker": {
-                        "1": 0.82, "2": 2.60, "3": 4.30, "4": 8.65, "5": 17.30,
-                        "6": 43.15, "7": 3.50, "8": 8.00, "9": 1.85
-                    }
-                }
+                log.info("Faltan precios, creando valores por defecto", games=missing_games or 'todos')
+                from catalog import default_prices as catalog_default_prices
+                default_prices = catalog_default_prices()
 
                 # Guardar solo los precios que faltan
                 for game_type in missing_games:
                     if game_type in default_prices:
-                        print(f"💾 Guardando precios por defecto para {game_type}")
+                        log.info("Guardando precios por defecto", game_type=game_type)
                         self.save_game_prices(game_type, default_prices[game_type])
                         prices[game_type] = default_prices[game_type]
 
-                # Si no había ningún precio, guardar todos
-                if not result or not any(prices.values()):
-                    for game_type, game_prices in default_prices.items():
-                        self.save_game_prices(game_type, game_prices)
-                    return default_prices
-
-            print(f"📄 Precios cargados desde base de datos: {prices}")
+            log.debug("Precios cargados desde base de datos", prices=prices)
             return prices
 
         except Exception as e:
-            print(f"❌ Error cargando precios desde base de datos: {e}")
-            # Retornar precios por defecto en caso de error
-            return {
-                "freefire_latam": {
-                    "1": 0.66, "2": 1.99, "3": 3.35, "4": 6.70, "5": 12.70,
-                    "6": 29.50, "7": 0.40, "8": 1.40, "9": 6.50
-                },
-                "freefire_global": {
-                    "1": 0.86, "2": 2.90, "3": 4.00, "4": 7.75, "5": 15.30, "6": 38.00
-                },
-                "block_striker": {
-                    "1": 0.82, "2": 2.60, "3": 4.30, "4": 8.65, "5": 17.30,
-                    "6": 43.15, "7": 3.50, "8": 8.00, "9": 1.85
-                }
-            }
+            log.exception("Error cargando precios desde base de datos")
+            return None
 
     def get_system_config(self, config_key, default_value=None):
         """Obtener una configuración del sistema desde la base de datos"""
         try:
-            # Crear tabla si no existe
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS system_config (
-                id SERIAL PRIMARY KEY,
-                config_key VARCHAR(100) UNIQUE NOT NULL,
-                config_value TEXT NOT NULL,
-                description TEXT,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-            self.execute_query(create_table_query)
+            self.ensure_table('system_config')
 
             # Obtener configuración
             query = "SELECT config_value FROM system_config WHERE config_key = %s"
@@ -761,23 +824,13 @@ class Database:
                 return None
 
         except Exception as e:
-            print(f"Error obteniendo configuración {config_key}: {e}")
+            log.exception("Error obteniendo configuración", key=config_key)
             return default_value
 
     def set_system_config(self, config_key, config_value, description=None):
         """Establecer una configuración del sistema en la base de datos"""
         try:
-            # Crear tabla si no existe
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS system_config (
-                id SERIAL PRIMARY KEY,
-                config_key VARCHAR(100) UNIQUE NOT NULL,
-                config_value TEXT NOT NULL,
-                description TEXT,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-            self.execute_query(create_table_query)
+            self.ensure_table('system_config')
 
             # Insertar o actualizar configuración
             upsert_query = """
@@ -789,10 +842,13 @@ class Database:
                 updated_at = CURRENT_TIMESTAMP
             """
             result = self.execute_query(upsert_query, (config_key, config_value, description))
+            # Del resto de system_config no se cachea nada: solo el banner necesita aviso
+            if result is not None and config_key == 'banner_message':
+                self.notify_cache_change('banner')
             return result is not None
 
         except Exception as e:
-            print(f"Error estableciendo configuración {config_key}: {e}")
+            log.exception("Error estableciendo configuración", key=config_key)
             return False
 
     def initialize_default_configs(self):
@@ -811,6 +867,140 @@ class Database:
             existing = self.get_system_config(key)
             if existing is None:
                 self.set_system_config(key, value, f'Configuración por defecto: {key}')
-                print(f"✅ Configuración inicializada: {key} = {value}")
+                log.info("Configuración inicializada", key=key, value=value)
+
+        return True
+
+    def journal_start(self, user_id, game_type, option_value, price):
+        """Registrar el inicio de una compra; devuelve el id del diario o None"""
+        if not self.ensure_table('purchase_journal'):
+            return None
+        query = """
+        INSERT INTO purchase_journal (user_id, game_type, option_value, price, worker_pid)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id
+        """
+        result = self.execute_query(query, (user_id, game_type, option_value, price, os.getpid()))
+        return result[0]['id'] if result else None
+
+    def journal_update(self, journal_id, **fields):
+        """Registrar un paso de la compra; no pisa una fila que ya está en reconciliación"""
+        columns = [name for name in fields if name in JOURNAL_FIELDS]
+        assignments = ', '.join(f"{name} = %s" for name in columns)
+        query = f"""
+        UPDATE purchase_journal SET {assignments}, updated_at = NOW()
+        WHERE id = %s AND status IN ('in_progress', 'interrupted')
+        """
+        result = self.execute_query(query, [fields[name] for name in columns] + [journal_id])
+        return result is not None
+
+    def journal_mark_interrupted(self, journal_ids):
+        """Marcar compras que el worker no pudo terminar (al apagarse)"""
+        query = """
+        UPDATE purchase_journal SET status = 'interrupted', updated_at = NOW()
+        WHERE id = ANY(%s) AND status = 'in_progress'
+        """
+        return self.execute_query(query, (list(journal_ids),)) is not None
 
-        return True
\ No newline at end of file
+    def journal_claim_stale(self, older_than_seconds, limit=20):
+        """Tomar (sin que otro worker las tome) compras sin terminar hace más de older_than_seconds"""
+        if not self.ensure_table('purchase_journal'):
+            return []
+        query = """
+        UPDATE purchase_journal SET status = 'reconciling', updated_at = NOW()
+        WHERE id IN (
+            SELECT id FROM purchase_journal
+            WHERE status IN ('in_progress', 'interrupted', 'reconciling')
+              AND updated_at < NOW() - make_interval(secs => %s)
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING *
+        """
+        return self.execute_query(query, (older_than_seconds, limit)) or []
+
+    def journal_reconcile(self, entry):
+        """Resolver una compra tomada con journal_claim_stale; devuelve la resolución o None.
+
+        Cada caso es una sola sentencia (cierre del diario + corrección), así nunca se
+        aplica dos veces aunque el proceso muera a mitad:
+          PIN asegurado y saldo descontado -> se registra la transacción ("completed")
+          PIN del proveedor sin descontar  -> el PIN vuelve al stock local ("restocked")
+          saldo descontado sin PIN         -> se devuelve el saldo ("refunded")
+          PIN pedido al proveedor sin respuesta -> queda para revisión ("needs_review"):
+                                              el proveedor pudo emitirlo y cobrarlo
+          nada hecho                       -> solo se cierra ("abandoned")
+        Si la transacción ya quedó registrada (la ruta murió justo antes de cerrar el
+        diario) solo se cierra como "completed".
+        """
+        close = """
+        UPDATE purchase_journal SET status = 'reconciled', resolution = %(resolution)s, updated_at = NOW()
+        WHERE id = %(id)s AND status = 'reconciling'
+        RETURNING *
+        """
+        recorded = self.execute_query("""
+        SELECT 1 FROM transactions
+        WHERE transaction_id = %s OR (pin = %s AND user_id = %s)
+        LIMIT 1
+        """, (entry['transaction_id'], entry['pin_code'], entry['user_id']))
+        if recorded is None:
+            return None
+
+        debited = entry['debited_amount'] is not None
+        if recorded:
+            resolution = 'completed'
+            query = close
+        elif entry['pin_code'] and debited:
+            resolution = 'completed'
+            query = f"""
+            WITH j AS ({close})
+            INSERT INTO transactions (user_id, pin, transaction_id, amount, created_at)
+            SELECT user_id, pin_code, COALESCE(transaction_id, 'RC' || id), -price, NOW() FROM j
+            RETURNING transaction_id
+            """
+        elif entry['pin_code']:
+            resolution = 'restocked'
+            query = f"""
+            WITH j AS ({close})
+            INSERT INTO pins (pin_code, value, game_type, created_at)
+            SELECT pin_code, option_value, game_type, NOW() FROM j
+            ON CONFLICT (pin_code) DO NOTHING
+            RETURNING id
+            """
+        elif entry['pin_source'] == 'api_request' and not debited:
+            resolution = 'needs_review'
+            query = """
+            UPDATE purchase_journal SET status = 'needs_review', resolution = 'pin_proveedor_incierto',
+                   updated_at = NOW()
+            WHERE id = %(id)s AND status = 'reconciling'
+            RETURNING id
+            """
+        elif debited:
+            resolution = 'refunded'
+            query = f"""
+            WITH j AS ({close})
+            UPDATE users SET balance = users.balance + j.debited_amount
+            FROM j WHERE users.user_id = j.user_id
+            RETURNING users.user_id
+            """
+        else:
+            resolution = 'abandoned'
+            query = close
+
+        result = self.execute_query(query, {'id': entry['id'], 'resolution': resolution})
+        return resolution if result is not None else None
+
+    def journal_recent(self, pending_only=False, limit=50):
+        """Últimas filas del diario (para el admin)"""
+        if not self.ensure_table('purchase_journal'):
+            return None
+        where = "WHERE status IN ('in_progress', 'interrupted', 'reconciling', 'needs_review')" if pending_only else ""
+        query = f"""
+        SELECT id, user_id, game_type, option_value, price, debited_amount, pin_source, transaction_id,
+               status, resolution, worker_pid, created_at, updated_at
+        FROM purchase_journal {where}
+        ORDER BY id DESC
+        LIMIT %s
+        """
+        return self.execute_query(query, (limit,))
\ No newline at end of file
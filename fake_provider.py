@@ -0,0 +1,98 @@
+"""
+Proveedor falso de PINes para pruebas locales del router de proveedores.
+
+Imita la API conexion_api/api.php con un perfil de latencia y fallos
+configurable. Se pueden levantar varias instancias en puertos distintos:
+
+    python fake_provider.py --port 8101 --latency 0.2
+    python fake_provider.py --port 8102 --latency 1.5 --failure-rate 0.3
+
+Y apuntar PROVIDERS_CONFIG a un JSON como:
+
+    {"freefire_latam": [
+        {"name": "rapido", "url": "http://127.0.0.1:8101/api.php",
+         "user": "test", "password": "test", "costs": {"1": 0.60}},
+        {"name": "lento", "url": "http://127.0.0.1:8102/api.php",
+         "user": "test", "password": "test", "costs": {"1": 0.55}}
+    ]}
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    """Responde como el proveedor real: JSON con ALERTA/PIN/MENSAJE"""
+
+    def do_GET(self):
+        profile = self.server.profile
+        params = parse_qs(urlparse(self.path).query)
+
+        delay = max(0.0, random.gauss(profile['latency'], profile['jitter']))
+        time.sleep(delay)
+
+        if random.random() < profile['failure_rate']:
+            body = {'ALERTA': 'ROJO', 'MENSAJE': 'Sin stock disponible'}
+        else:
+            # transactions.pin es VARCHAR(10): un PIN más largo no se podría registrar
+            pin = ''.join(random.choice('ABCDEFGHJKLMNPQRSTUVWXYZ23456789') for _ in range(10))
+            monto = params.get('monto', ['0'])[0]
+            body = {
+                'ALERTA': 'VERDE',
+                'PIN': pin,
+                'MENSAJE': f'Recarga exitosa opción {monto}. <b>Pin:</b> {pin}'
+            }
+
+        payload = json.dumps(body).encode('utf-8')
+        if profile['php_warnings']:
+            payload = b'<br />\n<b>Warning</b>: Undefined index: numero in api.php on line 12<br />\n' + payload
+
+        self.server.requests_served += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_provider(port=0, latency=0.2, jitter=0.0, failure_rate=0.0, php_warnings=False):
+    """Levantar un proveedor falso en un hilo; devuelve el servidor (server.url, server.shutdown())"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeProviderHandler)
+    server.daemon_threads = True
+    server.profile = {
+        'latency': latency,
+        'jitter': jitter,
+        'failure_rate': failure_rate,
+        'php_warnings': php_warnings
+    }
+    server.requests_served = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/api.php"
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Proveedor falso de PINes')
+    parser.add_argument('--port', type=int, default=8101)
+    parser.add_argument('--latency', type=float, default=0.2, help='Latencia media en segundos')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Desviación estándar de la latencia')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fracción de respuestas sin PIN')
+    parser.add_argument('--php-warnings', action='store_true', help='Anteponer warnings PHP al JSON')
+    args = parser.parse_args()
+
+    server = start_fake_provider(args.port, args.latency, args.jitter, args.failure_rate, args.php_warnings)
+    print(f"🧪 Proveedor falso escuchando en {server.url} (latencia {args.latency}s, fallos {args.failure_rate:.0%})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -2,17 +2,34 @@
 """
 Configuración de Gunicorn para producción en Render
 """
-import multiprocessing
 import os
 
+from server_sizing import compute as compute_sizing, graceful_timeout as compute_graceful_timeout
+
 # Configuración del servidor
 bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# Workers, hilos y pool de Postgres según CPU y memoria del contenedor (cgroup) y el
+# presupuesto de conexiones DB_CONNECTION_BUDGET (ver server_sizing.py)
+sizing = compute_sizing()
+workers = sizing.workers
+# gthread: cada worker atiende varias solicitudes a la vez mientras espera a Postgres o al
+# proveedor. Los hilos comparten el pool de conexiones del worker y la caché compartida.
+# "sync" sigue disponible con GUNICORN_WORKER_CLASS.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = sizing.threads
+# database.py lee el tamaño del pool al importarse (después de este archivo, con preload_app)
+os.environ['DB_POOL_MAX_CONNECTIONS'] = str(sizing.pool_size)
 worker_connections = 1000
-max_requests = 1000
-max_requests_jitter = 100
+# Los workers se reciclan por crecimiento de memoria y edad (worker_recycling.py, hook
+# post_request y un hilo por worker), no cada N requests: uno sano conserva caché, plantillas y conexiones.
+# GUNICORN_MAX_REQUESTS queda como válvula de seguridad (0 = desactivado).
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '0'))
 timeout = 120
+# Tiempo que un worker reciclado o en un deploy tiene para terminar los requests en curso:
+# cubre una compra que recorre todos los proveedores en secuencia (providers.purchase_deadline)
+# más el registro de la transacción. GUNICORN_GRACEFUL_TIMEOUT lo fija a mano.
+graceful_timeout = compute_graceful_timeout()
 keepalive = 2
 
 # Configuración de logs
@@ -35,8 +52,30 @@ limit_request_line = 4094
 limit_request_fields = 100
 limit_request_field_size = 8190
 
+def on_starting(server):
+    """Callback al arrancar el master (antes de cargar la app)"""
+    # Las métricas de una ejecución anterior no se suman a las nuevas
+    import metrics
+    metrics.registry.reset_directory()
+
 def when_ready(server):
     """Callback cuando el servidor está listo"""
+    from app_logging import get_logger
+    log = get_logger('server')
+    log.info("Dimensionamiento del servidor", worker_class=worker_class, **sizing.summary())
+    if sizing.over_budget:
+        # Workers, hilos o pool fijados a mano: Postgres puede rechazar conexiones bajo carga
+        log.warning("Las conexiones a Postgres superan DB_CONNECTION_BUDGET",
+                    db_connections_total=sizing.db_connections_total, db_budget=sizing.db_budget,
+                    workers=sizing.workers, db_pool_per_worker=sizing.pool_size)
+    if threads > sizing.pool_size:
+        log.warning("Hay más hilos que conexiones en el pool: algunos requests esperarán conexión",
+                    threads=threads, db_pool_per_worker=sizing.pool_size)
+    from providers import purchase_deadline
+    if graceful_timeout < purchase_deadline():
+        log.warning("graceful_timeout no cubre una compra con todos los proveedores: un deploy puede "
+                    "cortarla a mitad (queda para reconciliar)",
+                    graceful_timeout=graceful_timeout, purchase_deadline=purchase_deadline())
     print("🚀 Servidor Gunicorn listo en Render")
 
 def worker_int(worker):
@@ -49,4 +88,54 @@ def pre_fork(server, worker):
 
 def post_fork(server, worker):
     """Callback después de crear un worker"""
+    # Invalidaciones de caché (LISTEN/NOTIFY): escucha un worker por nodo, los demás quedan en reserva
+    from main import start_cache_listener
+    start_cache_listener()
+    # Cada worker vuelca sus métricas a su propio archivo para /metrics
+    import metrics
+    metrics.registry.ensure_flusher()
+    # Vigía que atiende los pedidos de perfilado dirigidos a este worker
+    import profiler
+    profiler.start_watcher()
+    # Drenaje de compras cuando el worker deba terminar y reconciliación de las interrumpidas
+    import checkout
+    checkout.start_monitor(worker)
+    # Reciclado por edad y memoria también para los workers que no reciben requests
+    import worker_recycling
+    worker_recycling.start_monitor(worker)
+    # Conexión a Postgres, DDL, precios, banner, plantillas y TLS del proveedor antes del primer request
+    from main import warm_worker
+    warm_worker()
     print(f"👷 Worker {worker.pid} creado exitosamente")
+
+def post_request(worker, req, environ, resp):
+    """Callback después de cada request"""
+    # Medir memoria y edad; si el worker creció demasiado se recicla con gracia
+    import worker_recycling
+    worker_recycling.on_request_finished(worker)
+
+def worker_exit(server, worker):
+    """Callback al terminar un worker"""
+    # Las compras que no alcanzaron a terminar quedan marcadas para reconciliar
+    import checkout
+    checkout.interrupt_in_flight()
+    # Último volcado de métricas para que child_exit las conserve
+    import metrics
+    try:
+        metrics.registry.flush()
+    except OSError:
+        pass
+    # Vaciar la cola de logs antes de que el proceso salga
+    import app_logging
+    app_logging.shutdown()
+
+def child_exit(server, worker):
+    """Callback en el master cuando un worker terminó"""
+    # Conservar sus contadores e histogramas; sus gauges dejan de contar
+    import metrics
+    metrics.registry.mark_process_dead(worker.pid)
+    import profiler
+    profiler.forget_worker(worker.pid)
+    # Un worker muerto por SIGKILL o timeout no devolvió sus cupos de proveedor
+    import providers
+    providers.reclaim_permits(worker.pid)
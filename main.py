@@ -2,37 +2,82 @@
 from flask import Flask, render_template, session, redirect, url_for, request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 from database import Database
+from providers import get_router, ProviderBusyError, ProviderOutcomeUnknown
+from shared_cache import SharedCache, CacheLoader
+from cache_events import start_listener
+from catalog import default_prices, install_prices, to_cents
+from page_context import get_page_context, split_transactions
+from template_cache import EXTENSION_VERSION, FragmentCacheExtension
+from static_assets import static_url, send_hashed_asset
+from compression import CompressionMiddleware
+from app_logging import get_logger, REQUEST_LOG_SAMPLE_RATE
+import metrics
+import tracing
+import query_budget
+import profiler
+import warmup
+import checkout
+import worker_recycling  # noqa: F401  (registra las métricas de memoria por worker)
 from utils import MemoryUtils, PriceCalculator, ValidationEngine, log_to_console, generate_unique_id
 import os
 from dotenv import load_dotenv
 from functools import wraps
 from datetime import timedelta
-from flask import send_from_directory
+from flask import send_from_directory, g
+from jinja2 import FileSystemBytecodeCache
+import hmac
+import tempfile
 import time
 
 load_dotenv()
 
+log = get_logger('app')
+
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY')
 
+# Compresión gzip/br de HTML y JSON según Accept-Encoding
+app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+
+# Caché de fragmentos ({% cache %}) para las partes de las plantillas que no dependen del usuario
+jinja_options = {**app.jinja_options, 'extensions': [FragmentCacheExtension]}
+
+# Caché de bytecode de plantillas en disco: un worker o despliegue nuevo no recompila
+# las plantillas desde el código fuente (TEMPLATE_CACHE_DIR vacío la desactiva)
+TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'inefable_jinja_cache'))
+if TEMPLATE_CACHE_DIR:
+    os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    jinja_options['bytecode_cache'] = FileSystemBytecodeCache(
+        TEMPLATE_CACHE_DIR, f'__jinja2_v{EXTENSION_VERSION}_%s.cache')
+app.jinja_options = jinja_options
+
+# URLs de estáticos con hash de contenido (build_static.py) disponibles en las plantillas
+app.add_template_global(static_url)
+
+# Span por cada render_template en las trazas de request
+tracing.install_template_spans(app)
+
+# Sentencias y commits por request contra el presupuesto de cada ruta (@query_budget.budget)
+query_budget.install(app)
+
 # Configurar duración de sesión a 3 horas
 app.permanent_session_lifetime = timedelta(hours=3)
 
-# Cache global para configuraciones con más opciones
-app_cache = {
-    'banner_message': None,
-    'banner_message_timestamp': 0,
-    'game_prices': None,
-    'game_prices_timestamp': 0,
-    'user_sessions': {},  # Cache de sesiones en memoria
-    'temp_codes': {},     # Códigos temporales
-    'validation_cache': {},  # Cache de validaciones
-    'cache_duration': int(os.getenv('CACHE_DURATION', '900'))  # 15 minutos por defecto
-}
+# Caché compartida por todos los workers del nodo (precios y banner)
+CACHE_DURATION = int(os.getenv('CACHE_DURATION', '900'))  # 15 minutos por defecto
+shared_cache = SharedCache()
+shared_cache.register('banner_message', str, CACHE_DURATION)
+shared_cache.register('game_prices', dict, CACHE_DURATION)
+
+DEFAULT_BANNER_MESSAGE = "🎮 ¡Bienvenido a InefableStore! Tu tienda de recargas de juegos más confiable 💎"
 
 # Configuraciones desde variables de entorno
 ENV_CONFIG = MemoryUtils.get_environment_config()
 
+# Crear el router de proveedores al importar: con preload_app los semáforos
+# de concurrencia (bulkheads) se crean en el master y los comparten los workers
+provider_router = get_router()
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -49,8 +94,17 @@ def index():
 
 @app.route('/health')
 def health_check():
-    """Health check endpoint para Render"""
-    return jsonify({"status": "ok", "service": "InefableStore"}), 200
+    """Liveness: el proceso responde (no consulta la base de datos)"""
+    return jsonify({"status": "ok", "service": "InefableStore", "pid": os.getpid()}), 200
+
+@app.route('/health/ready')
+def readiness_check():
+    """Readiness: el worker está precalentado, la base de datos respondió y no está drenando"""
+    state = warm_worker()
+    if checkout.is_draining():
+        return jsonify({"status": "draining", **state.to_dict()}), 503
+    return jsonify({"status": "ready" if state.ready else "not_ready", **state.to_dict()}), \
+        200 if state.ready else 503
 
 @app.route('/auth')
 def auth():
@@ -59,6 +113,7 @@ def auth():
     return render_template('auth.html')
 
 @app.route('/login', methods=['POST'])
+@query_budget.budget(statements=1)
 def login():
     try:
         data = request.get_json()
@@ -104,10 +159,12 @@ def login():
             db.disconnect()
 
     except Exception as e:
-        print(f"Error en login: {e}")
+        log.exception("Error en login")
         return jsonify({"error": "Error interno del servidor"}), 500
 
 @app.route('/register', methods=['POST'])
+# Email existente (1) e inserción (1); excepción: la numeración USR### cuenta los usuarios (1)
+@query_budget.budget(statements=3)
 def register():
     try:
         data = request.get_json()
@@ -163,57 +220,15 @@ def register():
 
 @app.route('/dashboard')
 @login_required
+@query_budget.budget(statements=1)
 def dashboard():
-    db = Database()
-    if not db.connect():
-        return "Error de conexión a la base de datos", 500
-
-    try:
-        user_id = session['user_id']
-
-        # Obtener saldo real de la base de datos
-        balance = db.get_user_balance(user_id)
-        if balance is None:
-            balance = "0.00"
-
-        # Obtener transacciones del usuario
-        transactions = db.get_user_transactions(user_id, limit=10)
-        if transactions is None:
-            transactions = []
-        banner_message = get_banner_message()
-
-        return render_template('dashboard.html', 
-                             user_id=user_id, 
-                             balance=balance,
-                             transactions=transactions,
-                             banner_message=banner_message)
-
-    finally:
-        db.disconnect()
+    return render_storefront('dashboard.html', transactions_limit=10)
 
 @app.route('/freefirelatam')
 @login_required
+@query_budget.budget(statements=1)
 def freefirelatam():
-    db = Database()
-    if not db.connect():
-        return "Error de conexión a la base de datos", 500
-
-    try:
-        user_id = session['user_id']
-
-        # Obtener saldo real de la base de datos
-        balance = db.get_user_balance(user_id)
-        if balance is None:
-            balance = "0.00"
-
-        banner_message = get_banner_message()
-        return render_template('freefirelatam.html', 
-                             user_id=user_id, 
-                             balance=balance,
-                             banner_message=banner_message)
-
-    finally:
-        db.disconnect()
+    return render_storefront('freefirelatam.html')
 
 @app.route('/add_transaction', methods=['POST'])
 @login_required
@@ -276,6 +291,7 @@ def admin_required(f):
 
 @app.route('/admin')
 @admin_required
+@query_budget.budget(statements=2)
 def admin_panel():
     db = Database()
     if not db.connect():
@@ -284,12 +300,13 @@ def admin_panel():
     try:
         users = db.get_all_users()
         pins_stats = db.get_pins_stats()
-        return render_template('admin.html', users=users, pins_stats=pins_stats)
+        return render_template('admin.html', users=users, pins_stats=pins_stats, catalog=get_catalog())
     finally:
         db.disconnect()
 
 @app.route('/admin/add-single-pin', methods=['POST'])
 @admin_required
+@query_budget.budget(statements=2)
 def add_single_pin():
     db = Database()
     if not db.connect():
@@ -307,11 +324,13 @@ def add_single_pin():
         if len(pin_code) < 4:
             return jsonify({"error": "El PIN debe tener al menos 4 caracteres"}), 400
 
-        # Validar tipo de juego y rango de opciones
-        if game_type == 'freefire_latam' and (option_value < 1 or option_value > 9):
-            return jsonify({"error": "Para Free Fire Latam, el valor debe estar entre 1-9"}), 400
-        elif game_type == 'freefire_global' and (option_value < 1 or option_value > 6):
-            return jsonify({"error": "Para Free Fire Global, el valor debe estar entre 1-6"}), 400
+        # Validar tipo de juego y rango de opciones según el catálogo
+        catalog = get_catalog()
+        game = catalog.game(game_type)
+        if game_type in ('freefire_latam', 'freefire_global') and catalog.lookup(game_type, option_value) is None:
+            return jsonify({
+                "error": f"Para {game.title}, el valor debe estar entre {game.min_option}-{game.max_option}"
+            }), 400
 
         # Verificar que el PIN no exista ya
         existing_pin = db.get_pin_by_code(pin_code)
@@ -335,28 +354,19 @@ def add_single_pin():
 
 @app.route('/freefire')
 @login_required
+@query_budget.budget(statements=1)
 def freefire():
     """Página principal de Free Fire Global"""
-    db = Database()
-    if not db.connect():
-        return "Error de conexión a la base de datos", 500
-
-    try:
-        user_id = session['user_id']
-        balance = db.get_user_balance(user_id)
-        if balance is None:
-            balance = "0.00"
-        banner_message = get_banner_message()
-
-        return render_template('freefire.html', 
-                             user_id=user_id, 
-                             balance=balance,
-                             banner_message=banner_message)
-    finally:
-        db.disconnect()
+    return render_storefront('freefire.html')
 
 @app.route('/freefire-latam/validate-recharge', methods=['POST'])
 @login_required
+@checkout.guard('freefire_latam')
+# Saldo (1), PIN local (1), inicio del diario (1), descuento con el diario (1) y su movimiento (1),
+# uso del PIN con el diario (1) y su movimiento (1), transacción con el cierre del diario (1). Con
+# proveedor también 8: intención y PIN en el diario (2) en lugar del uso del PIN local. El diario
+# suma 1 a 3 sentencias sobre el objetivo de 3: el costo de poder reconciliar una compra interrumpida.
+@query_budget.budget(statements=8)
 def freefire_latam_validate_recharge():
     """ENDPOINT EXCLUSIVO para Free Fire Latam - NO reutilizar"""
     db = Database()
@@ -389,15 +399,16 @@ def freefire_latam_validate_recharge():
         if not price_valid:
             return jsonify({"error": price_error}), 400
 
-        # Obtener precio real desde configuración dinámica
-        current_prices = load_game_prices()
-        expected_price = current_prices.get('freefire_latam', {}).get(str(option_value))
-
-        if expected_price is None:
+        # Obtener precio real desde el catálogo vigente
+        catalog = get_catalog()
+        catalog_option = catalog.lookup('freefire_latam', option_value)
+        if catalog_option is None:
             return jsonify({"error": "Precio no configurado para esta opción"}), 400
 
-        # Verificar que el precio enviado coincida con el configurado
-        if abs(real_price - expected_price) > 0.01:
+        # Verificar que el precio enviado coincida con el configurado (en centavos)
+        if to_cents(real_price) != catalog_option.price_cents:
+            if data.get('catalog_version') not in (None, catalog.version):
+                return jsonify({"error": "Los precios se actualizaron, recarga la página", "stale_catalog": True}), 409
             return jsonify({"error": "Precio no coincide con la configuración actual"}), 400
 
         if real_price <= 0:
@@ -410,56 +421,67 @@ def freefire_latam_validate_recharge():
                 "error": f"Saldo insuficiente. Tu saldo actual es ${current_balance:.2f} y necesitas ${real_price:.2f}. Recarga tu cuenta primero."
             }), 400
 
+        purchase = checkout.start_purchase(db, user_id, 'freefire_latam', option_value, real_price)
+
         # PASO 1: Buscar PIN local específico para Free Fire Latam
         available_pin = db.get_available_pin_by_value(option_value, 'freefire_latam')
 
         # PASO 2: Si no hay PINs locales, usar proveedor específico de Free Fire Latam
         pin_from_provider = None
         if not available_pin:
-            print(f"[FREEFIRE LATAM] No hay PINs locales de opción {option_value} (${real_price})")
-            print(f"[FREEFIRE LATAM] Consultando API externa para opción {option_value}")
-            
-            # Crear nueva conexión para la API call
-            api_db = Database()
-            if not api_db.connect():
-                print("[FREEFIRE LATAM] ❌ Error: No se pudo conectar a la base de datos para API")
-                return jsonify({
-                    "error": "Error de conexión para procesar la recarga"
-                }), 500
+            log.info("Free Fire Latam sin PINs locales, consultando proveedor", option=option_value, price=real_price)
             
+            # La consulta al proveedor no usa una segunda conexión del pool
+            purchase.requesting_pin()
             try:
-                pin_from_provider = api_db.get_freefire_latam_pin(option_value)
-                
-                if not pin_from_provider:
-                    print(f"[FREEFIRE LATAM] ❌ API no devolvió PIN para opción {option_value}")
-                    return jsonify({
-                        "error": f"No hay PINés de Free Fire Latam disponibles de ${real_price}. La API externa no tiene stock disponible."
-                    }), 400
-                else:
-                    print(f"[FREEFIRE LATAM] ✅ PIN obtenido de API: {pin_from_provider.get('pin_code', 'N/A')}")
-                    
-            finally:
-                api_db.disconnect()
+                pin_from_provider = db.get_freefire_latam_pin(option_value)
+            except ProviderBusyError:
+                # Respuesta rápida: el saldo aún no se ha descontado
+                purchase.failed('proveedor_ocupado')
+                return jsonify({
+                    "error": "El proveedor está ocupado en este momento. Intenta nuevamente en unos segundos.",
+                    "retry": True
+                }), 503, {'Retry-After': '5'}
+            except ProviderOutcomeUnknown as e:
+                # El proveedor pudo haber cobrado el PIN: no se prueba otro y la compra queda para revisión
+                purchase.provider_unknown(e.provider, e.reason)
+                return jsonify({
+                    "error": "No se pudo confirmar la compra con el proveedor. No se descontó tu saldo; la revisaremos."
+                }), 502
+
+            if not pin_from_provider:
+                log.warning("Free Fire Latam: el proveedor no devolvió PIN", option=option_value)
+                purchase.failed('sin_stock')
+                return jsonify({
+                    "error": f"No hay PINés de Free Fire Latam disponibles de ${real_price}. La API externa no tiene stock disponible."
+                }), 400
+            else:
+                log.info("Free Fire Latam: PIN obtenido del proveedor", option=option_value,
+                         pin=pin_from_provider.get('pin_code'), provider=pin_from_provider.get('provider'))
+                purchase.pin_secured(pin_from_provider['pin_code'], 'api')
 
         # Descontar saldo (solo para usuarios normales, no para admin)
         if user_id != 'ADMIN001':
             new_balance = current_balance - real_price
-            balance_updated = db.update_user_balance(user_id, new_balance)
+            balance_updated = purchase.debit(new_balance, real_price)
             if balance_updated is None:
+                purchase.failed('saldo_no_actualizado')
                 return jsonify({"error": "Error al actualizar el saldo"}), 500
         else:
             # El admin no necesita saldo, no descontamos nada
             new_balance = current_balance
             balance_updated = True
+            purchase.debited(0)
 
         # Procesar según origen del PIN
         if available_pin:
             # PIN local de Free Fire Latam
-            used_pin = db.use_pin(available_pin['id'], user_id)
+            used_pin = purchase.take_local_pin(available_pin)
             if used_pin:
                 transaction_id = MemoryUtils.generate_transaction_id(user_id, "FF")
-                db.insert_transaction(user_id, available_pin['pin_code'], transaction_id, -real_price)
+                purchase.record_transaction(transaction_id, available_pin['pin_code'], -real_price)
 
+                metrics.PURCHASES.inc(game='freefire_latam', source='local')
                 return jsonify({
                     "success": True,
                     "pin": available_pin['pin_code'],
@@ -469,14 +491,16 @@ def freefire_latam_validate_recharge():
                     "source": "freefire_latam_local"
                 })
             else:
-                db.update_user_balance(user_id, current_balance)
+                purchase.refund(current_balance)
+                purchase.failed('pin_local_no_disponible')
                 return jsonify({"error": "Error al procesar PIN local"}), 500
 
         elif pin_from_provider:
             # PIN del proveedor específico de Free Fire Latam
             transaction_id = MemoryUtils.generate_transaction_id(user_id, "FF")
-            db.insert_transaction(user_id, pin_from_provider['pin_code'], transaction_id, -real_price)
+            purchase.record_transaction(transaction_id, pin_from_provider['pin_code'], -real_price)
 
+            metrics.PURCHASES.inc(game='freefire_latam', source='api')
             return jsonify({
                 "success": True,
                 "pin": pin_from_provider['pin_code'],
@@ -487,7 +511,8 @@ def freefire_latam_validate_recharge():
             })
 
         else:
-            db.update_user_balance(user_id, current_balance)
+            purchase.refund(current_balance)
+            purchase.failed('sin_pin')
             return jsonify({"error": "Error inesperado en Free Fire Latam"}), 500
 
     finally:
@@ -495,6 +520,9 @@ def freefire_latam_validate_recharge():
 
 @app.route('/freefire-global/validate-recharge', methods=['POST'])
 @login_required
+@checkout.guard('freefire_global')
+# Como Free Fire Latam con PIN local
+@query_budget.budget(statements=8)
 def freefire_global_validate_recharge():
     """ENDPOINT EXCLUSIVO para Free Fire Global - Usa SOLO PINs locales del admin"""
     db = Database()
@@ -517,15 +545,16 @@ def freefire_global_validate_recharge():
         option_value = int(option_value)
         real_price = float(real_price)
 
-        # Obtener precio real desde configuración dinámica
-        current_prices = load_game_prices()
-        expected_price = current_prices.get('freefire_global', {}).get(str(option_value))
-
-        if expected_price is None:
+        # Obtener precio real desde el catálogo vigente
+        catalog = get_catalog()
+        catalog_option = catalog.lookup('freefire_global', option_value)
+        if catalog_option is None:
             return jsonify({"error": "Precio no configurado para esta opción"}), 400
 
-        # Verificar que el precio enviado coincida con el configurado
-        if abs(real_price - expected_price) > 0.01:
+        # Verificar que el precio enviado coincida con el configurado (en centavos)
+        if to_cents(real_price) != catalog_option.price_cents:
+            if data.get('catalog_version') not in (None, catalog.version):
+                return jsonify({"error": "Los precios se actualizaron, recarga la página", "stale_catalog": True}), 409
             return jsonify({"error": "Precio no coincide con la configuración actual"}), 400
 
         if real_price <= 0:
@@ -546,22 +575,27 @@ def freefire_global_validate_recharge():
                 "error": f"No hay PINés de Free Fire Global disponibles de ${real_price}. El administrador debe agregar PINés manualmente."
             }), 400
 
+        purchase = checkout.start_purchase(db, user_id, 'freefire_global', option_value, real_price)
+
         # Descontar saldo (solo para usuarios normales, no para admin)
         if user_id != 'ADMIN001':
             new_balance = current_balance - real_price
-            balance_updated = db.update_user_balance(user_id, new_balance)
+            balance_updated = purchase.debit(new_balance, real_price)
             if balance_updated is None:
+                purchase.failed('saldo_no_actualizado')
                 return jsonify({"error": "Error al actualizar el saldo"}), 500
         else:
             new_balance = current_balance
             balance_updated = True
+            purchase.debited(0)
 
         # Usar PIN local
-        used_pin = db.use_pin(available_pin['id'], user_id)
+        used_pin = purchase.take_local_pin(available_pin)
         if used_pin:
             transaction_id = MemoryUtils.generate_transaction_id(user_id, "FG")
-            db.insert_transaction(user_id, available_pin['pin_code'], transaction_id, -real_price)
+            purchase.record_transaction(transaction_id, available_pin['pin_code'], -real_price)
 
+            metrics.PURCHASES.inc(game='freefire_global', source='local')
             return jsonify({
                 "success": True,
                 "pin": available_pin['pin_code'],
@@ -573,7 +607,8 @@ def freefire_global_validate_recharge():
         else:
             # Revertir saldo si falló
             if user_id != 'ADMIN001':
-                db.update_user_balance(user_id, current_balance)
+                purchase.refund(current_balance)
+            purchase.failed('pin_local_no_disponible')
             return jsonify({"error": "Error al procesar PIN local. Intenta nuevamente."}), 500
 
     finally:
@@ -581,27 +616,17 @@ def freefire_global_validate_recharge():
 
 @app.route('/blockstriker')
 @login_required
+@query_budget.budget(statements=1)
 def blockstriker():
     """Página de Block Striker - Independiente de otros juegos"""
-    user_id = session.get('user_id')
-
-    db = Database()
-    if not db.connect():
-        flash('Error de conexión a la base de datos', 'error')
-        return redirect(url_for('dashboard'))
-
-    try:
-        balance = db.get_user_balance(user_id)
-        banner_message = get_banner_message()
-        return render_template('blockstriker.html', 
-                             user_id=user_id, 
-                             balance=balance,
-                             banner_message=banner_message)
-    finally:
-        db.disconnect()
+    return render_storefront('blockstriker.html')
 
 @app.route('/block-striker/validate-recharge', methods=['POST'])
 @login_required
+@checkout.guard('block_striker')
+# Saldo (1), inicio del diario (1), descuento con el diario (1) y su movimiento (1), transacción
+# con el cierre del diario (1)
+@query_budget.budget(statements=5)
 def block_striker_validate_recharge():
     """ENDPOINT EXCLUSIVO para Block Striker - Completamente independiente"""
     db = Database()
@@ -627,19 +652,16 @@ def block_striker_validate_recharge():
         option_value = int(option_value)
         real_price = float(real_price)
 
-        # Validación específica para Block Striker (1-9)
-        if option_value < 1 or option_value > 9:
+        # Validación específica para Block Striker y precio real desde el catálogo vigente
+        catalog = get_catalog()
+        catalog_option = catalog.lookup('block_striker', option_value)
+        if catalog_option is None:
             return jsonify({"error": "Opción de Block Striker inválida"}), 400
 
-        # Obtener precio real desde configuración dinámica
-        current_prices = load_game_prices()
-        expected_price = current_prices.get('block_striker', {}).get(str(option_value))
-
-        if expected_price is None:
-            return jsonify({"error": "Precio no configurado para esta opción"}), 400
-
-        # Verificar que el precio enviado coincida con el configurado
-        if abs(real_price - expected_price) > 0.01:
+        # Verificar que el precio enviado coincida con el configurado (en centavos)
+        if to_cents(real_price) != catalog_option.price_cents:
+            if data.get('catalog_version') not in (None, catalog.version):
+                return jsonify({"error": "Los precios se actualizaron, recarga la página", "stale_catalog": True}), 409
             return jsonify({"error": "Precio no coincide con la configuración actual"}), 400
 
         if real_price <= 0:
@@ -653,31 +675,33 @@ def block_striker_validate_recharge():
             }), 400
 
         # Block Striker no requiere código/PIN, solo procesa la compra directamente
+        purchase = checkout.start_purchase(db, user_id, 'block_striker', option_value, real_price)
 
         # Descontar saldo (solo para usuarios normales, no para admin)
         if user_id != 'ADMIN001':
             new_balance = current_balance - real_price
-            balance_updated = db.update_user_balance(user_id, new_balance)
+            balance_updated = purchase.debit(new_balance, real_price)
             if balance_updated is None:
+                purchase.failed('saldo_no_actualizado')
                 return jsonify({"error": "Error al actualizar el saldo"}), 500
         else:
             # El admin no necesita saldo, no descontamos nada
             new_balance = current_balance
             balance_updated = True
+            purchase.debited(0)
 
         # Crear transacción específica para Block Striker sin código
         transaction_id = MemoryUtils.generate_transaction_id(user_id, "BS")
 
         # Insertar transacción con información específica de Block Striker (sin código)
-        db.insert_block_striker_transaction(
-            user_id=user_id,
-            player_id=MemoryUtils.clean_input(player_id),  # Limpiar entrada
-            code=None,  # No se genera código para Block Striker
+        purchase.record_block_striker_transaction(
             transaction_id=transaction_id,
+            player_id=MemoryUtils.clean_input(player_id),  # Limpiar entrada
             amount=-real_price,
             option_value=option_value
         )
 
+        metrics.PURCHASES.inc(game='block_striker', source='direct')
         return jsonify({
             "success": True,
             "player_id": player_id,
@@ -692,6 +716,7 @@ def block_striker_validate_recharge():
 
 @app.route('/admin/users')
 @admin_required
+@query_budget.budget(statements=1)
 def admin_users():
     db = Database()
     if not db.connect():
@@ -746,6 +771,8 @@ def delete_user(user_id):
 
 @app.route('/admin/user/<user_id>/add-credit', methods=['POST'])
 @admin_required
+# Crédito con el saldo nuevo (1) y movimiento con la limpieza de antiguos (1)
+@query_budget.budget(statements=2)
 def add_credit(user_id):
     db = Database()
     if not db.connect():
@@ -758,10 +785,9 @@ def add_credit(user_id):
         if amount <= 0:
             return jsonify({"error": "El monto debe ser mayor a 0"}), 400
 
-        result = db.add_credit_to_user(user_id, amount)
+        new_balance = db.add_credit_to_user(user_id, amount)
 
-        if result:
-            new_balance = db.get_user_balance(user_id)
+        if new_balance is not None:
             return jsonify({
                 "success": True, 
                 "message": f"Crédito agregado exitosamente",
@@ -775,6 +801,8 @@ def add_credit(user_id):
 
 @app.route('/admin/user/<user_id>/set-balance', methods=['POST'])
 @admin_required
+# Saldo anterior para el movimiento (1), update (1) y movimiento con la limpieza de antiguos (1)
+@query_budget.budget(statements=3)
 def set_balance(user_id):
     db = Database()
     if not db.connect():
@@ -858,16 +886,7 @@ def update_banner_message():
             return jsonify({'success': False, 'error': 'El mensaje es demasiado largo (máximo 500 caracteres)'})
 
         # Crear tabla de configuraciones si no existe
-        create_config_query = """
-        CREATE TABLE IF NOT EXISTS system_config (
-            id SERIAL PRIMARY KEY,
-            config_key VARCHAR(100) UNIQUE NOT NULL,
-            config_value TEXT NOT NULL,
-            description TEXT,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-        db.execute_query(create_config_query)
+        db.ensure_table('system_config')
 
         # Actualizar o insertar el mensaje del banner en la base de datos
         upsert_query = """
@@ -881,8 +900,9 @@ def update_banner_message():
         result = db.execute_query(upsert_query, (new_message,))
 
         if result is not None:
-            # Invalidar caché del banner cuando se actualice
+            # Invalidar caché del banner cuando se actualice (y avisar a los demás workers)
             invalidate_cache('banner')
+            db.notify_cache_change('banner')
             return jsonify({'success': True, 'message': 'Mensaje del banner actualizado exitosamente'})
         else:
             return jsonify({'success': False, 'error': 'Error guardando en base de datos'}), 500
@@ -893,121 +913,120 @@ def update_banner_message():
         db.disconnect()
 
 def get_banner_message():
-    """Obtener el mensaje actual del banner con caché optimizado"""
-    current_time = time.time()
-    
-    # Verificar si el caché es válido
-    if (app_cache['banner_message'] is not None and 
-        current_time - app_cache['banner_message_timestamp'] < app_cache['cache_duration']):
-        return app_cache['banner_message']
-    
-    # Si no hay caché válido, consultar base de datos
+    """Obtener el mensaje actual del banner con caché compartida"""
+    return banner_loader.get()
+
+def load_banner_message_from_db():
+    """Leer el banner de la base de datos; None si no se pudo consultar"""
     db = Database()
     if not db.connect():
-        default_message = "🎮 ¡Bienvenido a InefableStore! Tu tienda de recargas de juegos más confiable 💎"
-        app_cache['banner_message'] = default_message
-        app_cache['banner_message_timestamp'] = current_time
-        return default_message
+        return None
     
     try:
         # Crear tabla de configuraciones si no existe
-        create_config_query = """
-        CREATE TABLE IF NOT EXISTS system_config (
-            id SERIAL PRIMARY KEY,
-            config_key VARCHAR(100) UNIQUE NOT NULL,
-            config_value TEXT NOT NULL,
-            description TEXT,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-        db.execute_query(create_config_query)
+        db.ensure_table('system_config')
         
         # Obtener mensaje del banner
         query = "SELECT config_value FROM system_config WHERE config_key = 'banner_message'"
         result = db.execute_query(query)
+        if result is None:
+            return None
         
-        if result and len(result) > 0:
-            message = result[0]['config_value']
-        else:
-            # Insertar mensaje por defecto si no existe
-            message = "🎮 ¡Bienvenido a InefableStore! Tu tienda de recargas de juegos más confiable 💎"
-            insert_query = """
-            INSERT INTO system_config (config_key, config_value, description) 
-            VALUES ('banner_message', %s, 'Mensaje del banner principal')
-            """
-            db.execute_query(insert_query, (message,))
-        
-        # Actualizar caché
-        app_cache['banner_message'] = message
-        app_cache['banner_message_timestamp'] = current_time
-        return message
+        if len(result) > 0:
+            return result[0]['config_value']
+
+        # Insertar mensaje por defecto si no existe
+        insert_query = """
+        INSERT INTO system_config (config_key, config_value, description) 
+        VALUES ('banner_message', %s, 'Mensaje del banner principal')
+        ON CONFLICT (config_key) DO NOTHING
+        """
+        db.execute_query(insert_query, (DEFAULT_BANNER_MESSAGE,))
+        return DEFAULT_BANNER_MESSAGE
             
     except Exception as e:
-        print(f"Error obteniendo banner desde BD: {e}")
-        default_message = "🎮 ¡Bienvenido a InefableStore! Tu tienda de recargas de juegos más confiable 💎"
-        app_cache['banner_message'] = default_message
-        app_cache['banner_message_timestamp'] = current_time
-        return default_message
+        log.exception("Error obteniendo banner desde BD")
+        return None
     finally:
         db.disconnect()
 
 def load_game_prices():
-    """Cargar precios de los juegos con caché optimizado"""
-    current_time = time.time()
-    
-    # Verificar si el caché es válido
-    if (app_cache['game_prices'] is not None and 
-        current_time - app_cache['game_prices_timestamp'] < app_cache['cache_duration']):
-        return app_cache['game_prices']
-    
-    # Si no hay caché válido, consultar base de datos
+    """Cargar precios de los juegos con caché compartida"""
+    return prices_loader.get()
+
+def get_catalog():
+    """Catálogo vigente; se recompila (y reemplaza) solo cuando cambian los precios"""
+    return install_prices(load_game_prices())
+
+def render_storefront(template_name, transactions_limit=0):
+    """Renderizar una página de la tienda: datos del usuario en una consulta, banner y catálogo desde caché"""
+    user_id = session['user_id']
+    context = get_page_context(user_id, transactions_limit)
+    if context is None:
+        return "Error de conexión a la base de datos", 500
+
+    transactions = context['transactions'][:transactions_limit]
+    credit_transactions, history_transactions = split_transactions(transactions)
+    return render_template(template_name,
+                         user_id=user_id,
+                         balance=context['balance'],
+                         is_active=context['is_active'],
+                         transactions=transactions,
+                         credit_transactions=credit_transactions,
+                         history_transactions=history_transactions,
+                         banner_message=get_banner_message(),
+                         catalog=get_catalog())
+
+def load_game_prices_from_db():
+    """Leer los precios de la base de datos; None si no se pudo consultar"""
     db = Database()
     if not db.connect():
-        print("❌ Error conectando a la base de datos para cargar precios")
-        # Retornar precios por defecto en caso de error
-        default_prices = {
-            "freefire_latam": {
-                "1": 0.66, "2": 1.99, "3": 3.35, "4": 6.70, "5": 12.70,
-                "6": 29.50, "7": 0.40, "8": 1.40, "9": 6.50
-            },
-            "freefire_global": {
-                "1": 0.86, "2": 2.90, "3": 4.00, "4": 7.75, "5": 15.30, "6": 38.00
-            },
-            "block_striker": {
-                "1": 0.82, "2": 2.60, "3": 4.30, "4": 8.65, "5": 17.30,
-                "6": 43.15, "7": 3.50, "8": 8.00, "9": 1.85
-            }
-        }
-        app_cache['game_prices'] = default_prices
-        app_cache['game_prices_timestamp'] = current_time
-        return default_prices
+        log.error("Error conectando a la base de datos para cargar precios")
+        return None
 
     try:
-        prices = db.load_game_prices()
-        # Actualizar caché
-        app_cache['game_prices'] = prices
-        app_cache['game_prices_timestamp'] = current_time
-        return prices
+        return db.load_game_prices()
     finally:
         db.disconnect()
 
+# Un solo worker recarga cada entrada; los demás reciben el valor anterior.
+# Si la base de datos no responde se sigue sirviendo el último valor bueno.
+banner_loader = CacheLoader(
+    shared_cache, 'banner_message', load_banner_message_from_db,
+    fallback=lambda: DEFAULT_BANNER_MESSAGE
+)
+prices_loader = CacheLoader(
+    shared_cache, 'game_prices', load_game_prices_from_db,
+    fallback=default_prices
+)
+
 def invalidate_cache(cache_type=None):
-    """Invalidar caché específico o todo el caché"""
+    """Invalidar caché específico o todo el caché (aplica a todos los workers del nodo)"""
     if cache_type == 'banner' or cache_type is None:
-        app_cache['banner_message'] = None
-        app_cache['banner_message_timestamp'] = 0
+        shared_cache.invalidate('banner_message')
     
     if cache_type == 'prices' or cache_type is None:
-        app_cache['game_prices'] = None
-        app_cache['game_prices_timestamp'] = 0
+        shared_cache.invalidate('game_prices')
     
-    print(f"🔄 Caché invalidado: {cache_type or 'todo'}")
+    log.info("Caché invalidado", cache_type=cache_type or 'todo')
+
+def handle_cache_notification(payload):
+    """Aplicar un aviso de LISTEN/NOTIFY; payload None significa invalidar todo"""
+    if payload in ('banner', 'prices'):
+        invalidate_cache(payload)
+    elif payload is None:
+        invalidate_cache()
+
+def start_cache_listener():
+    """Iniciar el listener de invalidaciones (post_fork de cada worker; escucha uno por nodo)"""
+    # La caché invalidada es la compartida del nodo: basta un listener por archivo de caché
+    return start_listener(handle_cache_notification, lock_path=f"{shared_cache.path}.listener.lock")
 
 def save_game_prices(game_type, prices):
     """Guardar precios de un juego específico en la base de datos"""
     db = Database()
     if not db.connect():
-        print("❌ Error conectando a la base de datos para guardar precios")
+        log.error("Error conectando a la base de datos para guardar precios")
         return False
 
     try:
@@ -1021,13 +1040,137 @@ def save_game_prices(game_type, prices):
 
 # Endpoint de verificación de disponibilidad removido
 
+@app.route('/admin/providers/status')
+@admin_required
+def providers_status():
+    """Estadísticas de proveedores: latencia, éxito y ocupación de los bulkheads"""
+    return jsonify({"success": True, "providers": provider_router.snapshot()})
+
+@app.route('/admin/cache/status')
+@admin_required
+def cache_status():
+    """Ocupación y aciertos/fallos de la caché compartida (del worker que responde) y de fragmentos"""
+    return jsonify({
+        "success": True,
+        "pid": os.getpid(),
+        "cache": shared_cache.stats(),
+        "fragments": app.jinja_env.fragment_cache.stats()
+    })
+
+def collect_pin_stock_metrics():
+    """PINes disponibles por juego y opción (una consulta por scrape)"""
+    db = Database()
+    if not db.connect():
+        return []
+    try:
+        stats = db.get_pins_stats() or []
+    finally:
+        db.disconnect()
+    return [('pins_available', 'gauge', 'PINes locales disponibles por juego y opción',
+             [({'game': row['game_type'], 'option': row['value']}, row['available']) for row in stats])]
+
+metrics.registry.register_collector(collect_pin_stock_metrics)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métricas de todos los workers en formato de texto de Prometheus"""
+    if metrics.METRICS_TOKEN:
+        authorization = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization, f'Bearer {metrics.METRICS_TOKEN}'):
+            return jsonify({"error": "No autorizado"}), 401
+    elif not is_admin():
+        return jsonify({"error": "No autorizado"}), 401
+    return app.response_class(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/traces')
+@admin_required
+def traces():
+    """Trazas recientes de este worker (?slow=1 solo las lentas, ?trace_id= una en particular)"""
+    trace_id = request.args.get('trace_id')
+    records = tracing.recent_traces(limit=request.args.get('limit', 50, type=int),
+                                    slow=request.args.get('slow') == '1', trace_id=trace_id)
+    if trace_id and not records:
+        # Puede haberla atendido otro worker: buscar en el archivo exportado
+        exported = tracing.find_exported(trace_id)
+        records = [exported] if exported else []
+    return jsonify({"success": True, "pid": os.getpid(), "traces": records})
+
+@app.route('/admin/purchases/journal')
+@admin_required
+def purchase_journal():
+    """Diario de compras (?pending=1 solo las que esperan reconciliación)"""
+    db = Database()
+    if not db.connect():
+        return jsonify({"error": "Error de conexión a la base de datos"}), 500
+    try:
+        entries = db.journal_recent(pending_only=request.args.get('pending') == '1',
+                                    limit=request.args.get('limit', 50, type=int))
+        if entries is None:
+            return jsonify({"error": "No se pudo leer el diario de compras"}), 500
+        return jsonify({"success": True, "entries": [dict(entry) for entry in entries]})
+    finally:
+        db.disconnect()
+
+@app.route('/admin/purchases/reconcile', methods=['POST'])
+@admin_required
+def reconcile_purchases():
+    """Reconciliar ya las compras interrumpidas (?older_than= segundos, por defecto PURCHASE_RECONCILE_AFTER).
+
+    older_than nunca baja de RECONCILE_MIN_AGE: una compra más nueva puede seguir en curso.
+    """
+    older_than = request.args.get('older_than', checkout.PURCHASE_RECONCILE_AFTER, type=int)
+    older_than = max(older_than, checkout.RECONCILE_MIN_AGE)
+    summary = checkout.reconcile(older_than=older_than)
+    if summary is None:
+        return jsonify({"error": "Error de conexión a la base de datos"}), 500
+    return jsonify({"success": True, "older_than": older_than, "reconciled": summary})
+
+@app.route('/admin/profiler/workers')
+@admin_required
+def profiler_workers():
+    """Workers que se pueden perfilar (pid) y el que atendió este request"""
+    return jsonify({"success": True, "pid": os.getpid(), "workers": profiler.list_workers()})
+
+@app.route('/admin/profiler/cpu', methods=['POST'])
+@admin_required
+def profiler_cpu():
+    """Muestrear las pilas de un worker N segundos; responde pilas colapsadas (flamegraph)"""
+    data = request.get_json(silent=True) or {}
+    command = {'kind': 'cpu', 'seconds': data.get('seconds', 10), 'interval': data.get('interval')}
+    try:
+        profile = profiler.run(command, data.get('pid'))
+    except (profiler.ProfilerError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return app.response_class(profile, mimetype='text/plain')
+
+@app.route('/admin/profiler/memory', methods=['POST'])
+@admin_required
+def profiler_memory():
+    """tracemalloc en un worker: action start, snapshot (diferencia con el anterior) o stop"""
+    data = request.get_json(silent=True) or {}
+    command = {'kind': 'memory', 'action': data.get('action', 'snapshot'), 'limit': data.get('limit', 25)}
+    try:
+        result = profiler.run(command, data.get('pid'))
+    except (profiler.ProfilerError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, **result})
+
 @app.route('/admin/get-game-prices')
 @login_required
+@query_budget.budget(statements=0)
 def get_game_prices():
-    """Obtener precios actuales de los juegos"""
+    """Obtener precios actuales de los juegos (pre-serializados, con ETag por versión)"""
     try:
-        prices = load_game_prices()
-        return jsonify({"success": True, "prices": prices})
+        catalog = get_catalog()
+        # Comparación débil: con compresión el ETag llega como W/"..."
+        if request.if_none_match.contains_weak(catalog.etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(catalog.prices_json, mimetype='application/json')
+        response.set_etag(catalog.etag)
+        # El navegador guarda la respuesta pero la revalida siempre (304 si no cambió)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
         return jsonify({"error": f"Error cargando precios: {str(e)}"}), 500
 
@@ -1040,47 +1183,46 @@ def update_game_prices():
         game_type = data.get('game_type')
         new_prices = data.get('prices')
 
-        print(f"🔄 Actualizando precios de {game_type}: {new_prices}")
+        log.info("Actualizando precios", game_type=game_type, prices=new_prices)
 
         if not game_type or not new_prices:
             return jsonify({"error": "Tipo de juego y precios son requeridos"}), 400
 
-        if game_type not in ['freefire_latam', 'freefire_global', 'block_striker']:
-            return jsonify({"error": "Tipo de juego inválido"}), 400
-
-        # Validar que todos los precios sean números positivos
-        for key, price in new_prices.items():
-            if not isinstance(price, (int, float)) or price < 0:
-                return jsonify({"error": f"Precio inválido para opción {key}"}), 400
-
-        # Convertir precios a formato correcto
-        formatted_prices = {}
-        for key, price in new_prices.items():
-            formatted_prices[str(key)] = float(price)
+        # Validar juego, opciones y rangos de precio contra el catálogo
+        formatted_prices, price_error = get_catalog().validate_price_update(game_type, new_prices)
+        if price_error:
+            return jsonify({"error": price_error}), 400
 
-        print(f"📝 Precios a guardar en base de datos: {formatted_prices}")
+        log.debug("Precios a guardar en base de datos", game_type=game_type, prices=formatted_prices)
 
         # Guardar precios en la base de datos
         if save_game_prices(game_type, formatted_prices):
-            # Verificar que los precios se guardaron correctamente
-            saved_prices = load_game_prices()
-            if saved_prices.get(game_type) == formatted_prices:
-                print(f"✅ Verificación exitosa: Precios de {game_type} persistidos correctamente en base de datos")
+            # Verificar que los precios se guardaron correctamente (recarga el catálogo)
+            catalog = get_catalog()
+            saved_prices = dict(catalog.prices[game_type])
+            if all(saved_prices.get(key) == price for key, price in formatted_prices.items()):
+                log.info("Precios verificados en base de datos", game_type=game_type)
                 return jsonify({
                     "success": True, 
                     "message": f"Precios de {game_type} actualizados y verificados exitosamente",
-                    "saved_prices": saved_prices[game_type]
+                    "saved_prices": saved_prices,
+                    "version": catalog.version
                 })
             else:
-                print(f"❌ Error de verificación: Los precios no persistieron correctamente")
+                log.error("Los precios no persistieron correctamente", game_type=game_type)
                 return jsonify({"error": "Error: Los precios no se guardaron correctamente"}), 500
         else:
             return jsonify({"error": "Error guardando precios en base de datos"}), 500
 
     except Exception as e:
-        print(f"❌ Error en update_game_prices: {str(e)}")
+        log.exception("Error en update_game_prices")
         return jsonify({"error": f"Error actualizando precios: {str(e)}"}), 500
 
+# Archivos estáticos con hash: caché inmutable y variante precomprimida
+@app.route('/assets/<path:filename>')
+def hashed_asset(filename):
+    return send_hashed_asset(filename)
+
 # Ruta para servir el service worker
 @app.route('/static/service-worker.js')
 def service_worker():
@@ -1090,10 +1232,25 @@ def service_worker():
 @app.before_request
 def log_request_info():
     """Log información de cada request para debug en Render"""
+    # Los estáticos con hash no tocan la sesión (sin "Vary: Cookie", cacheables por CDN/proxies)
+    if request.endpoint == 'hashed_asset':
+        return
     if not ENV_CONFIG.get('maintenance_mode', False):  # Solo si no está en mantenimiento
-        print(f"[REQUEST] {request.method} {request.path} - User: {session.get('user_id', 'Anonymous')}")
+        fields = {}
         if request.method == 'POST' and request.is_json:
-            print(f"[REQUEST DATA] Keys: {list(request.get_json().keys()) if request.get_json() else 'None'}")
+            data = request.get_json(silent=True)
+            fields['keys'] = list(data.keys()) if isinstance(data, dict) else None
+        # Volumen alto: solo una muestra de los requests (los errores se registran siempre en after_request)
+        log.info("Request", method=request.method, path=request.path,
+                 user=session.get('user_id', 'Anonymous'), sample_rate=REQUEST_LOG_SAMPLE_RATE, **fields)
+
+@app.before_request
+def start_request_telemetry():
+    g.metrics_started = metrics.start_request()
+    if request.endpoint not in ('static', 'hashed_asset'):
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        tracing.start_trace(route, trace_id=request.headers.get(tracing.TRACE_HEADER),
+                            method=request.method, path=request.path)
 
 # Agregar headers de CORS para todas las respuestas
 @app.after_request
@@ -1103,25 +1260,78 @@ def after_request(response):
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE')
     
     # Log de respuestas para debug en Render
-    if response.status_code >= 400:
-        print(f"[RESPONSE ERROR] {response.status_code} for {request.method} {request.path}")
+    if response.status_code >= 500:
+        log.error("Respuesta con error", status=response.status_code, method=request.method, path=request.path)
+    elif response.status_code >= 400:
+        log.warning("Respuesta con error", status=response.status_code, method=request.method, path=request.path)
+
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        # Por patrón de ruta (no por URL) para no crear una serie por usuario o PIN
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.finish_request(started, route, request.method, str(response.status_code))
+
+    trace_id = tracing.current_trace_id()
+    if trace_id is not None:
+        response.headers[tracing.TRACE_HEADER] = trace_id
+        tracing.finish_trace(status=response.status_code)
     
     return response
 
 # Las credenciales del admin se leen directamente de las variables de entorno
 admin_user = os.getenv('ADMIN_USER')
 admin_password = os.getenv('ADMIN_PASSWORD')
-print(f"Admin configurado - Usuario: {admin_user if admin_user else 'NO CONFIGURADO'}")
+log.info("Admin configurado", admin_user=admin_user or 'NO CONFIGURADO')
 
 # Verificar credenciales de Free Fire Latam
 freefire_user = os.getenv('FREEFIRE_LATAM_USER')
 freefire_password = os.getenv('FREEFIRE_LATAM_PASSWORD')
-print(f"🎮 Free Fire Latam API - Usuario: {'✅ Configurado' if freefire_user else '❌ NO CONFIGURADO'}")
-print(f"🎮 Free Fire Latam API - Contraseña: {'✅ Configurada' if freefire_password else '❌ NO CONFIGURADA'}")
-
 if not freefire_user or not freefire_password:
-    print("⚠️  ADVERTENCIA: Credenciales de Free Fire Latam no configuradas. La API externa no funcionará.")
-    print("   Configura FREEFIRE_LATAM_USER y FREEFIRE_LATAM_PASSWORD en las variables de entorno.")
+    log.warning("Credenciales de Free Fire Latam no configuradas: la API externa no funcionará. "
+                "Configura FREEFIRE_LATAM_USER y FREEFIRE_LATAM_PASSWORD",
+                user_configured=bool(freefire_user), password_configured=bool(freefire_password))
+
+def precompile_templates():
+    """Compilar todas las plantillas ahora (en el master con preload_app, antes del fork)"""
+    started = time.perf_counter()
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    log.info("Plantillas precompiladas", templates=len(names),
+             ms=round((time.perf_counter() - started) * 1000, 1))
+    return names
+
+# Con preload_app esto corre una sola vez en el master y los workers heredan las plantillas compiladas
+if os.getenv('PRECOMPILE_TEMPLATES', 'true').lower() != 'false':
+    precompile_templates()
+
+def warm_database():
+    """Abrir la conexión del pool y crear las tablas bajo demanda (DDL) antes del primer request"""
+    db = Database()
+    if not db.connect():
+        return False
+    try:
+        if db.execute_query("SELECT 1") is None:
+            return False
+        return all(db.ensure_table(table) for table in ('system_config', 'game_prices', 'purchase_journal'))
+    finally:
+        db.disconnect()
+
+def warm_templates():
+    """Plantillas compiladas en este proceso (heredadas del master o compiladas ahora)"""
+    if not app.jinja_env.cache:
+        precompile_templates()
+    return {'templates': len(app.jinja_env.cache)}
+
+def warm_worker():
+    """Precalentar este worker una vez (post_fork en gunicorn); devuelve el estado de warmup"""
+    return warmup.run([
+        ('database', warm_database),
+        ('prices', lambda: {'catalog_version': get_catalog().version}),
+        ('banner', lambda: bool(get_banner_message())),
+        ('templates', warm_templates),
+        ('providers', provider_router.warm),
+    ])
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -1130,13 +1340,13 @@ if __name__ == '__main__':
     is_render = os.getenv('RENDER') is not None
     is_replit = os.getenv('REPLIT_DEV_DOMAIN') is not None
     
-    print(f"🌍 Entorno detectado: {'Render' if is_render else 'Replit' if is_replit else 'Desconocido'}")
-    print(f"🚀 Iniciando servidor en puerto {port}")
+    log.info("Iniciando servidor", port=port,
+             environment='Render' if is_render else 'Replit' if is_replit else 'Desconocido')
+    start_cache_listener()
+    warm_worker()
     
     if is_render:
-        print("🔧 Configuración para Render - Modo Producción")
         # En Render, Gunicorn manejará la aplicación, esto es solo para testing local
         app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
     else:
-        print("🔧 Configuración para Replit - Modo Desarrollo")
         app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
@@ -0,0 +1,400 @@
+"""
+Métricas de la aplicación agregadas entre todos los workers de gunicorn.
+
+Cada proceso acumula contadores, histogramas y gauges en memoria (sin I/O en
+el request) y un hilo de fondo los vuelca cada METRICS_FLUSH_INTERVAL segundos
+a un archivo propio en METRICS_DIR (metrics_<pid>.json). El endpoint /metrics
+lee y suma los archivos de todos los workers y responde en formato de texto
+de Prometheus. Cuando un worker termina, el master (child_exit) pasa sus
+contadores e histogramas a archived.json para no perderlos; sus gauges se
+descartan.
+
+    REQUEST_DURATION.observe(0.12, route='/dashboard', method='GET', status='200')
+    PURCHASES.inc(game='freefire_latam', source='api')
+
+Las métricas que ya están agregadas en otro lugar (stock de PINes en la base
+de datos) se calculan al momento del scrape con register_collector().
+
+Configuración:
+    METRICS_DIR               directorio de los archivos por worker (/dev/shm/inefable_metrics)
+    METRICS_FLUSH_INTERVAL    segundos entre volcados de cada worker (5)
+    METRICS_TOKEN             si está definido, /metrics exige "Authorization: Bearer <token>"
+"""
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+
+from app_logging import get_logger
+
+log = get_logger('metrics')
+
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+ARCHIVE_FILE = 'archived.json'
+
+# Segundos; cubren desde lecturas de caché hasta llamadas lentas al proveedor
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+
+def default_metrics_dir():
+    """/dev/shm si existe (memoria compartida), si no el directorio temporal"""
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'inefable_metrics')
+
+
+METRICS_DIR = os.getenv('METRICS_DIR') or default_metrics_dir()
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def dump(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Valor instantáneo por proceso; en el scrape se suman los workers vivos"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [conteo por bucket (sin acumular)..., +Inf, suma]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def dump(self):
+        with self._lock:
+            return [[list(key), list(state)] for key, state in self._values.items()]
+
+
+class Registry:
+    def __init__(self, directory=METRICS_DIR):
+        self.directory = directory
+        self._metrics = {}
+        self._collectors = []
+        self._gauge_callbacks = []
+        self._flusher_pid = None
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def register_collector(self, collect):
+        """collect() -> [(nombre, tipo, ayuda, [({labels}, valor), ...])]; corre solo en el scrape"""
+        self._collectors.append(collect)
+
+    def register_gauge_callback(self, update):
+        """update() actualiza gauges del proceso justo antes de cada volcado"""
+        self._gauge_callbacks.append(update)
+
+    # --- Archivos por worker ---
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'metrics_{pid}.json')
+
+    def snapshot(self):
+        for update in self._gauge_callbacks:
+            try:
+                update()
+            except Exception as e:
+                log.warning("Error actualizando gauges", error=str(e))
+        return {name: metric.dump() for name, metric in self._metrics.items()}
+
+    def flush(self):
+        """Escribir el estado de este proceso (reemplazo atómico del archivo)"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        # El hilo de volcado y un scrape pueden escribir a la vez
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def ensure_flusher(self):
+        """Iniciar el hilo de volcado del proceso actual (una vez por proceso, también tras el fork)"""
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            if self._flusher_pid != _import_pid:
+                # Lo heredado del master no es de este worker
+                for metric in self._metrics.values():
+                    metric.clear()
+            threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError as e:
+                log.warning("No se pudieron volcar las métricas", error=str(e))
+
+    def reset_directory(self):
+        """Borrar los archivos de una ejecución anterior (al arrancar el master)"""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.startswith('metrics_') or name == ARCHIVE_FILE:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def mark_process_dead(self, pid):
+        """Pasar contadores e histogramas de un worker terminado al archivo acumulado"""
+        path = self._path(pid)
+        dead = _read_json(path)
+        if dead is None:
+            return
+        archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+        archive = _read_json(archive_path) or {}
+        for name, samples in dead.items():
+            metric = self._metrics.get(name)
+            if metric is None or metric.kind == 'gauge':
+                continue
+            merged = _merge_samples(metric, [archive.get(name, []), samples])
+            archive[name] = [[list(key), value] for key, value in merged.items()]
+        tmp_path = f'{archive_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(archive, f)
+        os.replace(tmp_path, archive_path)
+        os.remove(path)
+
+    # --- Scrape ---
+
+    def collect(self):
+        """Suma de todos los workers (vivos y archivados) + collectors"""
+        try:
+            self.flush()
+        except OSError as e:
+            log.warning("No se pudieron volcar las métricas", error=str(e))
+
+        sources = []
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name == ARCHIVE_FILE:
+                    sources.append((None, _read_json(os.path.join(self.directory, name))))
+                elif name.startswith('metrics_') and name.endswith('.json'):
+                    pid = int(name[len('metrics_'):-len('.json')])
+                    sources.append((pid, _read_json(os.path.join(self.directory, name))))
+
+        families = []
+        for name, metric in self._metrics.items():
+            groups = []
+            for pid, data in sources:
+                if not data or name not in data:
+                    continue
+                if metric.kind == 'gauge' and (pid is None or not _process_alive(pid)):
+                    continue
+                groups.append(data[name])
+            families.append((metric, _merge_samples(metric, groups)))
+        return families
+
+    def render(self):
+        """Formato de texto de Prometheus (versión 0.0.4)"""
+        lines = []
+        for metric, values in self.collect():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for key, value in sorted(values.items()):
+                labels = dict(zip(metric.labelnames, key))
+                if metric.kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + ('+Inf',), value[:-1]):
+                        cumulative += count
+                        le = bound if bound == '+Inf' else _format_number(bound)
+                        lines.append(f'{metric.name}_bucket{_format_labels({**labels, "le": le})} {cumulative}')
+                    lines.append(f'{metric.name}_sum{_format_labels(labels)} {_format_number(value[-1])}')
+                    lines.append(f'{metric.name}_count{_format_labels(labels)} {cumulative}')
+                else:
+                    lines.append(f'{metric.name}{_format_labels(labels)} {_format_number(value)}')
+
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                log.warning("Error en collector de métricas", error=str(e))
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _merge_samples(metric, groups):
+    merged = {}
+    for samples in groups:
+        for key, value in samples:
+            key = tuple(key)
+            current = merged.get(key)
+            if current is None:
+                merged[key] = list(value) if metric.kind == 'histogram' else value
+            elif metric.kind == 'histogram':
+                merged[key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = current + value
+    return merged
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+_import_pid = os.getpid()
+registry = Registry()
+
+# --- Métricas de la aplicación ---
+
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Duración de los requests por ruta',
+    ('route', 'method', 'status'))
+DB_STATEMENTS_PER_REQUEST = registry.histogram(
+    'db_statements_per_request', 'Sentencias SQL ejecutadas por request',
+    ('route',), buckets=STATEMENT_BUCKETS)
+DB_TIME_PER_REQUEST = registry.histogram(
+    'db_time_per_request_seconds', 'Tiempo total en la base de datos por request', ('route',))
+DB_STATEMENT_DURATION = registry.histogram(
+    'db_statement_duration_seconds', 'Duración de cada sentencia SQL', ('outcome',))
+DB_POOL_WAIT = registry.histogram(
+    'db_pool_wait_seconds', 'Espera para obtener una conexión del pool', ('outcome',))
+DB_POOL_IN_USE = registry.gauge('db_pool_connections_in_use', 'Conexiones del pool en uso')
+DB_POOL_MAX = registry.gauge('db_pool_connections_max', 'Conexiones máximas del pool')
+PROVIDER_DURATION = registry.histogram(
+    'provider_request_duration_seconds', 'Llamadas a proveedores de PINes por resultado',
+    ('provider', 'outcome'))
+PROVIDER_BUSY = registry.counter(
+    'provider_busy_total', 'Compras rechazadas por proveedores sin cupo', ('game',))
+PROVIDER_UNCERTAIN = registry.counter(
+    'provider_uncertain_total', 'Llamadas sin resultado cierto (timeout de lectura o respuesta ilegible)',
+    ('provider', 'reason'))
+PURCHASES = registry.counter(
+    'purchases_total', 'Compras completadas por juego y origen del PIN', ('game', 'source'))
+
+
+# Sentencias y tiempo de base de datos del request en curso (un valor por hilo/contexto)
+_request_db = contextvars.ContextVar('request_db', default=None)
+
+
+def start_request():
+    """Iniciar la medición del request actual; devuelve el instante de inicio"""
+    registry.ensure_flusher()
+    _request_db.set([0, 0.0])
+    return time.perf_counter()
+
+
+def observe_statement(elapsed, ok=True):
+    """Registrar una sentencia SQL (llamado por Database.execute_query)"""
+    DB_STATEMENT_DURATION.observe(elapsed, outcome='ok' if ok else 'error')
+    current = _request_db.get()
+    if current is not None:
+        current[0] += 1
+        current[1] += elapsed
+
+
+def finish_request(started, route, method, status):
+    """Registrar la duración del request y sus totales de base de datos"""
+    REQUEST_DURATION.observe(time.perf_counter() - started, route=route, method=method, status=status)
+    current = _request_db.get()
+    if current is not None:
+        DB_STATEMENTS_PER_REQUEST.observe(current[0], route=route)
+        DB_TIME_PER_REQUEST.observe(current[1], route=route)
+        _request_db.set(None)
@@ -0,0 +1,50 @@
+"""
+Contexto compartido de las páginas de la tienda (dashboard y páginas de juegos).
+
+Saldo, estado del usuario y últimas transacciones se obtienen con una sola
+consulta (Database.get_page_context) y el resultado se guarda en flask.g para
+que cualquier parte del mismo request lo reutilice sin volver a la base de datos.
+Banner y catálogo no se consultan aquí: vienen de la caché compartida.
+"""
+from flask import g
+
+from database import Database
+
+
+def get_page_context(user_id, transactions_limit=0):
+    """Contexto del usuario para este request (una consulta como máximo), o None si falla la BD"""
+    cached = g.get('page_context')
+    if cached is not None and cached['user_id'] == user_id and cached['transactions_limit'] >= transactions_limit:
+        return cached
+
+    db = Database()
+    if not db.connect():
+        return None
+
+    try:
+        context = db.get_page_context(user_id, transactions_limit)
+    finally:
+        db.disconnect()
+
+    if context is None:
+        return None
+
+    context['user_id'] = user_id
+    context['transactions_limit'] = transactions_limit
+    g.page_context = context
+    return context
+
+
+def split_transactions(transactions, credits_limit=5):
+    """Separar en una pasada los créditos del admin y el historial visible del usuario"""
+    credits = []
+    history = []
+    for transaction in transactions:
+        pin = transaction.get('pin')
+        transaction_id = transaction.get('transaction_id') or ''
+        if pin == 'ADMIN' and transaction_id.startswith('CR') and transaction['amount'] > 0:
+            if len(credits) < credits_limit:
+                credits.append(transaction)
+        elif pin != 'ADMIN' and pin != 'PIN' and 'BALANCE' not in transaction_id:
+            history.append(transaction)
+    return credits, history
@@ -0,0 +1,276 @@
+"""
+Perfilado bajo demanda de workers en producción (solo admin).
+
+CPU: un hilo toma muestras de las pilas de todos los hilos del worker
+(sys._current_frames) cada PROFILER_INTERVAL segundos durante N segundos y
+devuelve el perfil en formato de pilas colapsadas ("hilo;a.py:f;b.py:g 42"),
+compatible con flamegraph.pl y speedscope.
+
+Memoria: tracemalloc se activa en el worker, cada snapshot se compara con el
+anterior y devuelve las líneas que más memoria ganaron desde entonces.
+
+El request del admin cae en cualquier worker. Para perfilar otro, el pedido se
+deja como archivo en PROFILER_DIR/<pid>/ y el hilo vigía de ese worker lo
+ejecuta y escribe el resultado en PROFILER_DIR/results/. Los workers arrancan
+su vigía en post_fork (gunicorn.conf.py) y lo usan también como latido para
+listar los workers disponibles.
+
+Configuración:
+    PROFILER_DIR            directorio de pedidos y resultados (/dev/shm/inefable_profiler)
+    PROFILER_INTERVAL       segundos entre muestras de CPU (0.005)
+    PROFILER_MAX_SECONDS    duración máxima de un perfil de CPU (60)
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+from app_logging import get_logger
+
+log = get_logger('profiler')
+
+PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', '0.005'))
+PROFILER_MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', '60'))
+# Cada cuánto revisa el vigía si hay pedidos (y renueva su latido)
+WATCH_INTERVAL = 0.5
+HEARTBEAT_MAX_AGE = 5
+
+
+def default_profiler_dir():
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'inefable_profiler')
+
+
+PROFILER_DIR = os.getenv('PROFILER_DIR') or default_profiler_dir()
+RESULTS_DIR = os.path.join(PROFILER_DIR, 'results')
+
+
+class ProfilerError(Exception):
+    """Pedido de perfilado inválido o worker que no respondió a tiempo"""
+
+
+# --- CPU ---
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_stacks(seconds, interval=PROFILER_INTERVAL, exclude=()):
+    """Pilas colapsadas de todos los hilos del proceso durante seconds; {pila: muestras}"""
+    seconds = min(float(seconds), PROFILER_MAX_SECONDS)
+    exclude = set(exclude) | {threading.get_ident()}
+    names = {}
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in exclude:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if thread_id not in names:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            stack.append(names.get(thread_id, str(thread_id)))
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+def collapsed(counts):
+    """Texto de pilas colapsadas, de la más frecuente a la menos"""
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+# --- Memoria ---
+
+_baseline = None
+_memory_lock = threading.Lock()
+
+
+def memory_command(action, limit=25, frames=10):
+    global _baseline
+    with _memory_lock:
+        if action == 'start':
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            _baseline = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            return {'tracing': True, 'traced_memory': {'current': current, 'peak': peak}}
+
+        if action == 'stop':
+            tracemalloc.stop()
+            _baseline = None
+            return {'tracing': False}
+
+        if action != 'snapshot':
+            raise ProfilerError(f"Acción de memoria desconocida: {action}")
+        if not tracemalloc.is_tracing():
+            raise ProfilerError("tracemalloc no está activo en este worker (usa action=start)")
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        differences = snapshot.compare_to(_baseline, 'lineno') if _baseline else snapshot.statistics('lineno')
+        _baseline = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'tracing': True,
+            'traced_memory': {'current': current, 'peak': peak},
+            'top': [{
+                'location': str(stat.traceback[0]),
+                'size': stat.size,
+                'size_diff': getattr(stat, 'size_diff', stat.size),
+                'count': stat.count,
+                'count_diff': getattr(stat, 'count_diff', stat.count),
+            } for stat in differences[:limit]]
+        }
+
+
+def execute(command, exclude=()):
+    """Ejecutar un pedido en este proceso; devuelve texto (cpu) o dict (memory)"""
+    kind = command.get('kind')
+    if kind == 'cpu':
+        interval = max(float(command.get('interval') or PROFILER_INTERVAL), 0.001)
+        return collapsed(sample_stacks(command.get('seconds', 10), interval, exclude))
+    if kind == 'memory':
+        return memory_command(command.get('action', 'snapshot'), int(command.get('limit', 25)))
+    raise ProfilerError(f"Tipo de perfil desconocido: {kind}")
+
+
+# --- Pedidos entre workers ---
+
+def _worker_dir(pid):
+    return os.path.join(PROFILER_DIR, str(pid))
+
+
+def _write_json(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def run(command, pid=None):
+    """Ejecutar el pedido en el worker pid (este si es None) y esperar su resultado"""
+    if pid is None or int(pid) == os.getpid():
+        # El hilo del request del admin no aparece en su propio perfil
+        return execute(command, exclude=(threading.get_ident(),))
+
+    pid = int(pid)
+    if pid not in list_workers():
+        raise ProfilerError(f"El worker {pid} no existe o no tiene el vigía activo")
+
+    request_id = uuid.uuid4().hex
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    _write_json(os.path.join(_worker_dir(pid), f'{request_id}.request'), command)
+
+    result_path = os.path.join(RESULTS_DIR, f'{request_id}.json')
+    deadline = time.monotonic() + float(command.get('seconds') or 0) + 10
+    while time.monotonic() < deadline:
+        if os.path.exists(result_path):
+            with open(result_path, 'r', encoding='utf-8') as f:
+                response = json.load(f)
+            os.remove(result_path)
+            if 'error' in response:
+                raise ProfilerError(response['error'])
+            return response['result']
+        time.sleep(0.1)
+    raise ProfilerError(f"El worker {pid} no respondió a tiempo")
+
+
+def list_workers():
+    """pids con vigía activo (latido reciente); borra los directorios de workers muertos"""
+    workers = []
+    if not os.path.isdir(PROFILER_DIR):
+        return workers
+    now = time.time()
+    for name in os.listdir(PROFILER_DIR):
+        if not name.isdigit():
+            continue
+        try:
+            heartbeat = os.path.getmtime(os.path.join(PROFILER_DIR, name, 'alive'))
+        except OSError:
+            heartbeat = 0
+        if now - heartbeat <= HEARTBEAT_MAX_AGE:
+            workers.append(int(name))
+        elif now - heartbeat > HEARTBEAT_MAX_AGE * 12:
+            shutil.rmtree(os.path.join(PROFILER_DIR, name), ignore_errors=True)
+    return sorted(workers)
+
+
+def forget_worker(pid):
+    """Borrar el directorio de un worker terminado (child_exit en el master)"""
+    shutil.rmtree(_worker_dir(pid), ignore_errors=True)
+
+
+class _Watcher(threading.Thread):
+    """Atiende los pedidos de este worker; cada perfil corre en su propio hilo para que el latido siga"""
+
+    def __init__(self):
+        super().__init__(name='profiler-watcher', daemon=True)
+        self.pid = os.getpid()
+        self.directory = _worker_dir(self.pid)
+        self._job = None
+
+    def run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        alive = os.path.join(self.directory, 'alive')
+        while True:
+            try:
+                with open(alive, 'w') as f:
+                    f.write(str(time.time()))
+                # Un pedido a la vez; los demás esperan su turno en el directorio
+                if self._job is None or not self._job.is_alive():
+                    pending = sorted(name for name in os.listdir(self.directory) if name.endswith('.request'))
+                    if pending:
+                        self._start(pending[0])
+            except (OSError, ValueError) as e:
+                log.warning("Error en el vigía del profiler", error=str(e))
+            time.sleep(WATCH_INTERVAL)
+
+    def _start(self, name):
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                command = json.load(f)
+        finally:
+            os.remove(path)
+        request_id = name[:-len('.request')]
+        self._job = threading.Thread(target=self._handle, args=(request_id, command),
+                                     name='profiler-request', daemon=True)
+        self._job.start()
+
+    def _handle(self, request_id, command):
+        log.info("Perfilando worker a pedido", kind=command.get('kind'), seconds=command.get('seconds'))
+        try:
+            # El vigía y este hilo no aparecen en el perfil
+            response = {'result': execute(command, exclude=(self.ident, threading.get_ident()))}
+        except Exception as e:
+            response = {'error': str(e)}
+        try:
+            _write_json(os.path.join(RESULTS_DIR, f'{request_id}.json'), response)
+        except OSError as e:
+            log.warning("No se pudo escribir el resultado del profiler", error=str(e))
+
+
+_watcher = None
+
+
+def start_watcher():
+    """Iniciar el vigía del proceso actual (llamar después del fork de cada worker)"""
+    global _watcher
+    if _watcher is None or _watcher.pid != os.getpid() or not _watcher.is_alive():
+        _watcher = _Watcher()
+        _watcher.start()
+    return _watcher
@@ -0,0 +1,103 @@
+"""
+Interpretación de las respuestas de los proveedores de PINes.
+
+Las respuestas llegan como JSON limpio, JSON precedido de warnings PHP o solo
+HTML con el PIN en el mensaje. Se recorren una sola vez: se ubica el primer
+'{' y se decodifica el objeto desde ahí (sin copiar el resto del texto); si no
+hay JSON válido (p. ej. un warning PHP con llaves antes del JSON) se busca el
+PIN en el HTML con un patrón precompilado.
+"""
+import json
+import re
+from dataclasses import dataclass
+
+PIN_PATTERN = re.compile(r'<b>Pin:</b>\s*([A-Z0-9]+)', re.IGNORECASE)
+
+SUCCESS_ALERTS = frozenset(('VERDE', 'GREEN'))
+
+PIN_MIN_LENGTH = 4
+PIN_MAX_LENGTH = 20
+
+# Largo máximo del extracto de respuesta que se guarda en los errores (para logs)
+PREVIEW_LENGTH = 200
+
+_decoder = json.JSONDecoder()
+
+
+@dataclass(frozen=True)
+class PinResult:
+    """PIN entregado por el proveedor"""
+    pin_code: str
+    alert: str = ''
+    message: str = ''
+
+
+@dataclass(frozen=True)
+class ProviderError:
+    """Respuesta sin PIN utilizable.
+
+    kind: 'empty' (sin cuerpo), 'unparseable' (ni JSON ni PIN en HTML),
+    'rejected' (el proveedor respondió con un ALERTA distinto de VERDE),
+    'missing_pin' (ALERTA de éxito sin PIN: la compra pudo cobrarse) o
+    'invalid_pin' (PIN con formato inválido).
+    """
+    kind: str
+    message: str = ''
+    alert: str = ''
+    preview: str = ''
+
+
+def _field(data, *keys):
+    for key in keys:
+        value = data.get(key)
+        if value:
+            return value
+    return ''
+
+
+def _validate_pin(pin_code, alert, message, preview):
+    pin_code = pin_code.strip().upper()
+    if PIN_MIN_LENGTH <= len(pin_code) <= PIN_MAX_LENGTH:
+        return PinResult(pin_code=pin_code, alert=alert, message=message)
+    return ProviderError('invalid_pin', f'PIN con formato inválido ({len(pin_code)} caracteres)', alert, preview)
+
+
+def _from_json(data, preview):
+    alert = str(_field(data, 'ALERTA', 'alerta')).upper()
+    message = str(_field(data, 'MENSAJE', 'mensaje'))
+    pin_code = _field(data, 'PIN', 'pin')
+
+    if not pin_code and message:
+        match = PIN_PATTERN.search(message)
+        if match:
+            pin_code = match.group(1)
+
+    if alert not in SUCCESS_ALERTS:
+        return ProviderError('rejected', message or 'Error desconocido', alert, preview)
+    if not pin_code:
+        return ProviderError('missing_pin', message or 'Respuesta exitosa sin PIN', alert, preview)
+
+    return _validate_pin(str(pin_code), alert, message, preview)
+
+
+def parse_provider_response(text):
+    """Interpretar el cuerpo de una respuesta; devuelve PinResult o ProviderError"""
+    if not text or text.isspace():
+        return ProviderError('empty', 'Respuesta vacía del proveedor')
+
+    preview = text[:PREVIEW_LENGTH]
+
+    json_start = text.find('{')
+    if json_start != -1:
+        try:
+            data, _ = _decoder.raw_decode(text, json_start)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            return _from_json(data, preview)
+
+    match = PIN_PATTERN.search(text)
+    if match:
+        return _validate_pin(match.group(1), '', '', preview)
+
+    return ProviderError('unparseable', 'La respuesta no contiene JSON ni PIN', '', preview)
@@ -0,0 +1,520 @@
+"""
+Enrutamiento de compras de PINes entre varios proveedores externos.
+
+Cada juego/opción puede tener varios proveedores configurados con su costo.
+El router mantiene estadísticas móviles de latencia y tasa de éxito por
+proveedor, elige el mejor para cada solicitud y, si falla, pasa al siguiente
+de inmediato (sin esperas entre intentos).
+
+Solo se pasa al siguiente cuando es seguro que el proveedor no emitió un PIN:
+no se pudo conectar, respondió 429/503 o rechazó la compra explícitamente.
+Si la solicitud ya llegó y no hay respuesta cierta (timeout de lectura,
+conexión cortada, error HTTP o respuesta ilegible) el proveedor pudo haber
+emitido y cobrado el PIN: se detiene y se lanza ProviderOutcomeUnknown para
+que la compra quede registrada para revisión, en lugar de comprar dos veces.
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError
+
+import metrics
+from app_logging import get_logger
+from tracing import span
+
+log = get_logger('providers')
+
+# Ventana de observaciones usada para las estadísticas móviles
+STATS_WINDOW = int(os.getenv('PROVIDER_STATS_WINDOW', '50'))
+
+# Segundos de latencia equivalentes a 1 USD de costo al comparar proveedores
+COST_WEIGHT = float(os.getenv('PROVIDER_COST_WEIGHT', '10'))
+
+# Segundos de penalización por cada fallo (un fallo obliga a pasar al siguiente proveedor)
+FAILURE_PENALTY = float(os.getenv('PROVIDER_FAILURE_PENALTY', '5'))
+
+# Límite por defecto de llamadas simultáneas a un proveedor entre todos los workers
+DEFAULT_MAX_CONCURRENT = int(os.getenv('PROVIDER_MAX_CONCURRENT', '2'))
+
+# Segundos que una compra espera un cupo libre antes de responder "ocupado"
+DEFAULT_QUEUE_TIMEOUT = float(os.getenv('PROVIDER_QUEUE_TIMEOUT', '2'))
+
+# Las observaciones más viejas que esto se descartan, así un proveedor caído vuelve a probarse
+STATS_MAX_AGE = float(os.getenv('PROVIDER_STATS_MAX_AGE', '300'))
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (compatible; InefableStore/1.0)',
+    'Accept': '*/*',
+    'Cache-Control': 'no-cache'
+}
+
+# Configuración por defecto: el proveedor histórico de Free Fire Latam
+DEFAULT_PROVIDERS = {
+    'freefire_latam': [
+        {
+            'name': 'inefableshop',
+            'url': 'https://inefableshop.net/conexion_api/api.php',
+            'user_env': 'FREEFIRE_LATAM_USER',
+            'password_env': 'FREEFIRE_LATAM_PASSWORD',
+            'tipo': 'recargaPinFreefirebs',
+            'timeout': 30,
+            'options': [1, 2, 3, 4, 5, 6, 7, 8, 9],
+            'costs': {}
+        }
+    ]
+}
+
+
+# Estados HTTP con los que el proveedor rechaza la solicitud sin procesarla
+RETRYABLE_STATUS = frozenset((429, 503))
+
+
+class ProviderBusyError(Exception):
+    """Todos los proveedores disponibles están al límite de llamadas simultáneas"""
+
+
+class AmbiguousResponse(Exception):
+    """Lanzada por parse_response: la respuesta no confirma ni descarta que se emitió un PIN"""
+
+
+class ProviderOutcomeUnknown(Exception):
+    """El proveedor pudo haber emitido (y cobrado) un PIN que no recibimos: no se prueba otro"""
+
+    def __init__(self, provider, reason):
+        super().__init__(f"{provider}: {reason}")
+        self.provider = provider
+        self.reason = reason
+
+
+def _failover_safe(error):
+    """True si el error ocurrió antes de que el proveedor recibiera la solicitud (o la rechazó)"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        # "Connection aborted": la solicitud ya se envió y la conexión se cortó esperando la respuesta
+        return not any(isinstance(arg, ProtocolError) for arg in error.args)
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code in RETRYABLE_STATUS
+    return False
+
+
+class Bulkhead:
+    """Límite entre workers de las llamadas simultáneas a un proveedor.
+
+    Se crea al importar la app; con preload_app (gunicorn.conf.py) eso ocurre en
+    el master y los workers heredan la misma memoria compartida. Sin preload
+    cada worker tendría su propio límite.
+
+    Cada cupo tomado guarda el pid del worker que lo tiene (tomarlo y anotarlo es
+    una sola operación bajo el lock), así los cupos de un worker que murió sin
+    devolverlos (SIGKILL, timeout de gunicorn) se recuperan con reclaim(pid).
+    """
+
+    def __init__(self, limit, queue_timeout):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        # pid del worker por cupo tomado; 0 = libre
+        self._holders = multiprocessing.Array('i', max(limit, 1))
+        self._freed = multiprocessing.Condition(self._holders.get_lock())
+        self._waiting = multiprocessing.Value('i', 0)
+        self._rejected = multiprocessing.Value('i', 0)
+
+    def _take(self):
+        """Con el lock tomado: ocupar un cupo libre a nombre de este proceso"""
+        for slot in range(self.limit):
+            if self._holders[slot] == 0:
+                self._holders[slot] = os.getpid()
+                return True
+        return False
+
+    def acquire(self, timeout=None):
+        """Tomar un cupo; timeout=0 no espera. Devuelve False si no hubo cupo a tiempo"""
+        with self._freed:
+            if self._take():
+                return True
+            if not timeout:
+                return False
+            with self._waiting.get_lock():
+                self._waiting.value += 1
+            try:
+                return self._freed.wait_for(self._take, timeout)
+            finally:
+                with self._waiting.get_lock():
+                    self._waiting.value -= 1
+
+    def release(self):
+        pid = os.getpid()
+        with self._freed:
+            for slot in range(self.limit):
+                if self._holders[slot] == pid:
+                    self._holders[slot] = 0
+                    self._freed.notify()
+                    return
+
+    def reclaim(self, pid):
+        """Liberar los cupos de un worker que terminó sin devolverlos; devuelve cuántos"""
+        reclaimed = 0
+        with self._freed:
+            for slot in range(self.limit):
+                if self._holders[slot] == pid:
+                    self._holders[slot] = 0
+                    reclaimed += 1
+            if reclaimed:
+                self._freed.notify_all()
+        return reclaimed
+
+    def reject(self):
+        with self._rejected.get_lock():
+            self._rejected.value += 1
+
+    def snapshot(self):
+        return {
+            'limit': self.limit,
+            'in_flight': sum(1 for pid in self._holders[:self.limit] if pid),
+            'waiting': self._waiting.value,
+            'rejected': self._rejected.value
+        }
+
+
+class ProviderStats:
+    """Estadísticas móviles de latencia y éxito de un proveedor"""
+
+    def __init__(self, window=STATS_WINDOW, max_age=STATS_MAX_AGE):
+        self._samples = deque(maxlen=window)
+        self._max_age = max_age
+        self._lock = threading.Lock()
+
+    def record(self, latency, success):
+        with self._lock:
+            self._samples.append((time.monotonic(), latency, bool(success)))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self._max_age
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return list(self._samples)
+
+    def summary(self):
+        """(muestras, tasa de éxito, latencia media); sin historial devuelve (0, 1.0, 0.0)"""
+        samples = self._recent()
+        if not samples:
+            return 0, 1.0, 0.0
+        successes = sum(1 for _, _, ok in samples if ok)
+        latency = sum(latency for _, latency, _ in samples) / len(samples)
+        return len(samples), successes / len(samples), latency
+
+    def snapshot(self):
+        count, success_rate, latency = self.summary()
+        return {
+            'samples': count,
+            'success_rate': round(success_rate, 3),
+            'avg_latency': round(latency, 3)
+        }
+
+
+class Provider:
+    """Proveedor HTTP compatible con la API conexion_api/api.php"""
+
+    def __init__(self, name, url, tipo, user=None, password=None, timeout=30,
+                 options=None, costs=None, max_concurrent=DEFAULT_MAX_CONCURRENT,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT, warm_url=None):
+        self.name = name
+        self.url = url
+        # El precalentamiento no toca el endpoint de compras: la raíz del mismo host usa el mismo pool
+        self.warm_url = warm_url or urlunsplit(urlsplit(url)[:2] + ('/', '', ''))
+        self.tipo = tipo
+        self.user = user
+        self.password = password
+        self.timeout = float(timeout)
+        self.options = set(int(o) for o in options) if options else None
+        self.costs = {str(k): float(v) for k, v in (costs or {}).items()}
+        self.stats = ProviderStats()
+        self.bulkhead = Bulkhead(int(max_concurrent), float(queue_timeout))
+        self._local = threading.local()
+        self._adapter = None
+        self._adapter_pid = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Crear proveedor desde un dict de configuración (credenciales por variable de entorno)"""
+        user = config.get('user')
+        password = config.get('password')
+        if config.get('user_env'):
+            user = os.getenv(config['user_env'])
+        if config.get('password_env'):
+            password = os.getenv(config['password_env'])
+
+        return cls(
+            name=config['name'],
+            url=config['url'],
+            tipo=config.get('tipo', 'recargaPinFreefirebs'),
+            user=user,
+            password=password,
+            timeout=config.get('timeout', 30),
+            options=config.get('options'),
+            costs=config.get('costs'),
+            max_concurrent=config.get('max_concurrent', DEFAULT_MAX_CONCURRENT),
+            queue_timeout=config.get('queue_timeout', DEFAULT_QUEUE_TIMEOUT),
+            warm_url=config.get('warm_url')
+        )
+
+    def _process_adapter(self):
+        """Pool de conexiones HTTP del worker, compartido por las sesiones de todos sus hilos.
+
+        Así una conexión TLS abierta en el precalentamiento (o por otro hilo) se reutiliza.
+        Se crea por proceso: las conexiones no se heredan a través del fork.
+        """
+        if self._adapter is None or self._adapter_pid != os.getpid():
+            self._adapter = HTTPAdapter(pool_maxsize=max(self.bulkhead.limit, 1))
+            self._adapter_pid = os.getpid()
+        return self._adapter
+
+    @property
+    def session(self):
+        """Sesión HTTP por hilo (keep-alive) para workers con varios hilos"""
+        session = getattr(self._local, 'session', None)
+        if session is None or getattr(self._local, 'pid', None) != os.getpid():
+            session = requests.Session()
+            session.headers.update(DEFAULT_HEADERS)
+            adapter = self._process_adapter()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._local.session = session
+            self._local.pid = os.getpid()
+        return session
+
+    def warm(self, timeout=5):
+        """Abrir la conexión (DNS + TCP + TLS) sin hacer una compra; queda en el pool para reutilizarse.
+
+        Pide warm_url (la raíz del host por defecto), nunca el endpoint de compras:
+        la API no documenta qué hace con un HEAD. Una redirección no se sigue, iría a otro pool.
+        """
+        response = self.session.head(self.warm_url, timeout=min(self.timeout, timeout), allow_redirects=False)
+        return response.status_code
+
+    @property
+    def configured(self):
+        return bool(self.user and self.password)
+
+    def supports(self, option_value):
+        return self.options is None or int(option_value) in self.options
+
+    def cost(self, option_value):
+        return self.costs.get(str(option_value), 0.0)
+
+    def score(self, option_value):
+        """Puntaje (menor es mejor): latencia + penalización por fallos + costo ponderado.
+
+        Un proveedor sin historial reciente puntúa solo por costo, así se prueba pronto.
+        """
+        _, success_rate, latency = self.stats.summary()
+        return latency + (1 - success_rate) * FAILURE_PENALTY + self.cost(option_value) * COST_WEIGHT
+
+    def request_pin(self, option_value):
+        """Hacer una única solicitud al proveedor y devolver el texto de la respuesta"""
+        params = {
+            'action': 'recarga',
+            'usuario': self.user,
+            'clave': self.password,
+            'tipo': self.tipo,
+            'monto': str(option_value),
+            'numero': '0'
+        }
+        response = self.session.get(self.url, params=params, timeout=self.timeout, allow_redirects=True)
+        response.raise_for_status()
+        return response.text.strip()
+
+
+class ProviderRouter:
+    """Selecciona el mejor proveedor por solicitud y hace failover inmediato"""
+
+    def __init__(self, providers_by_game):
+        self.providers = providers_by_game
+
+    @classmethod
+    def from_config(cls, config):
+        return cls({
+            game_type: [Provider.from_config(p) for p in providers]
+            for game_type, providers in config.items()
+        })
+
+    def candidates(self, game_type, option_value):
+        """Proveedores configurados para la opción, ordenados del mejor al peor"""
+        providers = [
+            p for p in self.providers.get(game_type, [])
+            if p.configured and p.supports(option_value)
+        ]
+        return sorted(providers, key=lambda p: p.score(option_value))
+
+    def purchase(self, game_type, option_value, parse_response):
+        """Comprar un PIN probando los proveedores en orden; parse_response(texto, opción) -> dict o None.
+
+        parse_response devuelve None si el proveedor rechazó la compra (se prueba el
+        siguiente) y lanza AmbiguousResponse si la respuesta no se puede interpretar.
+        Los proveedores sin cupo se saltan; si ninguno tuvo cupo se espera al mejor
+        hasta su queue_timeout y, si sigue lleno, se lanza ProviderBusyError. Si un
+        proveedor pudo haber emitido el PIN sin entregarlo se lanza ProviderOutcomeUnknown.
+        """
+        candidates = self.candidates(game_type, option_value)
+        if not candidates:
+            log.error("Sin proveedores configurados", game_type=game_type, option=option_value)
+            return None
+
+        busy = []
+        attempted = False
+        for provider in candidates:
+            if not provider.bulkhead.acquire(timeout=0):
+                busy.append(provider)
+                continue
+            attempted = True
+            result = self._attempt(provider, option_value, parse_response)
+            if result:
+                return result
+
+        if not attempted:
+            provider = busy[0]
+            with span('provider.queue_wait', provider=provider.name):
+                acquired = provider.bulkhead.acquire(timeout=provider.bulkhead.queue_timeout)
+            if not acquired:
+                provider.bulkhead.reject()
+                metrics.PROVIDER_BUSY.inc(game=game_type)
+                log.warning("Proveedores ocupados", game_type=game_type, option=option_value)
+                raise ProviderBusyError(game_type)
+            result = self._attempt(provider, option_value, parse_response)
+            if result:
+                return result
+
+        log.error("Ningún proveedor entregó PIN", game_type=game_type, option=option_value)
+        return None
+
+    def _attempt(self, provider, option_value, parse_response):
+        """Una llamada al proveedor con el cupo ya tomado; lo libera al terminar"""
+        started = time.monotonic()
+        uncertain = None
+        with span('provider.attempt', provider=provider.name, option=option_value) as current:
+            try:
+                response_text = provider.request_pin(option_value)
+                if not response_text:
+                    raise AmbiguousResponse('respuesta vacía')
+                result = parse_response(response_text, option_value)
+            except AmbiguousResponse as e:
+                response_text = result = None
+                uncertain = f"respuesta ilegible: {e}"
+            except requests.exceptions.RequestException as e:
+                log.warning("Proveedor falló", provider=provider.name, error=type(e).__name__)
+                response_text = result = None
+                if not _failover_safe(e):
+                    uncertain = type(e).__name__
+            finally:
+                provider.bulkhead.release()
+
+            elapsed = time.monotonic() - started
+            outcome = 'success' if result else 'uncertain' if uncertain else 'empty' if response_text else 'error'
+            if current is not None:
+                current['outcome'] = outcome
+
+        provider.stats.record(elapsed, result is not None)
+        metrics.PROVIDER_DURATION.observe(elapsed, provider=provider.name, outcome=outcome)
+        if uncertain:
+            metrics.PROVIDER_UNCERTAIN.inc(provider=provider.name, reason=uncertain.split(':')[0])
+            log.error("Resultado incierto del proveedor: no se prueba otro para no comprar dos veces",
+                      provider=provider.name, option=option_value, reason=uncertain)
+            raise ProviderOutcomeUnknown(provider.name, uncertain)
+        if result:
+            result['provider'] = provider.name
+            log.info("PIN obtenido", provider=provider.name, option=option_value,
+                     elapsed_ms=round(elapsed * 1000, 1))
+            return result
+
+        log.info("Proveedor sin PIN", provider=provider.name, option=option_value)
+        return None
+
+    def warm(self, timeout=5):
+        """Precalentar la conexión de cada proveedor configurado; {nombre: status o error}"""
+        results = {}
+        for providers in self.providers.values():
+            for provider in providers:
+                if provider.name in results or not provider.configured:
+                    continue
+                try:
+                    results[provider.name] = provider.warm(timeout)
+                except requests.exceptions.RequestException as e:
+                    results[provider.name] = type(e).__name__
+        return results
+
+    def snapshot(self):
+        return {
+            game_type: [
+                {
+                    'name': p.name,
+                    'configured': p.configured,
+                    **p.stats.snapshot(),
+                    'bulkhead': p.bulkhead.snapshot()
+                }
+                for p in providers
+            ]
+            for game_type, providers in self.providers.items()
+        }
+
+
+def load_providers_config():
+    """Leer la configuración de proveedores desde PROVIDERS_CONFIG (JSON) o usar la de por defecto"""
+    config_path = os.getenv('PROVIDERS_CONFIG')
+    if not config_path:
+        return DEFAULT_PROVIDERS
+
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def purchase_deadline(config=None):
+    """Segundos que puede tardar router.purchase en el peor caso, para el juego más lento.
+
+    Espera de cupo, un timeout de conexión por cada proveedor que se salta y en el
+    último conexión más lectura (requests aplica el timeout a cada fase).
+    """
+    deadlines = []
+    for providers in (config or load_providers_config()).values():
+        if not providers:
+            continue
+        timeouts = [p.get('timeout', 30) for p in providers]
+        queue_timeout = max(p.get('queue_timeout', DEFAULT_QUEUE_TIMEOUT) for p in providers)
+        deadlines.append(queue_timeout + sum(timeouts) + max(timeouts))
+    return max(deadlines, default=0.0)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def reclaim_permits(pid):
+    """En el master (child_exit): devolver los cupos de proveedores que un worker muerto retenía"""
+    if _router is None:
+        return 0
+    reclaimed = 0
+    for providers in _router.providers.values():
+        for provider in providers:
+            count = provider.bulkhead.reclaim(pid)
+            if count:
+                log.warning("Cupos de proveedor recuperados de un worker terminado",
+                            provider=provider.name, pid=pid, permits=count)
+            reclaimed += count
+    return reclaimed
+
+
+def get_router():
+    """Router compartido por el proceso (las estadísticas viven mientras viva el worker)"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ProviderRouter.from_config(load_providers_config())
+    return _router
@@ -0,0 +1,159 @@
+"""
+Presupuesto de idas y vueltas a Postgres por ruta.
+
+Cada sentencia y cada commit que pasa por Database.execute_query se cuenta
+en el request actual. Las rutas declaran su presupuesto con @budget:
+
+    @app.route('/dashboard')
+    @login_required
+    @query_budget.budget(statements=2)
+    def dashboard(): ...
+
+Al terminar el request se compara lo usado con lo declarado:
+
+- Siempre: si se excede se registra una advertencia y db_budget_exceeded_total{route}.
+- QUERY_BUDGET_STRICT=true (tests/CI): exceder el presupuesto lanza
+  QueryBudgetExceeded; con app.testing el test de la ruta falla con el detalle
+  (sin testing la respuesta es un 500).
+- QUERY_BUDGET_HEADER=true (staging): la respuesta lleva X-DB-Statements y
+  X-DB-Commits para ver el costo de cada request desde el navegador o curl.
+
+El DDL bajo demanda de la primera vez (Database.ensure_table) no cuenta: los
+presupuestos describen el costo de un worker ya caliente. Cada presupuesto es
+el tope de lo que la ruta hace hoy, con el detalle junto al decorador (y lo que
+supera el objetivo de la ruta, p. ej. el diario de compras en las compras).
+Bajarlo cuando la ruta haga menos. tests/test_query_budgets.py corre las rutas
+en modo estricto con un cursor simulado y falla si alguna supera su presupuesto.
+
+Para medir código fuera de un request (p. ej. un método de Database en un test):
+
+    with query_budget.counting() as counts:
+        db.insert_transaction(...)
+    assert counts.statements <= 2
+"""
+import contextvars
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import metrics
+from app_logging import get_logger
+
+log = get_logger('query_budget')
+
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'false').lower() == 'true'
+QUERY_BUDGET_HEADER = os.getenv('QUERY_BUDGET_HEADER', 'false').lower() == 'true'
+STATEMENTS_HEADER = 'X-DB-Statements'
+COMMITS_HEADER = 'X-DB-Commits'
+
+BUDGET_EXCEEDED = metrics.registry.counter(
+    'db_budget_exceeded_total', 'Requests que superaron el presupuesto de sentencias o commits', ('route',))
+
+
+class QueryBudgetExceeded(Exception):
+    """Una ruta hizo más sentencias o commits que su presupuesto (solo en modo estricto)"""
+
+
+@dataclass
+class Budget:
+    statements: int
+    commits: int = None
+
+    def exceeded(self, counts):
+        """Descripción de lo que se excedió, o None"""
+        problems = []
+        if counts.statements > self.statements:
+            problems.append(f"{counts.statements} sentencias (presupuesto {self.statements})")
+        if self.commits is not None and counts.commits > self.commits:
+            problems.append(f"{counts.commits} commits (presupuesto {self.commits})")
+        return ', '.join(problems) or None
+
+
+@dataclass
+class Counts:
+    statements: int = 0
+    commits: int = 0
+    exempt: bool = False
+
+
+_counts = contextvars.ContextVar('query_budget_counts', default=None)
+
+
+def budget(statements, commits=None):
+    """Declarar el presupuesto de la ruta; commits=None usa el mismo que sentencias"""
+    def decorator(f):
+        f.query_budget = Budget(statements, statements if commits is None else commits)
+        return f
+    return decorator
+
+
+def observe_statement():
+    """Llamado por Database.execute_query antes de ejecutar cada sentencia"""
+    counts = _counts.get()
+    if counts is not None and not counts.exempt:
+        counts.statements += 1
+
+
+def observe_commit():
+    counts = _counts.get()
+    if counts is not None and not counts.exempt:
+        counts.commits += 1
+
+
+@contextmanager
+def exempt():
+    """Sentencias que no cuentan para el presupuesto (DDL de la primera vez)"""
+    counts = _counts.get()
+    if counts is None or counts.exempt:
+        yield
+        return
+    counts.exempt = True
+    try:
+        yield
+    finally:
+        counts.exempt = False
+
+
+@contextmanager
+def counting():
+    """Contar sentencias y commits dentro del bloque; devuelve el Counts"""
+    counts = Counts()
+    token = _counts.set(counts)
+    try:
+        yield counts
+    finally:
+        _counts.reset(token)
+
+
+def install(app):
+    """Contar por request, comparar con el presupuesto de la ruta y, si corresponde, agregar los headers"""
+    from flask import request
+
+    @app.before_request
+    def start_query_budget():
+        _counts.set(Counts())
+
+    @app.after_request
+    def check_query_budget(response):
+        counts = _counts.get()
+        if counts is None:
+            return response
+        _counts.set(None)
+
+        if QUERY_BUDGET_HEADER:
+            response.headers[STATEMENTS_HEADER] = str(counts.statements)
+            response.headers[COMMITS_HEADER] = str(counts.commits)
+
+        view = app.view_functions.get(request.endpoint)
+        route_budget = getattr(view, 'query_budget', None)
+        problem = route_budget.exceeded(counts) if route_budget else None
+        if problem is None:
+            return response
+
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        BUDGET_EXCEEDED.inc(route=route)
+        log.warning("Ruta sobre su presupuesto de base de datos", route=route, method=request.method,
+                    status=response.status_code, detail=problem)
+        if QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(f"{request.method} {route}: {problem}")
+        return response
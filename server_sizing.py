@@ -0,0 +1,198 @@
+"""
+Dimensionamiento de gunicorn según los recursos reales del contenedor.
+
+Calcula workers, hilos por worker y tamaño del pool de Postgres por worker a
+partir de:
+
+- CPU disponible: cuota de cgroup (v2 cpu.max o v1 cfs_quota_us) y afinidad,
+  no los núcleos del host que reporta os.cpu_count().
+- Memoria disponible: límite de cgroup (memory.max / memory.limit_in_bytes)
+  o la memoria física si no hay límite.
+- Presupuesto de conexiones a Postgres de esta instancia (DB_CONNECTION_BUDGET).
+
+Conexiones que se cuentan:
+- Por worker, su pool más una dedicada: la que abre al salir para marcar las
+  compras interrumpidas (checkout.interrupt_in_flight) mientras el pool puede
+  seguir ocupado por los requests que no terminaron.
+- Por nodo, el LISTEN de invalidaciones de caché (un solo worker escucha).
+- El hilo checkout-monitor, el precalentamiento y el cierre de compras usan
+  el pool del worker: compiten con los requests pero no suman conexiones.
+- El master no abre conexiones: con preload_app solo importa la app y el pool
+  se crea perezosamente en cada proceso (database.get_pool).
+No se cuenta el solapamiento de un reload (HUP): los workers nuevos arrancan
+antes de que terminen los viejos.
+
+    workers = min(2 * CPU + 1, memoria útil / memoria por worker, (presupuesto - 1) / (hilos + 1))
+    pool    = min(hilos, (presupuesto - 1) / workers - 1)
+    hilos   = pool (cada request retiene una conexión casi toda su vida)
+
+Cualquier valor se puede fijar a mano: WEB_CONCURRENCY o GUNICORN_WORKERS,
+GUNICORN_THREADS y DB_POOL_MAX_CONNECTIONS.
+
+graceful_timeout() deriva de la configuración de proveedores el tiempo que un
+worker que se apaga necesita para terminar una compra en curso.
+
+    python server_sizing.py      # muestra lo que se elegiría en esta máquina
+"""
+import math
+import os
+from dataclasses import dataclass, field
+
+MB = 1024 * 1024
+
+# Memoria estimada de un worker ya caliente (app, plantillas, caché, pool e hilos)
+WORKER_MEMORY_MB = float(os.getenv('WORKER_MEMORY_MB', '120'))
+# Memoria reservada para el master, el sistema y picos
+MEMORY_RESERVE_MB = float(os.getenv('MEMORY_RESERVE_MB', '100'))
+# Conexiones a Postgres que puede usar esta instancia (max_connections menos otros clientes)
+DB_CONNECTION_BUDGET = int(os.getenv('DB_CONNECTION_BUDGET', '40'))
+DEFAULT_THREADS = 4
+# Conexiones por worker fuera del pool (la de checkout.interrupt_in_flight al salir)
+DEDICATED_CONNECTIONS_PER_WORKER = 1
+# Conexiones por nodo fuera de los pools (el LISTEN/NOTIFY de cache_events, un worker por nodo)
+DEDICATED_CONNECTIONS_PER_NODE = 1
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+# Segundos sobre la llamada al proveedor para los pasos de base de datos de una compra
+GRACEFUL_MARGIN = int(os.getenv('GRACEFUL_MARGIN', '15'))
+
+
+def _read(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_limit(cgroup_root=CGROUP_ROOT):
+    """CPUs utilizables (puede ser fraccionario, p. ej. 0.5 con una cuota de cgroup)"""
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        cpus = float(os.cpu_count() or 1)
+
+    quota = None
+    cpu_max = _read(os.path.join(cgroup_root, 'cpu.max'))
+    if cpu_max:
+        limit, _, period = cpu_max.partition(' ')
+        if limit != 'max' and period:
+            quota = int(limit) / int(period)
+    else:
+        limit = _read(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_quota_us'))
+        period = _read(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_period_us'))
+        if limit and period and int(limit) > 0:
+            quota = int(limit) / int(period)
+
+    return min(cpus, quota) if quota else cpus
+
+
+def memory_limit(cgroup_root=CGROUP_ROOT):
+    """Bytes de memoria utilizables: límite del cgroup o memoria física"""
+    physical = None
+    if hasattr(os, 'sysconf'):
+        try:
+            physical = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+        except (ValueError, OSError):
+            physical = None
+
+    for path in (os.path.join(cgroup_root, 'memory.max'),
+                 os.path.join(cgroup_root, 'memory', 'memory.limit_in_bytes')):
+        value = _read(path)
+        if value and value.isdigit():
+            limit = int(value)
+            # cgroup v1 sin límite reporta un número enorme
+            if physical is None or limit < physical:
+                return limit
+            break
+    return physical
+
+
+def _env_int(*names):
+    for name in names:
+        value = os.getenv(name)
+        if value:
+            return int(value)
+    return None
+
+
+@dataclass
+class ServerSizing:
+    cpus: float
+    memory_bytes: int
+    workers: int
+    threads: int
+    pool_size: int
+    db_budget: int
+    limits: dict = field(default_factory=dict)
+
+    @property
+    def db_connections_total(self):
+        return self.workers * (self.pool_size + DEDICATED_CONNECTIONS_PER_WORKER) + DEDICATED_CONNECTIONS_PER_NODE
+
+    @property
+    def over_budget(self):
+        """Los valores fijados a mano pueden superar el presupuesto de conexiones"""
+        return self.db_connections_total > self.db_budget
+
+    def summary(self):
+        return {
+            'cpus': round(self.cpus, 2),
+            'memory_mb': round(self.memory_bytes / MB) if self.memory_bytes else None,
+            'workers': self.workers,
+            'threads': self.threads,
+            'db_pool_per_worker': self.pool_size,
+            'db_connections_total': self.db_connections_total,
+            'db_budget': self.db_budget,
+            'workers_limited_by': min(self.limits, key=self.limits.get) if self.limits else 'manual',
+            'worker_limits': self.limits,
+        }
+
+
+def compute(cpus=None, memory_bytes=None, db_budget=DB_CONNECTION_BUDGET):
+    """Elegir workers, hilos y pool; los valores fijados por variables de entorno se respetan"""
+    cpus = cpu_limit() if cpus is None else cpus
+    memory_bytes = memory_limit() if memory_bytes is None else memory_bytes
+
+    limits = {'cpu': int(2 * cpus) + 1}
+    if memory_bytes:
+        usable_mb = memory_bytes / MB - MEMORY_RESERVE_MB
+        limits['memory'] = max(1, int(usable_mb // WORKER_MEMORY_MB))
+    # Con el presupuesto justo conviene menos workers con sus hilos completos (una conexión
+    # de pool por hilo) que muchos workers de un solo hilo
+    threads = _env_int('GUNICORN_THREADS')
+    per_worker = (threads or DEFAULT_THREADS) + DEDICATED_CONNECTIONS_PER_WORKER
+    worker_budget = db_budget - DEDICATED_CONNECTIONS_PER_NODE
+    limits['db_budget'] = max(1, worker_budget // per_worker)
+
+    workers = _env_int('GUNICORN_WORKERS', 'WEB_CONCURRENCY')
+    if workers is None:
+        workers = min(limits.values())
+    else:
+        limits = {}
+
+    pool_share = max(1, worker_budget // workers - DEDICATED_CONNECTIONS_PER_WORKER)
+    pool_size = _env_int('DB_POOL_MAX_CONNECTIONS')
+    if pool_size is None:
+        pool_size = min(threads or DEFAULT_THREADS, pool_share)
+    if threads is None:
+        threads = pool_size
+
+    return ServerSizing(cpus=cpus, memory_bytes=memory_bytes, workers=workers, threads=threads,
+                        pool_size=pool_size, db_budget=db_budget, limits=limits)
+
+
+def graceful_timeout():
+    """GUNICORN_GRACEFUL_TIMEOUT o el peor caso de una compra (proveedores en secuencia) más GRACEFUL_MARGIN"""
+    configured = _env_int('GUNICORN_GRACEFUL_TIMEOUT')
+    if configured is not None:
+        return configured
+    from providers import purchase_deadline
+    return math.ceil(purchase_deadline()) + GRACEFUL_MARGIN
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(compute().summary(), indent=2))
+    for label, cpus, memory in (('512MB / 0.5 CPU', 0.5, 512 * MB), ('16 núcleos / 32GB', 16, 32 * 1024 * MB)):
+        print(f"{label}: {json.dumps(compute(cpus, memory).summary())}")
@@ -0,0 +1,451 @@
+"""
+Caché compartida por todos los workers de un mismo nodo.
+
+Se guarda en una base SQLite dentro de /dev/shm (memoria compartida), así
+un precio o banner cargado por un worker lo ven los demás, y una
+invalidación en un worker aplica a todos. Cada entrada tiene tipo declarado,
+TTL y fecha de último acceso; al superar el límite de entradas o de bytes se
+desalojan las menos usadas recientemente (LRU).
+
+La lectura no toma el lock de escritura de SQLite: los aciertos y fallos se
+cuentan en memoria de cada proceso (métricas shared_cache_hits_total y
+shared_cache_misses_total, sumadas entre workers en /metrics) y el último
+acceso se actualiza a lo sumo cada LAST_ACCESS_RESOLUTION segundos por clave,
+suficiente para el LRU.
+
+CacheLoader agrega carga de un solo vuelo (un único proceso/hilo recarga
+mientras los demás reciben el valor anterior), recarga anticipada en segundo
+plano poco antes de expirar y conservación del último valor bueno si la base
+de datos no responde.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+import metrics
+import query_budget
+from app_logging import get_logger
+from tracing import span
+
+log = get_logger('cache')
+
+DEFAULT_MAX_ENTRIES = int(os.getenv('SHARED_CACHE_MAX_ENTRIES', '512'))
+DEFAULT_MAX_BYTES = int(os.getenv('SHARED_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+
+# Segundos que se conserva una entrada expirada como "último valor bueno"
+STALE_RETENTION = int(os.getenv('SHARED_CACHE_STALE_RETENTION', str(7 * 24 * 3600)))
+
+# Precisión del último acceso usado por el LRU: una lectura solo escribe si el guardado es más viejo
+LAST_ACCESS_RESOLUTION = float(os.getenv('SHARED_CACHE_LAST_ACCESS_RESOLUTION', '60'))
+# Espera máxima por el lock de escritura de SQLite (la de sqlite3.connect(timeout=5))
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+CACHE_HITS = metrics.registry.counter(
+    'shared_cache_hits_total', 'Aciertos de la caché compartida por clave', ('key',))
+CACHE_MISSES = metrics.registry.counter(
+    'shared_cache_misses_total', 'Fallos de la caché compartida por clave', ('key',))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value_type TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache_generations (
+    key TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS cache_leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# Entrada leída de la caché, vigente o no; expires_at == 0 indica invalidación explícita
+CacheEntry = namedtuple('CacheEntry', ['value', 'stored_at', 'expires_at'])
+
+# Tipos admitidos: se guardan como JSON y se verifican al escribir y leer
+VALUE_TYPES = {
+    'str': str,
+    'dict': dict,
+    'list': list,
+    'int': int,
+    'float': float,
+    'bool': bool
+}
+
+
+def default_cache_path():
+    """Ruta por defecto: /dev/shm si existe (memoria compartida), si no el directorio temporal"""
+    base_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base_dir, 'inefablestore_cache.sqlite3')
+
+
+class SharedCache:
+    """Caché tipada con TTL y LRU compartida entre procesos del nodo"""
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or os.getenv('SHARED_CACHE_PATH') or default_cache_path()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entry_types = {}
+        self._decoded = {}
+        self._local = threading.local()
+
+    def _connection(self):
+        """Conexión por hilo y por proceso (no se comparte a través de fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Transacción de escritura (BEGIN IMMEDIATE serializa a los escritores entre procesos)"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def register(self, key, value_type, ttl):
+        """Declarar una entrada: tipo de valor (str, dict, ...) y TTL en segundos"""
+        type_name = value_type.__name__
+        if type_name not in VALUE_TYPES:
+            raise TypeError(f"Tipo no admitido en la caché compartida: {type_name}")
+        self.entry_types[key] = (type_name, float(ttl))
+
+    def _entry_type(self, key):
+        try:
+            return self.entry_types[key]
+        except KeyError:
+            raise KeyError(f"Entrada de caché no registrada: {key}") from None
+
+    def get(self, key, default=None):
+        """Valor vigente de la entrada o default si no existe o expiró"""
+        entry = self.get_entry(key)
+        if entry is None or entry.expires_at <= time.time():
+            return default
+        return entry.value
+
+    def get_entry(self, key):
+        """CacheEntry de la clave aunque esté expirada (None si no hay nada guardado).
+
+        El valor decodificado se memoriza por proceso: mientras la entrada no cambie
+        se devuelve el mismo objeto sin volver a leer ni decodificar el JSON, por lo
+        que los valores devueltos deben tratarse como de solo lectura.
+        """
+        type_name, _ = self._entry_type(key)
+        now = time.time()
+        conn = self._connection()
+
+        row = conn.execute(
+            "SELECT value_type, stored_at, expires_at, last_access FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and row[0] != type_name:
+            row = None
+        hit = row is not None and row[2] > now
+
+        if hit:
+            CACHE_HITS.inc(key=key)
+            if now - row[3] >= LAST_ACCESS_RESOLUTION:
+                self._touch(conn, key, now)
+        else:
+            CACHE_MISSES.inc(key=key)
+
+        if row is None:
+            return None
+
+        stored_at, expires_at = row[1], row[2]
+        decoded = self._decoded.get(key)
+        if decoded is None or decoded[0] != stored_at:
+            value_row = conn.execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND stored_at = ?", (key, stored_at)
+            ).fetchone()
+            if value_row is None:
+                return None
+            decoded = (stored_at, json.loads(value_row[0]))
+            self._decoded[key] = decoded
+
+        return CacheEntry(decoded[1], stored_at, expires_at)
+
+    def _touch(self, conn, key, now):
+        """Actualizar el último acceso para el LRU; si otro proceso escribe, se omite (lo hará otra lectura)"""
+        conn.execute('PRAGMA busy_timeout = 0')
+        try:
+            conn.execute(
+                "UPDATE cache_entries SET last_access = ? WHERE key = ? AND last_access < ?",
+                (now, key, now - LAST_ACCESS_RESOLUTION)
+            )
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            conn.execute(f'PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}')
+
+    def generation(self, key):
+        """Generación de la clave: invalidate() la incrementa"""
+        row = self._connection().execute(
+            "SELECT generation FROM cache_generations WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _bump_generation(self, conn, key):
+        conn.execute(
+            "INSERT INTO cache_generations (key, generation) VALUES (?, 1) "
+            "ON CONFLICT(key) DO UPDATE SET generation = generation + 1",
+            (key,)
+        )
+
+    def set(self, key, value, ttl=None, generation=None):
+        """Guardar un valor del tipo registrado; ttl por defecto el de la entrada.
+
+        Con generation, solo se guarda si la clave no se invalidó desde que se leyó
+        esa generación (un valor cargado antes de la invalidación puede ser viejo).
+        Devuelve False si se descartó.
+        """
+        type_name, default_ttl = self._entry_type(key)
+        if not isinstance(value, VALUE_TYPES[type_name]):
+            raise TypeError(f"La entrada {key} espera {type_name}, recibió {type(value).__name__}")
+
+        payload = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        now = time.time()
+        expires_at = now + (default_ttl if ttl is None else ttl)
+        with self._transaction() as conn:
+            if generation is not None:
+                row = conn.execute("SELECT generation FROM cache_generations WHERE key = ?", (key,)).fetchone()
+                if (row[0] if row else 0) != generation:
+                    return False
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries "
+                "(key, value_type, value, size, stored_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, type_name, payload, len(payload), now, expires_at, now)
+            )
+            self._evict(conn, now)
+        return True
+
+    def _evict(self, conn, now):
+        """Eliminar expiradas viejas y, si se superan los límites, las menos usadas recientemente"""
+        conn.execute(
+            "DELETE FROM cache_entries WHERE expires_at <= ? AND stored_at <= ?",
+            (now, now - STALE_RETENTION)
+        )
+        count, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries"
+        ).fetchone()
+
+        while count > self.max_entries or total_bytes > self.max_bytes:
+            row = conn.execute(
+                "SELECT key, size FROM cache_entries ORDER BY last_access ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (row[0],))
+            count -= 1
+            total_bytes -= row[1]
+
+    def delete(self, key):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            self._bump_generation(conn, key)
+
+    def invalidate(self, key):
+        """Marcar la entrada como inválida conservando el valor como último valor bueno"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE cache_entries SET expires_at = 0 WHERE key = ?", (key,))
+            # Una recarga que empezó antes ya no puede publicar su valor
+            self._bump_generation(conn, key)
+
+    def acquire_lease(self, key, owner, ttl):
+        """Tomar el permiso exclusivo de recarga de una clave entre procesos"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM cache_leases WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO cache_leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                (key, owner, now + ttl)
+            )
+            return cursor.rowcount == 1
+
+    def release_lease(self, key, owner):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM cache_leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM cache_entries")
+            conn.execute("UPDATE cache_generations SET generation = generation + 1")
+
+    def stats(self):
+        """Ocupación total de la caché y aciertos/fallos por clave de este proceso"""
+        conn = self._connection()
+        counters = {}
+        for metric, field in ((CACHE_HITS, 'hits'), (CACHE_MISSES, 'misses')):
+            for (key,), value in metric.dump():
+                counters.setdefault(key, {'hits': 0, 'misses': 0})[field] = value
+        count, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries"
+        ).fetchone()
+        return {
+            'path': self.path,
+            'entries': count,
+            'bytes': total_bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'counters': counters
+        }
+
+
+class CacheLoader:
+    """Carga de un solo vuelo con stale-while-revalidate sobre una entrada de SharedCache.
+
+    load() devuelve el valor nuevo o None si la fuente (base de datos) falló.
+    fallback() se usa solo si nunca hubo un valor bueno.
+    """
+
+    def __init__(self, cache, key, load, fallback=None, refresh_ahead=0.8,
+                 wait_timeout=5.0, retry_after=30.0):
+        self.cache = cache
+        self.key = key
+        self.load = load
+        self.fallback = fallback
+        self.refresh_ahead = refresh_ahead
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._last_good = None
+        self._fallback_value = None
+        self._failed_until = 0.0
+
+    @property
+    def ttl(self):
+        return self.cache.entry_types[self.key][1]
+
+    def get(self):
+        entry = self.cache.get_entry(self.key)
+        now = time.time()
+
+        if entry is not None and entry.expires_at > now:
+            # Vigente: si está cerca de expirar se recarga en segundo plano
+            if now - entry.stored_at >= self.ttl * self.refresh_ahead:
+                self.refresh_async()
+            self._last_good = entry.value
+            return entry.value
+
+        if entry is not None and entry.expires_at != 0:
+            # Expiró por TTL: se sirve el valor anterior mientras uno solo recarga
+            self.refresh_async()
+            return entry.value
+
+        # Sin valor o invalidado explícitamente: se espera la recarga (de un solo vuelo)
+        value = self.refresh()
+        if value is not None:
+            return value
+
+        # La base de datos no respondió: último valor bueno conocido
+        if entry is not None:
+            return entry.value
+        if self._last_good is not None:
+            return self._last_good
+        return self._fallback()
+
+    def _fallback(self):
+        """Valor por defecto calculado una sola vez: el mismo objeto mientras la base de datos no responda"""
+        if self._fallback_value is None and self.fallback:
+            self._fallback_value = self.fallback()
+        return self._fallback_value
+
+    def refresh(self):
+        """Recargar de forma síncrona; si otro ya recarga, esperar su resultado"""
+        if time.time() < self._failed_until:
+            return None
+
+        # Una recarga se amortiza entre todos los requests que la usan: no cuenta para el presupuesto del request
+        with span('cache.refresh', key=self.key), query_budget.exempt():
+            return self._refresh()
+
+    def _refresh(self):
+        deadline = time.monotonic() + self.wait_timeout
+        if not self._lock.acquire(timeout=self.wait_timeout):
+            return None
+        try:
+            # Otro hilo de este proceso pudo haber recargado mientras esperábamos
+            value = self.cache.get(self.key)
+            if value is not None:
+                return value
+
+            owner = uuid.uuid4().hex
+            while not self.cache.acquire_lease(self.key, owner, self.wait_timeout * 2):
+                # Otro proceso recarga: esperar a que publique el valor
+                if time.monotonic() >= deadline:
+                    return None
+                time.sleep(0.02)
+                value = self.cache.get(self.key)
+                if value is not None:
+                    return value
+
+            try:
+                return self._load_and_store(attempts=3)
+            finally:
+                self.cache.release_lease(self.key, owner)
+        finally:
+            self._lock.release()
+
+    def refresh_async(self):
+        """Recargar en un hilo si nadie más (en este ni en otro proceso) lo está haciendo"""
+        if time.time() < self._failed_until or not self._lock.acquire(blocking=False):
+            return
+
+        owner = uuid.uuid4().hex
+        if not self.cache.acquire_lease(self.key, owner, self.wait_timeout * 2):
+            self._lock.release()
+            return
+
+        def run():
+            try:
+                self._load_and_store()
+            finally:
+                self.cache.release_lease(self.key, owner)
+                self._lock.release()
+
+        threading.Thread(target=run, name=f'cache-refresh-{self.key}', daemon=True).start()
+
+    def _load_and_store(self, attempts=1):
+        """Cargar y publicar; si la clave se invalidó durante la carga, el valor se descarta"""
+        for _ in range(attempts):
+            generation = self.cache.generation(self.key)
+            try:
+                value = self.load()
+            except Exception as e:
+                log.error("Error recargando entrada", key=self.key, error=str(e))
+                value = None
+
+            if value is None:
+                # No insistir en cada request mientras la base de datos esté caída
+                self._failed_until = time.time() + self.retry_after
+                return None
+
+            if self.cache.set(self.key, value, generation=generation):
+                self._last_good = value
+                return value
+            log.info("Recarga descartada: la entrada se invalidó mientras se cargaba", key=self.key)
+        return None
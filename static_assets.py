@@ -0,0 +1,76 @@
+"""
+Resolución y entrega de los archivos estáticos generados por build_static.py.
+
+static_url('styles.css') devuelve la URL del archivo con hash de contenido
+(/assets/styles.3f2a1b9c04.css) si existe el manifiesto, o la URL normal de
+/static si no se corrió el build (desarrollo). Los archivos con hash se sirven
+con caché inmutable de un año y en su variante precomprimida (br o gzip) según
+Accept-Encoding. Con STATIC_ASSETS_BASE_URL las URLs apuntan a un CDN y los
+workers dejan de atender tráfico estático.
+"""
+import json
+import mimetypes
+import os
+
+from flask import abort, request, send_from_directory, url_for
+
+from app_logging import get_logger
+from build_static import DIST_DIR, MANIFEST_NAME
+
+log = get_logger('static')
+
+# Prefijo opcional de un CDN que sirve static/dist (p. ej. https://cdn.example.com/assets)
+STATIC_ASSETS_BASE_URL = os.getenv('STATIC_ASSETS_BASE_URL', '').rstrip('/')
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Variantes precomprimidas en orden de preferencia: (Content-Encoding, extensión)
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+def load_manifest(dist_dir=DIST_DIR):
+    """Manifiesto {nombre original: nombre con hash}; vacío si no se corrió el build"""
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+_manifest = load_manifest()
+_hashed_files = set(_manifest.values())
+
+if _manifest:
+    log.info("Manifiesto de estáticos cargado", files=len(_manifest))
+
+
+def static_url(filename):
+    """URL de un archivo de static/: la versión con hash si existe, si no la de /static"""
+    hashed_name = _manifest.get(filename)
+    if hashed_name is None:
+        return url_for('static', filename=filename)
+    if STATIC_ASSETS_BASE_URL:
+        return f"{STATIC_ASSETS_BASE_URL}/{hashed_name}"
+    return url_for('hashed_asset', filename=hashed_name)
+
+
+def send_hashed_asset(filename):
+    """Respuesta para /assets/<archivo con hash>: precomprimida si el cliente la acepta, caché inmutable"""
+    if filename not in _hashed_files:
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    accepted = request.accept_encodings
+    for encoding, suffix in PRECOMPRESSED:
+        if accepted[encoding] and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+            response = send_from_directory(DIST_DIR, filename + suffix, mimetype=mimetype,
+                                           max_age=IMMUTABLE_MAX_AGE)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(DIST_DIR, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,99 @@
+"""
+Caché de fragmentos para plantillas Jinja.
+
+Las partes de una plantilla que son iguales para todos los usuarios (grillas de
+opciones y precios, datos del catálogo para el JS, banner) se renderizan una vez
+por versión y se reutilizan en los siguientes requests:
+
+    {% cache 'opciones_freefire_latam', catalog.version %}
+      ... markup que solo depende del catálogo ...
+    {% endcache %}
+
+La clave es la plantilla más un digest del nombre del fragmento y los valores
+de versión: cuando cambia la versión del catálogo (o el texto del banner) la
+clave es otra y el fragmento se vuelve a renderizar. El mismo nombre en dos
+plantillas son dos fragmentos, y un valor largo (el texto del banner) no queda
+guardado dos veces. Dentro de un bloque cache no debe haber datos del usuario.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+# Cambia cuando cambia el código que parse() genera: el bytecode en disco de la versión anterior no se reutiliza
+EXTENSION_VERSION = 2
+# Máximo de fragmentos por proceso (0 desactiva la caché y renderiza siempre)
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', '256'))
+
+
+class FragmentCache:
+    """LRU en memoria del proceso para fragmentos ya renderizados"""
+
+    def __init__(self, max_entries=FRAGMENT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        if self.max_entries <= 0:
+            return render()
+
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+
+        fragment = render()
+        with self._lock:
+            self._entries[key] = fragment
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class FragmentCacheExtension(Extension):
+    """Etiqueta {% cache nombre, versión... %} ... {% endcache %}"""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        key_parts.insert(0, nodes.Const(parser.name))
+        call = self.call_method('_render_fragment', [nodes.List(key_parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, key_parts, caller):
+        template_name, *versions = key_parts
+        digest = hashlib.blake2b(repr(versions).encode(), digest_size=16).hexdigest()
+        return self.environment.fragment_cache.get_or_render((template_name, digest), caller)
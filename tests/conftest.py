@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Los módulos leen su configuración al importarse
+_tmp = tempfile.mkdtemp(prefix='revendedores-tests-')
+os.environ.setdefault('SHARED_CACHE_PATH', os.path.join(_tmp, 'shared_cache.sqlite3'))
+os.environ.setdefault('FLASK_SECRET_KEY', 'tests')
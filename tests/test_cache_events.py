@@ -0,0 +1,36 @@
+import threading
+
+import cache_events
+from cache_events import CacheInvalidationListener
+
+
+def test_only_one_listener_per_lock_file(tmp_path, monkeypatch):
+    serving = []
+    leader_done = threading.Event()
+
+    def serve(self):
+        serving.append(self)
+        leader_done.wait(5)
+
+    monkeypatch.setattr(CacheInvalidationListener, '_serve', serve)
+    monkeypatch.setattr(cache_events, 'STANDBY_POLL', 0.01)
+    lock_path = str(tmp_path / 'cache.listener.lock')
+
+    # flock es por archivo abierto: dos listeners del mismo proceso compiten como dos workers
+    leader = CacheInvalidationListener(lambda payload: None, lock_path=lock_path)
+    leader.start()
+    while not serving:
+        leader.join(0.01)
+    standby = CacheInvalidationListener(lambda payload: None, lock_path=lock_path)
+    standby.start()
+
+    standby.join(0.2)
+    assert leader.leader and not standby.leader
+    assert serving == [leader]
+
+    # El líder termina y libera el lock: el de reserva toma el relevo
+    leader_done.set()
+    leader.join(5)
+    standby.join(5)
+    assert standby.leader
+    assert serving == [leader, standby]
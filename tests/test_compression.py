@@ -0,0 +1,90 @@
+import gzip
+
+from compression import CompressionMiddleware
+
+BODY = b'{"precio": 0.70, "opcion": 1}' * 40
+
+
+def run(app, accept='gzip'):
+    """Ejecutar la app envuelta; devuelve (status, headers, cuerpo en el orden en que llegó al servidor)"""
+    response = {}
+    sent = []
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = dict(headers)
+        return sent.append
+
+    environ = {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': accept}
+    for chunk in CompressionMiddleware(app)(environ, start_response):
+        sent.append(chunk)
+    return response.get('status'), response.get('headers', {}), b''.join(sent)
+
+
+def test_iterable_body_is_compressed():
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [BODY]
+
+    status, headers, body = run(app)
+    assert headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(body) == BODY
+
+
+def test_generator_that_yields_nothing_passes_through():
+    def app(environ, start_response):
+        start_response('204 No Content', [])
+        return
+        yield  # noqa: generador
+
+    status, headers, body = run(app)
+    assert status == '204 No Content'
+    assert body == b''
+
+
+def test_app_without_start_response_passes_through():
+    def app(environ, start_response):
+        return iter(())
+
+    status, headers, body = run(app)
+    assert status is None
+    assert body == b''
+
+
+def test_write_callable_is_not_dropped():
+    def app(environ, start_response):
+        write = start_response('200 OK', [('Content-Type', 'text/html')])
+        write(BODY[:600])
+        return [BODY[600:]]
+
+    status, headers, body = run(app)
+    assert 'Content-Encoding' not in headers
+    assert body == BODY
+
+
+def writing_generator(parts):
+    """App que alterna bloques del iterador con write(): (True, data) se escribe, (False, data) se produce"""
+    def app(environ, start_response):
+        write = start_response('200 OK', [('Content-Type', 'text/html')])
+        for written, data in parts:
+            if written:
+                write(data)
+            else:
+                yield data
+    return app
+
+
+def test_write_during_iteration_keeps_order_in_small_body():
+    parts = [(False, b'a'), (True, b'b'), (False, b'c'), (True, b'd')]
+
+    status, headers, body = run(writing_generator(parts))
+    assert 'Content-Encoding' not in headers
+    assert body == b'abcd'
+
+
+def test_write_during_iteration_keeps_order_when_compressed():
+    parts = [(False, BODY[:10]), (True, BODY[10:20]), (False, BODY[20:900]), (True, BODY[900:])]
+
+    status, headers, body = run(writing_generator(parts))
+    assert headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(body) == BODY
@@ -0,0 +1,25 @@
+import os
+import time
+
+import profiler
+
+
+def test_heartbeat_continues_while_a_profile_runs(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiler, 'PROFILER_DIR', str(tmp_path))
+    monkeypatch.setattr(profiler, 'RESULTS_DIR', str(tmp_path / 'results'))
+    monkeypatch.setattr(profiler, 'WATCH_INTERVAL', 0.05)
+    monkeypatch.setattr(profiler, 'HEARTBEAT_MAX_AGE', 0.5)
+    monkeypatch.setattr(profiler, '_watcher', None)
+    profiler.start_watcher()
+    while os.getpid() not in profiler.list_workers():
+        time.sleep(0.01)
+
+    # Pedido de otro worker: lo atiende el vigía, no el hilo del request
+    profiler._write_json(os.path.join(profiler._worker_dir(os.getpid()), 'perfil.request'),
+                         {'kind': 'cpu', 'seconds': 1.5, 'interval': 0.01})
+    result_path = tmp_path / 'results' / 'perfil.json'
+    while not result_path.exists():
+        assert os.getpid() in profiler.list_workers()
+        time.sleep(0.1)
+
+    assert 'result' in result_path.read_text()
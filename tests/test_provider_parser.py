@@ -0,0 +1,30 @@
+import json
+import os
+
+import pytest
+
+from provider_parser import PinResult, parse_provider_response
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', 'fixtures', 'provider_responses')
+
+with open(os.path.join(FIXTURES_DIR, 'expected.json'), encoding='utf-8') as f:
+    EXPECTED = json.load(f)
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        parsed = parse_provider_response(f.read())
+    want = EXPECTED[name]
+
+    if 'pin_code' in want:
+        assert isinstance(parsed, PinResult)
+        assert parsed.pin_code == want['pin_code']
+    else:
+        assert not isinstance(parsed, PinResult)
+        assert parsed.kind == want['error']
+
+
+def test_every_fixture_has_an_expected_result():
+    fixtures = set(os.listdir(FIXTURES_DIR)) - {'expected.json'}
+    assert fixtures == set(EXPECTED)
@@ -0,0 +1,163 @@
+import os
+import signal
+import socket
+
+import pytest
+
+from database import Database
+from fake_provider import start_fake_provider
+from providers import Bulkhead, ProviderBusyError, ProviderOutcomeUnknown, ProviderRouter
+
+
+@pytest.fixture
+def fake_providers():
+    servers = []
+
+    def start(**profile):
+        server = start_fake_provider(**profile)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def closed_port_url():
+    """URL de un puerto sin nadie escuchando: la conexión se rechaza"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/api.php"
+
+
+def make_router(*providers):
+    """Router de freefire_latam con los proveedores en el orden dado (por costo)"""
+    return ProviderRouter.from_config({'freefire_latam': [
+        dict({'name': f'p{i}', 'user': 'test', 'password': 'test', 'costs': {'1': 0.1 * (i + 1)}}, **config)
+        for i, config in enumerate(providers)
+    ]})
+
+
+def purchase(router):
+    parse = Database(pooled=False)._parse_freefire_latam_response
+    return router.purchase('freefire_latam', 1, parse)
+
+
+def test_fails_over_in_order_when_first_provider_is_unreachable(fake_providers):
+    second = fake_providers(latency=0)
+    third = fake_providers(latency=0)
+    router = make_router({'url': closed_port_url()}, {'url': second.url}, {'url': third.url})
+
+    result = purchase(router)
+
+    assert result['provider'] == 'p1'
+    assert second.requests_served == 1
+    assert third.requests_served == 0
+
+
+def test_fails_over_when_first_provider_rejects(fake_providers):
+    no_stock = fake_providers(latency=0, failure_rate=1.0)
+    backup = fake_providers(latency=0)
+    router = make_router({'url': no_stock.url}, {'url': backup.url})
+
+    result = purchase(router)
+
+    assert result['provider'] == 'p1'
+    assert no_stock.requests_served == 1
+    assert backup.requests_served == 1
+
+
+def test_busy_provider_is_rejected_after_queue_timeout(fake_providers):
+    server = fake_providers(latency=0)
+    router = make_router({'url': server.url, 'max_concurrent': 1, 'queue_timeout': 0.1})
+    provider = router.candidates('freefire_latam', 1)[0]
+    assert provider.bulkhead.acquire(timeout=0)
+    try:
+        with pytest.raises(ProviderBusyError):
+            purchase(router)
+    finally:
+        provider.bulkhead.release()
+    assert server.requests_served == 0
+
+
+def test_busy_provider_is_skipped_for_a_free_one(fake_providers):
+    busy = fake_providers(latency=0)
+    free = fake_providers(latency=0)
+    router = make_router({'url': busy.url, 'max_concurrent': 1}, {'url': free.url})
+    provider = router.candidates('freefire_latam', 1)[0]
+    assert provider.bulkhead.acquire(timeout=0)
+    try:
+        result = purchase(router)
+    finally:
+        provider.bulkhead.release()
+
+    assert result['provider'] == 'p1'
+    assert busy.requests_served == 0
+
+
+def test_read_timeout_does_not_fail_over(fake_providers):
+    slow = fake_providers(latency=1.0)
+    backup = fake_providers(latency=0)
+    router = make_router({'url': slow.url, 'timeout': 0.2}, {'url': backup.url})
+
+    with pytest.raises(ProviderOutcomeUnknown) as excinfo:
+        purchase(router)
+
+    assert excinfo.value.provider == 'p0'
+    assert backup.requests_served == 0
+
+
+def test_unparseable_response_does_not_fail_over(fake_providers, monkeypatch):
+    first = fake_providers(latency=0)
+    backup = fake_providers(latency=0)
+    router = make_router({'url': first.url}, {'url': backup.url})
+    monkeypatch.setattr(router.candidates('freefire_latam', 1)[0], 'request_pin',
+                        lambda option_value: '<html>502 Bad Gateway</html>')
+
+    with pytest.raises(ProviderOutcomeUnknown):
+        purchase(router)
+
+    assert backup.requests_served == 0
+
+
+def test_permits_of_a_killed_worker_are_reclaimed():
+    bulkhead = Bulkhead(limit=1, queue_timeout=0.1)
+    pid = os.fork()
+    if pid == 0:
+        bulkhead.acquire(timeout=0)
+        os.kill(os.getpid(), signal.SIGKILL)
+    os.waitpid(pid, 0)
+
+    assert not bulkhead.acquire(timeout=0.1)
+    assert bulkhead.snapshot()['in_flight'] == 1
+
+    assert bulkhead.reclaim(pid) == 1
+    assert bulkhead.acquire(timeout=0)
+    bulkhead.release()
+    assert bulkhead.snapshot()['in_flight'] == 0
+
+
+def test_warm_does_not_touch_the_purchase_endpoint(fake_providers):
+    server = fake_providers(latency=0)
+    router = make_router({'url': server.url})
+    provider = router.providers['freefire_latam'][0]
+
+    assert provider.warm_url.endswith('/') and not provider.warm_url.endswith('api.php')
+    assert 'p0' in router.warm()
+    assert server.requests_served == 0
+
+
+def test_success_without_pin_does_not_fail_over(fake_providers, monkeypatch):
+    first = fake_providers(latency=0)
+    backup = fake_providers(latency=0)
+    router = make_router({'url': first.url}, {'url': backup.url})
+    monkeypatch.setattr(router.candidates('freefire_latam', 1)[0], 'request_pin',
+                        lambda option_value: '{"ALERTA":"VERDE","MENSAJE":"Recarga procesada"}')
+
+    with pytest.raises(ProviderOutcomeUnknown) as excinfo:
+        purchase(router)
+
+    assert excinfo.value.provider == 'p0'
+    assert backup.requests_served == 0
@@ -0,0 +1,188 @@
+"""
+Sentencias por ruta con la base de datos simulada a nivel de cursor.
+
+Database.execute_query corre de verdad (cuenta sentencias y commits); solo el
+cursor responde filas fijas según la consulta. Con QUERY_BUDGET_STRICT una ruta
+que supera su presupuesto hace fallar el test; además se compara lo contado con
+el presupuesto declarado, así una ruta que hace menos sigue pasando.
+"""
+from decimal import Decimal
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import database
+import query_budget
+from query_budget import Budget, QueryBudgetExceeded
+
+PIN = {'id': 7, 'pin_code': 'PINLOCAL01', 'value': 1, 'game_type': 'freefire_latam', 'is_used': False}
+USER = {'user_id': 'USR001', 'nombre': 'Ana', 'apellido': 'Pérez', 'telefono': '1', 'email': 'ana@example.com',
+        'password': generate_password_hash('secreta123'), 'balance': Decimal('100.00'), 'is_active': True,
+        'created_at': None}
+PRICES = [
+    {'game_type': 'freefire_latam', 'option_key': '1', 'price': Decimal('0.70')},
+    {'game_type': 'freefire_global', 'option_key': '1', 'price': Decimal('0.86')},
+    {'game_type': 'block_striker', 'option_key': '1', 'price': Decimal('0.82')},
+]
+
+
+class FakeCursor:
+    """Responde filas fijas por tipo de consulta; overrides reemplaza respuestas por prefijo"""
+
+    def __init__(self, overrides):
+        self.overrides = overrides
+        self.description = None
+        self._rows = []
+
+    def execute(self, query, params=None):
+        sql = ' '.join(query.split()).lower()
+        rows = self._respond(sql)
+        self.description = None if rows is None else [('row',)]
+        self._rows = rows or []
+
+    def fetchall(self):
+        return self._rows
+
+    def _respond(self, sql):
+        for prefix, rows in self.overrides.items():
+            if prefix in sql:
+                return rows
+        if sql.startswith('with u as'):
+            return [{'ctx_balance': Decimal('100.00'), 'ctx_is_active': True, 'ctx_rank': None}]
+        if sql.startswith('select balance from users'):
+            return [{'balance': Decimal('100.00')}]
+        if 'from game_prices' in sql and sql.startswith('select'):
+            return PRICES
+        if 'from system_config' in sql and sql.startswith('select'):
+            return [{'config_value': 'Banner de prueba'}]
+        if sql.startswith('select * from users where email'):
+            return [USER]
+        if sql.startswith('select * from pins where value'):
+            return [PIN]
+        if sql.startswith('with p as'):
+            return [PIN]
+        if sql.startswith('insert into purchase_journal'):
+            return [{'id': 42}]
+        if sql.startswith('select count(*)'):
+            return [{'count': 3}]
+        if sql.startswith('select user_id, nombre'):
+            return [USER]
+        if 'returning' in sql:
+            return [{'id': 1, 'user_id': 'USR001', 'balance': Decimal('99.30'), 'email': USER['email'],
+                     'nombre': 'Ana', 'apellido': 'Pérez'}]
+        if sql.startswith('select'):
+            return []
+        return None
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self.cursor_obj = cursor
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def overrides():
+    return {}
+
+
+@pytest.fixture
+def app(monkeypatch, overrides):
+    def connect(self):
+        self.connection = FakeConnection(FakeCursor(overrides))
+        self.cursor = self.connection.cursor_obj
+        return True
+
+    monkeypatch.setattr(database.Database, 'connect', connect)
+    monkeypatch.setattr(database.Database, 'disconnect', lambda self: None)
+    monkeypatch.setattr(query_budget, 'QUERY_BUDGET_STRICT', True)
+    monkeypatch.setattr(query_budget, 'QUERY_BUDGET_HEADER', True)
+
+    import main
+    monkeypatch.setattr(main.app, 'testing', True)
+    main.shared_cache.clear()
+    return main.app
+
+
+def client_for(app, user_id):
+    client = app.test_client()
+    if user_id:
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+            session['nombre'] = 'Ana'
+    return client
+
+
+def assert_within_budget(app, response, method, url):
+    assert response.status_code == 200, response.get_data(as_text=True)
+    endpoint, _ = app.url_map.bind('localhost').match(url, method)
+    route_budget = app.view_functions[endpoint].query_budget
+    assert int(response.headers[query_budget.STATEMENTS_HEADER]) <= route_budget.statements
+    assert int(response.headers[query_budget.COMMITS_HEADER]) <= route_budget.commits
+
+
+# (método, url, usuario, json)
+ROUTES = {
+    'dashboard': ('GET', '/dashboard', 'USR001', None),
+    'freefirelatam': ('GET', '/freefirelatam', 'USR001', None),
+    'freefire': ('GET', '/freefire', 'USR001', None),
+    'blockstriker': ('GET', '/blockstriker', 'USR001', None),
+    'game_prices': ('GET', '/admin/get-game-prices', 'USR001', None),
+    'login': ('POST', '/login', None, {'email': USER['email'], 'password': 'secreta123'}),
+    'admin': ('GET', '/admin', 'ADMIN001', None),
+    'admin_users': ('GET', '/admin/users', 'ADMIN001', None),
+    'add_credit': ('POST', '/admin/user/USR001/add-credit', 'ADMIN001', {'amount': 5}),
+    'set_balance': ('POST', '/admin/user/USR001/set-balance', 'ADMIN001', {'balance': 5}),
+    'latam_local': ('POST', '/freefire-latam/validate-recharge', 'USR001', {'option_value': 1, 'real_price': 0.70}),
+    'global_local': ('POST', '/freefire-global/validate-recharge', 'USR001',
+                     {'option_value': 1, 'real_price': 0.86, 'region': 'freefire_global'}),
+    'block_striker': ('POST', '/block-striker/validate-recharge', 'USR001',
+                      {'option_value': 1, 'real_price': 0.82, 'player_id': '123456'}),
+}
+
+
+@pytest.mark.parametrize('name', sorted(ROUTES))
+def test_route_within_budget(app, name):
+    method, url, user_id, payload = ROUTES[name]
+    response = client_for(app, user_id).open(url, method=method, json=payload)
+
+    assert_within_budget(app, response, method, url)
+
+
+def test_register_within_budget(app, overrides):
+    overrides['select * from users where email'] = []
+    payload = {'nombre': 'Luis', 'apellido': 'Gómez', 'telefono': '04141234567',
+               'email': 'luis@example.com', 'password': 'secreta123'}
+    response = client_for(app, None).post('/register', json=payload)
+
+    assert_within_budget(app, response, 'POST', '/register')
+
+
+def test_add_single_pin_within_budget(app, overrides):
+    overrides['select * from pins where pin_code'] = []
+    response = client_for(app, 'ADMIN001').post(
+        '/admin/add-single-pin', json={'pin_code': 'NUEVOPIN1', 'value': 1, 'game_type': 'freefire_latam'})
+
+    assert_within_budget(app, response, 'POST', '/admin/add-single-pin')
+
+
+def test_latam_provider_purchase_within_budget(app, overrides, monkeypatch):
+    overrides['select * from pins where value'] = []
+    monkeypatch.setattr(database.Database, 'get_freefire_latam_pin',
+                        lambda self, option: {'pin_code': 'PINAPI0001', 'value': option, 'provider': 'falso'})
+    response = client_for(app, 'USR001').post(
+        '/freefire-latam/validate-recharge', json={'option_value': 1, 'real_price': 0.70})
+
+    assert_within_budget(app, response, 'POST', '/freefire-latam/validate-recharge')
+
+
+def test_route_over_budget_fails_in_strict_mode(app, monkeypatch):
+    monkeypatch.setattr(app.view_functions['dashboard'], 'query_budget', Budget(0, 0))
+
+    with pytest.raises(QueryBudgetExceeded):
+        client_for(app, 'USR001').get('/dashboard')
@@ -0,0 +1,22 @@
+import server_sizing
+
+GIB = 1024 ** 3
+
+
+def test_computed_sizing_stays_within_connection_budget(monkeypatch):
+    for name in ('GUNICORN_WORKERS', 'WEB_CONCURRENCY', 'GUNICORN_THREADS', 'DB_POOL_MAX_CONNECTIONS'):
+        monkeypatch.delenv(name, raising=False)
+    sizing = server_sizing.compute(cpus=16, memory_bytes=64 * GIB, db_budget=40)
+
+    assert sizing.db_connections_total <= 40
+    assert not sizing.over_budget
+
+
+def test_forced_workers_report_over_budget(monkeypatch):
+    monkeypatch.setenv('GUNICORN_WORKERS', '20')
+    monkeypatch.delenv('DB_POOL_MAX_CONNECTIONS', raising=False)
+    sizing = server_sizing.compute(cpus=2, memory_bytes=8 * GIB, db_budget=40)
+
+    # El LISTEN de caché cuenta una sola vez por nodo
+    assert sizing.db_connections_total == 20 * (sizing.pool_size + 1) + 1
+    assert sizing.over_budget
@@ -0,0 +1,40 @@
+import sqlite3
+
+import pytest
+
+import shared_cache
+from shared_cache import SharedCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SharedCache(path=str(tmp_path / 'cache.sqlite3'))
+    cache.register('prices', dict, ttl=60)
+    return cache
+
+
+def test_reads_do_not_take_the_write_lock(cache, monkeypatch):
+    cache.set('prices', {'1': 0.7})
+    monkeypatch.setattr(shared_cache, 'LAST_ACCESS_RESOLUTION', 3600)
+
+    # Otro proceso retiene el lock de escritura: las lecturas siguen sin esperar
+    writer = sqlite3.connect(cache.path, isolation_level=None)
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        assert cache.get('prices') == {'1': 0.7}
+    finally:
+        writer.execute('ROLLBACK')
+        writer.close()
+
+
+def test_hits_and_misses_are_counted_per_process(cache):
+    before = cache.stats()['counters'].get('prices', {'hits': 0, 'misses': 0})
+    cache.get('prices')
+    cache.set('prices', {'1': 0.7})
+    cache.get('prices')
+    cache.get('prices')
+
+    counters = cache.stats()['counters']['prices']
+    assert counters['hits'] - before['hits'] == 2
+    assert counters['misses'] - before['misses'] == 1
+
@@ -0,0 +1,34 @@
+from jinja2 import DictLoader, Environment
+
+from template_cache import FragmentCacheExtension
+
+BANNER = "{% cache 'banner', banner_message %}[{{ page }}] {{ banner_message }}{% endcache %}"
+
+
+def make_env():
+    loader = DictLoader({'dashboard.html': BANNER, 'freefire.html': BANNER})
+    return Environment(loader=loader, extensions=[FragmentCacheExtension])
+
+
+def test_same_fragment_name_is_cached_per_template():
+    env = make_env()
+
+    dashboard = env.get_template('dashboard.html').render(page='dashboard', banner_message='Hola')
+    freefire = env.get_template('freefire.html').render(page='freefire', banner_message='Hola')
+
+    assert dashboard == '[dashboard] Hola'
+    assert freefire == '[freefire] Hola'
+    assert env.fragment_cache.stats()['entries'] == 2
+
+
+def test_new_banner_renders_again_without_keeping_the_text_in_the_key():
+    env = make_env()
+    template = env.get_template('dashboard.html')
+    message = 'Oferta ' * 200
+
+    assert template.render(page='a', banner_message='Hola') == '[a] Hola'
+    assert template.render(page='b', banner_message='Hola') == '[a] Hola'
+    assert template.render(page='c', banner_message=message) == f'[c] {message}'
+
+    keys = list(env.fragment_cache._entries)
+    assert all(len(digest) == 32 for _, digest in keys)
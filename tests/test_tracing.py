@@ -0,0 +1,36 @@
+import pytest
+from flask import Flask, render_template_string
+
+import tracing
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACE_ENABLED', True)
+    app = Flask(__name__)
+    tracing.install_template_spans(app)
+    return app
+
+
+def test_failed_render_closes_its_span(app):
+    with app.test_request_context():
+        trace = tracing.start_trace('GET /')
+        with tracing.span('request') as parent:
+            with pytest.raises(ZeroDivisionError):
+                render_template_string('{{ 1 // 0 }}')
+            assert tracing._current_span.get() == parent['id']
+        tracing.finish_trace()
+
+    template_span = next(s for s in trace.spans if s['name'] == 'template.render')
+    assert template_span['error'] == 'ZeroDivisionError'
+    assert template_span['parent'] == parent['id']
+    assert 'duration_ms' in template_span
+
+
+def test_render_span(app):
+    with app.test_request_context():
+        trace = tracing.start_trace('GET /')
+        assert render_template_string('{{ 6 * 7 }}') == '42'
+        tracing.finish_trace()
+
+    assert [s['name'] for s in trace.spans] == ['template.render']
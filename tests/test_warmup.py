@@ -0,0 +1,34 @@
+import threading
+import time
+
+import warmup
+
+
+def test_retry_in_progress_does_not_block_other_callers(monkeypatch):
+    monkeypatch.setattr(warmup, '_state', None)
+    monkeypatch.setattr(warmup, 'WARMUP_RETRY_INTERVAL', 0)
+    release = threading.Event()
+    calls = []
+
+    def database():
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(5)
+        raise ConnectionError("sin base de datos")
+
+    steps = [('database', database)]
+    assert not warmup.run(steps).ready
+
+    retry = threading.Thread(target=warmup.run, args=(steps,))
+    retry.start()
+    while len(calls) < 2:
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    state = warmup.run(steps)
+    assert time.monotonic() - started < 1
+    assert not state.ready
+
+    release.set()
+    retry.join()
+    assert len(calls) == 2
@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+import pytest
+
+import worker_recycling
+
+
+@pytest.fixture
+def state(monkeypatch, tmp_path):
+    monkeypatch.setattr(worker_recycling, '_state', None)
+    monkeypatch.setattr(worker_recycling, 'RECYCLE_LOCK_PATH', str(tmp_path / 'recycle'))
+    return worker_recycling.worker_state()
+
+
+def test_idle_worker_is_recycled_by_age(monkeypatch, state):
+    monkeypatch.setattr(worker_recycling, 'WORKER_RECYCLE_CHECK_SECONDS', 0.01)
+    state.max_age = 60
+    state.started -= 61
+    worker = SimpleNamespace(alive=True)
+
+    worker_recycling.start_monitor(worker).join(timeout=2)
+
+    assert worker.alive is False
+    assert state.recycling
+    assert state.requests == 0
+
+
+def test_young_worker_below_baseline_keeps_running(state):
+    worker = SimpleNamespace(alive=True)
+    state.max_age = 60
+
+    assert not worker_recycling.check(worker)
+    assert worker.alive
@@ -0,0 +1,225 @@
+"""
+Trazas livianas por request: un trace id y spans anidados con su duración.
+
+Cada request abre una traza (before_request) y los puntos instrumentados abren
+spans dentro de ella:
+
+    with span('db.query', statement='SELECT balance FROM users'):
+        ...
+
+Fuera de un request (hilos de fondo, scripts) span() no registra nada. Al
+terminar el request la traza completa queda en un buffer circular del worker
+(las más lentas, en uno aparte para que no las desplacen las rápidas) que se
+consulta en /admin/traces, y opcionalmente se agrega como una línea JSON a
+TRACE_EXPORT_PATH desde un hilo de fondo. El trace id se devuelve en la
+cabecera X-Trace-Id y se agrega a los logs del request.
+
+Configuración:
+    TRACE_ENABLED         false desactiva las trazas (true por defecto)
+    TRACE_BUFFER_SIZE     trazas recientes guardadas por worker (200)
+    TRACE_SLOW_MS         desde cuántos ms una traza se guarda también como lenta (1000)
+    TRACE_EXPORT_PATH     archivo JSONL donde exportar las trazas (vacío = no exportar)
+"""
+import contextvars
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'true').lower() != 'false'
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '200'))
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', '1000'))
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', '')
+
+TRACE_HEADER = 'X-Trace-Id'
+# Ids recibidos de un proxy o del cliente: solo se aceptan si son cortos y seguros
+_VALID_TRACE_ID = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+class Trace:
+    def __init__(self, trace_id, name, attrs):
+        self.trace_id = trace_id
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def new_span_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def offset_ms(self):
+        return (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': self.duration_ms,
+            'pid': os.getpid(),
+            **self.attrs,
+            'spans': sorted(self.spans, key=lambda s: s['start_ms']),
+        }
+
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+_recent = deque(maxlen=TRACE_BUFFER_SIZE)
+_slow = deque(maxlen=TRACE_BUFFER_SIZE)
+_buffer_lock = threading.Lock()
+
+
+def current_trace_id():
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def start_trace(name, trace_id=None, **attrs):
+    """Abrir la traza del request actual; trace_id entrante se reutiliza si es válido"""
+    if not TRACE_ENABLED:
+        return None
+    if not trace_id or not _VALID_TRACE_ID.match(trace_id):
+        trace_id = uuid.uuid4().hex[:16]
+    trace = Trace(trace_id, name, attrs)
+    _current_trace.set(trace)
+    _current_span.set(None)
+    return trace
+
+
+def finish_trace(**attrs):
+    """Cerrar la traza actual, guardarla en el buffer y exportarla"""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    _current_trace.set(None)
+    trace.duration_ms = round(trace.offset_ms(), 2)
+    trace.attrs.update(attrs)
+    record = trace.to_dict()
+    with _buffer_lock:
+        _recent.append(record)
+        if trace.duration_ms >= TRACE_SLOW_MS:
+            _slow.append(record)
+    if TRACE_EXPORT_PATH:
+        _exporter().export(record)
+    return record
+
+
+@contextmanager
+def span(name, **attrs):
+    """Medir un bloque como span hijo del span actual; no hace nada sin traza activa"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    span_id = trace.new_span_id()
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    start_ms = trace.offset_ms()
+    record = {'id': span_id, 'parent': parent, 'name': name, 'start_ms': round(start_ms, 2), **attrs}
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['duration_ms'] = round(trace.offset_ms() - start_ms, 2)
+        _current_span.reset(token)
+        with trace._lock:
+            trace.spans.append(record)
+
+
+def recent_traces(limit=50, slow=False, trace_id=None):
+    """Trazas del buffer de este worker, de la más reciente a la más antigua"""
+    with _buffer_lock:
+        records = list(_slow if slow else _recent)
+    records.reverse()
+    if trace_id:
+        records = [r for r in records if r['trace_id'] == trace_id]
+    return records[:limit]
+
+
+def find_exported(trace_id, max_bytes=5 * 1024 * 1024):
+    """Buscar una traza en el final del archivo exportado (la escribió cualquier worker)"""
+    if not TRACE_EXPORT_PATH or not os.path.exists(TRACE_EXPORT_PATH):
+        return None
+    with open(TRACE_EXPORT_PATH, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - max_bytes))
+        lines = f.read().splitlines()
+    needle = f'"trace_id": "{trace_id}"'.encode()
+    for line in reversed(lines):
+        if needle in line:
+            try:
+                return json.loads(line)
+            except ValueError:
+                return None
+    return None
+
+
+class _JsonlExporter:
+    """Escribe las trazas en un hilo de fondo; si la cola se llena se descartan"""
+
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=1000)
+        threading.Thread(target=self._run, name='trace-exporter', daemon=True).start()
+
+    def export(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            try:
+                # Una escritura por línea en modo append: las líneas de varios workers no se mezclan
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            except OSError:
+                self.dropped += 1
+
+
+_exporter_instance = None
+_exporter_lock = threading.Lock()
+
+
+def _exporter():
+    global _exporter_instance
+    if _exporter_instance is None or _exporter_instance.pid != os.getpid():
+        with _exporter_lock:
+            if _exporter_instance is None or _exporter_instance.pid != os.getpid():
+                _exporter_instance = _JsonlExporter(TRACE_EXPORT_PATH)
+    return _exporter_instance
+
+
+def install_template_spans(app):
+    """Span 'template.render' por cada plantilla que renderiza la app.
+
+    Envuelve Template.render con span() (y no con las señales de Flask): si el
+    render lanza, el span se cierra con el error y el span actual vuelve al padre.
+    """
+    base = app.jinja_env.template_class
+
+    class TracedTemplate(base):
+        def render(self, *args, **kwargs):
+            with span('template.render', template=self.name):
+                return super().render(*args, **kwargs)
+
+    app.jinja_env.template_class = TracedTemplate
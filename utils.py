@@ -5,44 +5,14 @@ import random
 import json
 import os
 from datetime import datetime
+from catalog import current_catalog
+from app_logging import get_logger
+
+log = get_logger('utils')
 
 class MemoryUtils:
     """Utilidades que funcionan solo en memoria sin base de datos"""
     
-    # Configuraciones estáticas en memoria
-    GAME_OPTIONS = {
-        'freefire_latam': {
-            '1': {'name': '110 💎 Diamantes', 'default_price': 0.66},
-            '2': {'name': '341 💎 Diamantes', 'default_price': 1.99},
-            '3': {'name': '572 💎 Diamantes', 'default_price': 3.35},
-            '4': {'name': '1.166 💎 Diamantes', 'default_price': 6.70},
-            '5': {'name': '2.376 💎 Diamantes', 'default_price': 12.70},
-            '6': {'name': '6.138 💎 Diamantes', 'default_price': 29.50},
-            '7': {'name': 'Tarjeta Básica', 'default_price': 0.40},
-            '8': {'name': 'Tarjeta Semanal', 'default_price': 1.40},
-            '9': {'name': 'Tarjeta Mensual', 'default_price': 6.50}
-        },
-        'freefire_global': {
-            '1': {'name': '100+10 💎 Diamantes', 'default_price': 0.86},
-            '2': {'name': '310+31 💎 Diamantes', 'default_price': 2.90},
-            '3': {'name': '520+52 💎 Diamantes', 'default_price': 4.00},
-            '4': {'name': '1.060+106 💎 Diamantes', 'default_price': 7.75},
-            '5': {'name': '2.180+218 💎 Diamantes', 'default_price': 15.30},
-            '6': {'name': '5.600+560 💎 Diamantes', 'default_price': 38.00}
-        },
-        'block_striker': {
-            '1': {'name': '100+16 🪙 Monedas', 'default_price': 0.82},
-            '2': {'name': '300+52 🪙 Monedas', 'default_price': 2.60},
-            '3': {'name': '500+94 🪙 Monedas', 'default_price': 4.30},
-            '4': {'name': '1,000+210 🪙 Monedas', 'default_price': 8.65},
-            '5': {'name': '2,000+440 🪙 Monedas', 'default_price': 17.30},
-            '6': {'name': '5,000+1,150 🪙 Monedas', 'default_price': 43.15},
-            '7': {'name': '🎫 Pase Básico', 'default_price': 3.50},
-            '8': {'name': '🎫 Pase Premium', 'default_price': 8.00},
-            '9': {'name': '💎 VIP Mensual', 'default_price': 1.85}
-        }
-    }
-
     @staticmethod
     def validate_email(email):
         """Validar formato de email sin consultar BD"""
@@ -144,27 +114,24 @@ class MemoryUtils:
 
     @staticmethod
     def validate_game_option(game_type, option_value):
-        """Validar opción de juego sin consultar BD"""
-        if game_type not in MemoryUtils.GAME_OPTIONS:
+        """Validar opción de juego contra el catálogo en memoria"""
+        catalog = current_catalog()
+        if catalog.game(game_type) is None:
             return False, f"Tipo de juego '{game_type}' no válido"
         
-        option_str = str(option_value)
-        if option_str not in MemoryUtils.GAME_OPTIONS[game_type]:
+        if catalog.lookup(game_type, option_value) is None:
             return False, f"Opción {option_value} no válida para {game_type}"
         
         return True, ""
 
     @staticmethod
     def get_game_option_info(game_type, option_value):
-        """Obtener información de opción de juego sin consultar BD"""
-        if game_type not in MemoryUtils.GAME_OPTIONS:
+        """Obtener información de opción de juego desde el catálogo en memoria"""
+        catalog_option = current_catalog().lookup(game_type, option_value)
+        if catalog_option is None:
             return None
         
-        option_str = str(option_value)
-        if option_str not in MemoryUtils.GAME_OPTIONS[game_type]:
-            return None
-        
-        return MemoryUtils.GAME_OPTIONS[game_type][option_str]
+        return {'name': catalog_option.name, 'price': catalog_option.price}
 
     @staticmethod
     def validate_price_range(price, min_price=0.01, max_price=1000.00):
@@ -196,10 +163,12 @@ class MemoryUtils:
 
     @staticmethod
     def log_error(error_message, error_type="ERROR"):
-        """Log de errores a consola sin consultar BD"""
-        timestamp = MemoryUtils.format_datetime()
-        log_message = f"[{timestamp}] {error_type}: {error_message}"
-        print(log_message)
+        """Log de errores por el logger estructurado (sin consultar BD ni formatear fechas aquí)"""
+        log_message = f"{error_type}: {error_message}"
+        if 'ERROR' in error_type.upper():
+            log.error(error_message, type=error_type)
+        else:
+            log.info(error_message, type=error_type)
         return log_message
 
     @staticmethod
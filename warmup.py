@@ -0,0 +1,120 @@
+"""
+Precalentamiento de cada worker antes de recibir tráfico.
+
+Sin esto los primeros usuarios después de un deploy o de que Render despierte
+la instancia pagan la conexión a Postgres, el DDL y la carga de precios y
+banner, la compilación de plantillas y el handshake TLS con el proveedor.
+
+main.warm_worker() arma la lista de pasos y gunicorn la ejecuta en post_fork,
+antes de que el worker acepte conexiones. Cada paso se mide y su resultado
+queda en el estado del worker, que /health/ready reporta. Un paso que falla
+no detiene a los demás; el worker queda "listo" solo si los pasos críticos
+(la base de datos) salieron bien; si no, /health/ready reintenta los pasos fallidos
+cada WARMUP_RETRY_INTERVAL segundos.
+
+Configuración:
+    WARMUP_ENABLED    false desactiva el precalentamiento (true por defecto)
+    WARMUP_TIMEOUT    segundos máximos para todos los pasos (20); los que no alcanzan se saltan
+    WARMUP_RETRY_INTERVAL  segundos mínimos entre reintentos de pasos fallidos (10)
+"""
+import os
+import threading
+import time
+
+from app_logging import get_logger
+
+log = get_logger('warmup')
+
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() != 'false'
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', '20'))
+WARMUP_RETRY_INTERVAL = float(os.getenv('WARMUP_RETRY_INTERVAL', '10'))
+
+# Sin estos pasos el worker no puede atender una compra
+CRITICAL_STEPS = ('database',)
+
+
+class WarmupState:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.started_at = None
+        self.attempted_at = 0.0
+        self.duration_ms = None
+        self.steps = {}
+
+    @property
+    def finished(self):
+        return self.duration_ms is not None
+
+    @property
+    def ready(self):
+        return self.finished and all(self.steps.get(name, {}).get('ok') for name in CRITICAL_STEPS)
+
+    def to_dict(self):
+        return {
+            'pid': self.pid,
+            'ready': self.ready,
+            'warmup_ms': self.duration_ms,
+            'steps': self.steps,
+        }
+
+
+_state = None
+_lock = threading.Lock()
+
+
+def state():
+    """Estado del worker actual (uno nuevo después de un fork)"""
+    global _state
+    if _state is None or _state.pid != os.getpid():
+        _state = WarmupState()
+    return _state
+
+
+def run(steps, budget=WARMUP_TIMEOUT):
+    """Ejecutar [(nombre, función)] una vez por proceso; cada función devuelve un detalle o lanza.
+
+    Llamadas posteriores solo reintentan los pasos fallidos (como mucho cada WARMUP_RETRY_INTERVAL).
+    Si otro hilo está ejecutando pasos se devuelve el estado actual sin esperar: un
+    reintento lento (la base de datos caída) no bloquea a los demás requests de /health/ready.
+    """
+    if not _lock.acquire(blocking=False):
+        return state()
+    try:
+        current = state()
+        if current.finished:
+            failed = [(name, step) for name, step in steps if not current.steps.get(name, {}).get('ok')]
+            if not failed or time.monotonic() - current.attempted_at < WARMUP_RETRY_INTERVAL:
+                return current
+            steps = failed
+        else:
+            current.started_at = time.time()
+
+        current.attempted_at = time.monotonic()
+        started = time.perf_counter()
+        for name, step in steps:
+            if not WARMUP_ENABLED:
+                current.steps[name] = {'ok': True, 'skipped': 'WARMUP_ENABLED=false'}
+                continue
+            if time.perf_counter() - started > budget:
+                current.steps[name] = {'ok': False, 'skipped': 'sin tiempo'}
+                continue
+            step_started = time.perf_counter()
+            try:
+                detail = step()
+                result = {'ok': detail is not False}
+                if detail not in (None, True, False):
+                    result['detail'] = detail
+            except Exception as e:
+                result = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            result['ms'] = round((time.perf_counter() - step_started) * 1000, 1)
+            current.steps[name] = result
+
+        current.duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        if current.ready:
+            log.info("Worker precalentado", ms=current.duration_ms,
+                     steps={name: result['ms'] for name, result in current.steps.items() if 'ms' in result})
+        else:
+            log.warning("Worker precalentado con fallas", ms=current.duration_ms, steps=current.steps)
+        return current
+    finally:
+        _lock.release()
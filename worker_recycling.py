@@ -0,0 +1,209 @@
+"""
+Reciclado de workers por memoria y edad (en lugar de max_requests fijo).
+
+Un worker sano conserva caché, plantillas compiladas y conexiones del pool
+sin límite de requests. Se recicla solo si:
+
+- su RSS creció más de WORKER_RSS_GROWTH_MB sobre la línea base medida
+  después de sus primeros WORKER_RSS_BASELINE_REQUESTS requests (ya "caliente"),
+- su RSS supera WORKER_MAX_RSS_MB (límite absoluto, 0 = sin límite), o
+- tiene más de WORKER_MAX_AGE_SECONDS (con ±10% de variación para que no
+  coincidan todos; 0 = sin límite).
+
+La revisión corre en el hook post_request de gunicorn cada
+WORKER_MEMORY_CHECK_INTERVAL requests y en un hilo del worker cada
+WORKER_RECYCLE_CHECK_SECONDS: un worker ocioso, o que nunca llega a la línea
+base, igual se recicla por edad o por WORKER_MAX_RSS_MB. Para reciclar se marca worker.alive =
+False: el worker deja de aceptar conexiones, termina los requests en curso
+(graceful_timeout) y el master levanta uno nuevo. Entre dos reciclados del
+mismo nodo pasan al menos WORKER_RECYCLE_SPACING segundos, así nunca se
+reinician todos los workers a la vez.
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+
+import metrics
+from app_logging import get_logger
+
+log = get_logger('workers')
+
+WORKER_RSS_GROWTH_MB = float(os.getenv('WORKER_RSS_GROWTH_MB', '150'))
+WORKER_MAX_RSS_MB = float(os.getenv('WORKER_MAX_RSS_MB', '0'))
+WORKER_MAX_AGE_SECONDS = float(os.getenv('WORKER_MAX_AGE_SECONDS', str(24 * 3600)))
+WORKER_RSS_BASELINE_REQUESTS = int(os.getenv('WORKER_RSS_BASELINE_REQUESTS', '100'))
+WORKER_MEMORY_CHECK_INTERVAL = int(os.getenv('WORKER_MEMORY_CHECK_INTERVAL', '50'))
+WORKER_RECYCLE_SPACING = float(os.getenv('WORKER_RECYCLE_SPACING', '30'))
+WORKER_RECYCLE_CHECK_SECONDS = float(os.getenv('WORKER_RECYCLE_CHECK_SECONDS', '60'))
+
+RECYCLE_LOCK_PATH = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+                                 'inefable_worker_recycle')
+
+MB = 1024 * 1024
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+WORKER_RSS = metrics.registry.gauge('worker_rss_bytes', 'Memoria residente de cada worker', ('pid',))
+WORKER_RSS_GROWTH = metrics.registry.gauge(
+    'worker_rss_growth_bytes', 'Crecimiento de RSS de cada worker sobre su línea base', ('pid',))
+WORKER_AGE = metrics.registry.gauge('worker_age_seconds', 'Edad de cada worker', ('pid',))
+WORKER_REQUESTS = metrics.registry.gauge('worker_requests', 'Requests atendidos por cada worker', ('pid',))
+WORKER_RECYCLES = metrics.registry.counter('worker_recycles_total', 'Workers reciclados por motivo', ('reason',))
+
+
+def current_rss():
+    """RSS actual del proceso en bytes (None si no se puede leer)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Sin /proc (macOS): pico de RSS, en bytes en macOS y en KB en Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+class WorkerState:
+    """Línea base, edad y conteo de requests del worker actual"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.started = time.monotonic()
+        self.requests = 0
+        self.baseline_rss = None
+        self.max_age = WORKER_MAX_AGE_SECONDS * random.uniform(0.9, 1.1) if WORKER_MAX_AGE_SECONDS else 0
+        self.recycling = False
+        self.lock = threading.Lock()
+
+    def age(self):
+        return time.monotonic() - self.started
+
+    def update_gauges(self, rss=None):
+        rss = rss if rss is not None else current_rss()
+        pid = str(self.pid)
+        WORKER_AGE.set(round(self.age(), 1), pid=pid)
+        WORKER_REQUESTS.set(self.requests, pid=pid)
+        if rss is not None:
+            WORKER_RSS.set(rss, pid=pid)
+            if self.baseline_rss is not None:
+                WORKER_RSS_GROWTH.set(rss - self.baseline_rss, pid=pid)
+        return rss
+
+    def recycle_reason(self, rss):
+        if self.max_age and self.age() > self.max_age:
+            return 'age'
+        if rss is None:
+            return None
+        if WORKER_MAX_RSS_MB and rss > WORKER_MAX_RSS_MB * MB:
+            return 'max_rss'
+        if self.baseline_rss is not None and WORKER_RSS_GROWTH_MB and \
+                rss - self.baseline_rss > WORKER_RSS_GROWTH_MB * MB:
+            return 'rss_growth'
+        return None
+
+
+_state = None
+
+
+def worker_state():
+    global _state
+    if _state is None or _state.pid != os.getpid():
+        _state = WorkerState()
+    return _state
+
+
+def _gauge_callback():
+    # Solo en workers (el master no atiende requests)
+    if _state is not None and _state.pid == os.getpid():
+        _state.update_gauges()
+
+
+metrics.registry.register_gauge_callback(_gauge_callback)
+
+
+def _claim_recycle_slot():
+    """True si ningún otro worker del nodo se recicló en los últimos WORKER_RECYCLE_SPACING segundos"""
+    now = time.time()
+    try:
+        fd = os.open(RECYCLE_LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o600)
+    except OSError:
+        return True
+    try:
+        import fcntl
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        last = os.read(fd, 32).decode() or '0'
+        if now - float(last) < WORKER_RECYCLE_SPACING:
+            return False
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, str(now).encode())
+        return True
+    except (ImportError, OSError, ValueError):
+        return True
+    finally:
+        os.close(fd)
+
+
+def on_request_finished(worker):
+    """Hook post_request: medir y, si corresponde, pedir al worker que termine con gracia"""
+    state = worker_state()
+    state.requests += 1
+    if state.recycling:
+        return
+
+    if state.baseline_rss is None:
+        if state.requests < WORKER_RSS_BASELINE_REQUESTS:
+            return
+        state.baseline_rss = state.update_gauges()
+        log.info("Línea base de memoria del worker", rss_mb=round((state.baseline_rss or 0) / MB, 1),
+                 requests=state.requests)
+        return
+
+    if state.requests % WORKER_MEMORY_CHECK_INTERVAL:
+        return
+
+    check(worker)
+
+
+def check(worker):
+    """Medir y, si corresponde, pedir al worker que termine con gracia; True si se pidió"""
+    state = worker_state()
+    with state.lock:
+        if state.recycling:
+            return False
+        rss = state.update_gauges()
+        reason = state.recycle_reason(rss)
+        if reason is None or not _claim_recycle_slot():
+            return False
+        state.recycling = True
+
+    WORKER_RECYCLES.inc(reason=reason)
+    log.warning("Reciclando worker", reason=reason, rss_mb=round((rss or 0) / MB, 1),
+                baseline_mb=round((state.baseline_rss or 0) / MB, 1),
+                age_s=round(state.age()), requests=state.requests)
+    # Deja de aceptar conexiones; los requests en curso terminan dentro de graceful_timeout
+    worker.alive = False
+    return True
+
+
+def start_monitor(worker):
+    """Hilo del worker: revisa edad y memoria aunque no lleguen requests"""
+    worker_state()
+
+    def run():
+        while worker.alive:
+            time.sleep(WORKER_RECYCLE_CHECK_SECONDS)
+            try:
+                if check(worker):
+                    return
+            except Exception as e:
+                log.warning("Error revisando el reciclado del worker", error=str(e))
+
+    thread = threading.Thread(target=run, name='worker-recycling', daemon=True)
+    thread.start()
+    return thread